@@ -0,0 +1,264 @@
+# app/anomaly.py  (per-sensor anomaly models: window features + IsolationForest, lazy LRU registry)
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import argparse, json, os, pathlib, re, threading, warnings
+import numpy as np
+
+from .tsstore import TimeSeriesStore
+
+MODEL_VERSION = 2
+WINDOW = 300  # samples per window, as the timeseries evidence branch scores them
+MIN_WINDOWS = 32  # a sensor group with fewer training windows gets no model (MAD only)
+MAX_WINDOWS = 4096  # training windows per model
+CALIB_SPAN = 0.05  # isolation score above the history's 99.9th percentile that maps to 1.0
+BUDGET_MB = float(os.getenv("ANOMALY_MODEL_BUDGET_MB", "256"))
+GROUP = os.getenv("ANOMALY_MODEL_GROUP", "class")  # class | sensor
+_TRAILING_NUMBER = re.compile(r"[_-]?\d+$")
+
+
+def sensor_class(sensor_id: str) -> str:
+    """`vib_017` -> `vib`: sensors that differ only in a trailing number share a model."""
+    return _TRAILING_NUMBER.sub("", sensor_id) or sensor_id
+
+
+def window_features(windows: np.ndarray, median: np.ndarray, mad: np.ndarray) -> np.ndarray:
+    """(windows x samples) -> (windows x 6): log peak, mean and spread of the
+    robust z-scores against each row's baseline, largest step, the window's
+    own peak-to-MAD (the MAD rule), and the share of samples over 3.
+    NaN samples are ignored; an all-NaN row gets zeros."""
+    x = np.asarray(windows, dtype=float)
+    z = (x - median[:, None]) / mad[:, None]
+    a = np.abs(z)
+    n = np.maximum(np.sum(~np.isnan(z), axis=1), 1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        local = np.abs(x - np.nanmedian(x, axis=1)[:, None])
+        f = np.stack([np.nanmax(a, axis=1), np.nanmean(a, axis=1), np.nanstd(z, axis=1),
+                      np.nanmax(np.abs(np.diff(z, axis=1)), axis=1) if z.shape[1] > 1 else np.zeros(len(z)),
+                      np.nanmax(local, axis=1) / (np.nanmedian(local, axis=1) + 1e-8)], axis=1)
+    f = np.log1p(np.nan_to_num(f))
+    return np.column_stack([f, np.sum(a > 3.0, axis=1) / n])
+
+
+class ModelRegistry:
+    """IsolationForest anomaly models trained from each scenario's history.
+
+    Sensors are grouped (by `sensor_class`, or one model per sensor with
+    group="sensor"); each group gets one forest fitted on window features
+    of robust z-scores, so sensors with different levels and noise share a
+    model while each keeps its own median / MAD baseline. The newest WINDOW
+    samples are held out of training: they are what gets scored.
+
+    Models are joblib files under `<root>/<scenario>/`, with `index.json`
+    mapping sensor -> model and recording the timeseries source they were
+    trained on (a changed CSV retrains the scenario on next use). Training
+    holds only that scenario's lock; the registry lock is taken to publish
+    the result, so other scenarios keep scoring meanwhile. Files are loaded
+    on first use and kept in an LRU that evicts the least recently used
+    models once their in-memory size (the forests' node and value arrays,
+    measured at fit time) exceeds `budget_mb`. They are not memory-mapped:
+    unpickling a tree copies its arrays, so mapping would save nothing.
+    """
+
+    def __init__(self, root: pathlib.Path, budget_mb: float = BUDGET_MB, window: int = WINDOW, group: str = GROUP):
+        if group not in ("class", "sensor"):
+            raise ValueError(f"unknown model group {group!r}; expected 'class' or 'sensor'")
+        self.root = pathlib.Path(root)
+        self.budget = int(budget_mb * 2**20)
+        self.window = window
+        self.group = group
+        self._lock = threading.RLock()
+        self._models: "OrderedDict[pathlib.Path, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._manifests: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._training: Dict[str, threading.Lock] = {}  # scenario -> held while it trains
+        self.loads = self.evictions = 0
+
+    def key(self, sensor: str) -> str:
+        return sensor_class(sensor) if self.group == "class" else sensor
+
+    # ---------- train ----------
+    def _fit(self, history: Dict[str, np.ndarray], seed: int = 0) -> Optional[Dict[str, Any]]:
+        from sklearn.ensemble import IsolationForest
+
+        rng = np.random.default_rng(seed)
+        sensors, med, mad, feats = [], [], [], []
+        for sensor, h in history.items():
+            h = np.asarray(h, dtype=float)[:-self.window]  # hold out what gets scored
+            h = h[~np.isnan(h)]
+            if len(h) < 2 * self.window:
+                continue
+            m = float(np.median(h))
+            d = float(np.median(np.abs(h - m))) + 1e-8
+            starts = np.arange(0, len(h) - self.window + 1, max(1, (len(h) - self.window) // 64))
+            w = np.lib.stride_tricks.sliding_window_view(h, self.window)[starts]
+            sensors.append(sensor); med.append(m); mad.append(d)
+            feats.append(window_features(w, np.full(len(w), m), np.full(len(w), d)))
+        if not feats or sum(map(len, feats)) < MIN_WINDOWS:
+            return None
+        x = np.concatenate(feats)
+        if len(x) > MAX_WINDOWS:
+            x = x[rng.choice(len(x), MAX_WINDOWS, replace=False)]
+        iso = IsolationForest(n_estimators=100, max_samples=min(256, len(x)), random_state=seed).fit(x)
+        s = -iso.score_samples(x)  # the paper's anomaly score: ~0.5 typical, -> 1 isolated
+        # 0 at the 99.9th percentile of the history's windows (a scenario scores
+        # thousands of sensors at once), 1 at CALIB_SPAN above it
+        lo = float(np.quantile(s, 0.999))
+        med, mad = np.asarray(med), np.asarray(mad)
+        nbytes = med.nbytes + mad.nbytes
+        for tree in iso.estimators_:
+            state = tree.tree_.__getstate__()
+            nbytes += state["nodes"].nbytes + state["values"].nbytes
+        return {"version": MODEL_VERSION, "window": self.window, "sensors": sensors, "median": med, "mad": mad,
+                "iso": iso, "calib": (lo, lo + CALIB_SPAN), "nbytes": int(nbytes)}
+
+    def train(self, scenario: str, store: TimeSeriesStore) -> Dict[str, Any]:
+        """Fit every sensor group of `scenario` from its stored history; returns the manifest."""
+        import joblib
+
+        n = len(store)
+        groups: Dict[str, Dict[str, np.ndarray]] = {}
+        for c in store.columns:
+            groups.setdefault(self.key(c), {})[c] = store.tail(c, n)
+        d = self.root / scenario
+        d.mkdir(parents=True, exist_ok=True)
+        sensors: Dict[str, str] = {}
+        for key, history in groups.items():
+            model = self._fit(history)
+            if model is None:
+                continue
+            path = d / f"{key}.joblib"
+            tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+            joblib.dump(model, tmp)
+            os.replace(tmp, path)
+            with self._lock:  # drop a cached copy of the old model
+                if path in self._models:
+                    self._bytes -= self._models.pop(path)[1]
+            sensors.update({s: key for s in model["sensors"]})
+        manifest = {"version": MODEL_VERSION, "window": self.window, "group": self.group,
+                    "source": store.meta.get("source"), "rows": n, "sensors": sensors}
+        tmp = d / f"index.json.tmp{os.getpid()}.{threading.get_ident()}"
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        with self._lock:  # publish
+            os.replace(tmp, d / "index.json")
+            self._manifests.pop(scenario, None)
+        return manifest
+
+    # ---------- load ----------
+    def _cached_manifest(self, scenario: str) -> Optional[Dict[str, Any]]:
+        path = self.root / scenario / "index.json"
+        with self._lock:
+            try:
+                mtime = path.stat().st_mtime_ns
+                hit = self._manifests.get(scenario)
+                if hit is None or hit[0] != mtime:
+                    hit = self._manifests[scenario] = (mtime, json.loads(path.read_text(encoding="utf-8")))
+                return hit[1]
+            except (OSError, ValueError):
+                return None
+
+    def _current(self, m: Optional[Dict[str, Any]], store: TimeSeriesStore) -> bool:
+        want = (MODEL_VERSION, self.window, self.group, store.meta.get("source"))
+        return m is not None and (m["version"], m["window"], m["group"], m["source"]) == want
+
+    def manifest(self, scenario: str, store: Optional[TimeSeriesStore] = None) -> Optional[Dict[str, Any]]:
+        """The scenario's sensor -> model map; (re)trains it from `store` when
+        missing or trained on another source, window or grouping. Concurrent
+        callers for the same scenario wait for one training run."""
+        m = self._cached_manifest(scenario)
+        if store is None or self._current(m, store):
+            return m
+        with self._lock:
+            training = self._training.setdefault(scenario, threading.Lock())
+        with training:
+            m = self._cached_manifest(scenario)  # trained while we waited
+            if self._current(m, store):
+                return m
+            try:
+                return self.train(scenario, store)
+            except OSError:
+                return m  # read-only checkout: use what is there (or MAD)
+
+    def get(self, scenario: str, key: str) -> Optional[Dict[str, Any]]:
+        """Model for one sensor group, loaded on first use and kept in the LRU."""
+        path = self.root / scenario / f"{key}.joblib"
+        with self._lock:
+            hit = self._models.get(path)
+            if hit is not None:
+                self._models.move_to_end(path)
+                return hit[0]
+        try:  # load outside the lock; a racing load of the same file is dropped below
+            import joblib
+            model = joblib.load(path)
+        except (OSError, ValueError, EOFError):
+            return None
+        if model.get("version") != MODEL_VERSION:
+            return None
+        model["index"] = {s: i for i, s in enumerate(model["sensors"])}
+        with self._lock:
+            hit = self._models.get(path)
+            if hit is not None:
+                self._models.move_to_end(path)
+                return hit[0]
+            self._models[path] = (model, model["nbytes"])
+            self._bytes += model["nbytes"]
+            self.loads += 1
+            while self._bytes > self.budget and len(self._models) > 1:
+                self._bytes -= self._models.popitem(last=False)[1][1]
+                self.evictions += 1
+            return model
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"loaded": len(self._models), "mb": round(self._bytes / 2**20, 2),
+                    "budget_mb": round(self.budget / 2**20, 2), "loads": self.loads, "evictions": self.evictions}
+
+    # ---------- score ----------
+    def score(self, scenario: str, store: TimeSeriesStore, columns: List[str], windows: np.ndarray) -> np.ndarray:
+        """Model score in [0, 1] per row of `windows` (row i is the latest samples
+        of column i); NaN where the sensor has no model. One forest call per
+        sensor group, however many sensors it covers."""
+        windows = np.asarray(windows, dtype=float)
+        out = np.full(len(columns), np.nan)
+        m = self.manifest(scenario, store)
+        if m is None:
+            return out
+        rows: Dict[str, List[int]] = {}
+        for i, c in enumerate(columns):
+            key = m["sensors"].get(c)
+            if key is not None:
+                rows.setdefault(key, []).append(i)
+        for key, idx in rows.items():
+            model = self.get(scenario, key)
+            if model is None:
+                continue
+            pos = np.array([model["index"][columns[i]] for i in idx])
+            x = window_features(windows[idx], model["median"][pos], model["mad"][pos])
+            lo, hi = model["calib"]
+            out[idx] = np.clip((-model["iso"].score_samples(x) - lo) / (hi - lo), 0.0, 1.0)
+        return out
+
+
+def main():
+    from .tools import DATA_DIR, _open_store, anomaly_registry
+
+    p = argparse.ArgumentParser(description="Train per-sensor anomaly models from the stored timeseries.")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--scenarios", nargs="+")
+    g.add_argument("--all", action="store_true", help="Every scenario under data/scenarios/")
+    args = p.parse_args()
+    names = sorted(q.stem for q in (DATA_DIR / "scenarios").glob("*.yaml")) if args.all else args.scenarios
+    reg = anomaly_registry()
+    for name in names:
+        store = _open_store(name)
+        if store is None:
+            print(json.dumps({"scenario": name, "error": "no timeseries"}))
+            continue
+        m = reg.train(name, store)
+        print(json.dumps({"scenario": name, "sensors": len(store.columns), "modelled": len(m["sensors"]),
+                          "models": len(set(m["sensors"].values()))}))
+
+
+if __name__ == "__main__":
+    main()
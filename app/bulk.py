@@ -0,0 +1,56 @@
+from __future__ import annotations
+import argparse, asyncio, os, pathlib, time, yaml
+from rich.console import Console
+from rich.table import Table
+from app.graph import get_graph, plan_incidents, arun_incidents, AgentState
+
+DATA_DIR = pathlib.Path(os.getenv("INCIDENT_DATA_DIR") or pathlib.Path(__file__).resolve().parents[1] / "data") / "scenarios"
+console = Console()
+
+def load_states(names: list[str]) -> list[AgentState]:
+    states = []
+    for name in names:
+        meta = yaml.safe_load((DATA_DIR / f"{name}.yaml").read_text(encoding="utf-8"))
+        states.append(AgentState(scenario=name, description=meta["description"], sensors=meta.get("sensors", [])))
+    return states
+
+def run_bulk(names: list[str], batch_size: int = 8, concurrency: int = 0):
+    states = load_states(names)
+
+    t0 = time.perf_counter()
+    plan_incidents(states, batch_size=batch_size)   # one batched planner pass for everything
+    plan_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if concurrency > 0:
+        outs = asyncio.run(arun_incidents(states, concurrency))  # one event loop, many in flight
+    else:
+        app = get_graph()
+        outs = [app.invoke(state) for state in states]
+    run_s = time.perf_counter() - t0
+
+    table = Table(title=f"Bulk run ({len(states)} incidents, planning {plan_s:.2f}s, graph {run_s:.2f}s)")
+    for col in ("scenario", "confidence", "anomaly", "log hits", "kb"):
+        table.add_column(col)
+    for state, out in zip(states, outs):
+        ev = out.get("evidence", {}) or {}
+        table.add_row(state.scenario, f"{float(out.get('confidence', 0.0)):.2f}",
+                      f"{float(ev.get('anomaly_score', 0.0)):.2f}",
+                      str(len(ev.get("logs", []))), ", ".join(n["id"] for n in ev.get("kb", [])))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Plan all incidents up front, then run the rest of the graph.")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--scenarios", nargs="+")
+    g.add_argument("--all", action="store_true", help="Every scenario under data/scenarios/")
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--concurrency", type=int, default=0,
+                   help="Run incidents concurrently with ainvoke (0 = one at a time).")
+    p.add_argument("--no-planner", action="store_true", help="Use the static plan; never load torch/transformers.")
+    args = p.parse_args()
+    if args.no_planner:
+        os.environ["NO_PLANNER"] = "1"
+    names = sorted(p.stem for p in DATA_DIR.glob("*.yaml")) if args.all else args.scenarios
+    run_bulk(names, args.batch_size, args.concurrency)
@@ -1,94 +1,237 @@
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, List, Annotated
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel
 from .tools import (
-    TimeSeriesIn, SearchLogsIn, AnomalyScoreIn, KBQueryIn,
-    get_timeseries, search_logs, anomaly_score, kb_query, create_ticket,
-    TicketIn
+    SearchLogsIn, KBQueryIn, SensorScore,
+    get_timeseries_batch, anomaly_score_batch, search_logs, kb_query, create_ticket,
+    aget_timeseries_batch, aanomaly_score_batch, asearch_logs, akb_query, acreate_ticket,
+    run_blocking, ANOMALY_METHOD
 )
 from .rag import SimpleRAG
+from .online import LIVE
 from .memory import ShortTerm, LongTerm
-import json, textwrap, os
+from . import spans
+import asyncio, functools, json, operator, textwrap, os, time, uuid
+from datetime import datetime, timezone
+from langchain_core.runnables import RunnableLambda
 
-# Optional HF planner
+# Optional HF planner (model loads lazily on first call; NO_PLANNER=1 disables it)
 USE_HF_PLANNER = True
-try:
-    from .llm import call_planner
-except Exception:
-    call_planner = None  # fall back
+from .llm import call_planner, call_planner_batch, planner_available, DEFAULT_PLAN
+from .plancache import PLAN_CACHE
+
+def merge_dicts(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer so parallel branches can each write their part of a dict."""
+    return {**(old or {}), **(new or {})}
 
 class AgentState(BaseModel):
     scenario: str
     description: str
+    sensors: List[str] = []  # empty = every sensor in the scenario's timeseries
+    agent_plan: Dict[str, Any] = {}  # set up front by plan_incidents() to skip the planner node
     confidence: float = 0.0
-    evidence: Dict[str, Any] = {}
+    evidence: Annotated[Dict[str, Any], merge_dicts] = {}
+    timings: Annotated[Dict[str, float], merge_dicts] = {}  # node -> wall ms
+    trace: Annotated[List[Dict[str, Any]], operator.add] = []  # this run's events, appended per node
+    spans: Annotated[List[Dict[str, Any]], operator.add] = []  # node/tool spans when TRACE_SPANS is on
     report_md: str = ""
+    ticket_path: str = ""
+    memory: bool = True  # recall from / store into long-term memory (the eval harness turns it off)
+    alerts: List[Dict[str, Any]] = []  # correlated alerts this run stands for (app.ingest); listed in the ticket
 
 rag = SimpleRAG()
 
+STATIC_PLAN = DEFAULT_PLAN
+
+def plan_incidents(states: List[AgentState], batch_size: int = 8) -> List[AgentState]:
+    """Fill `agent_plan` for many incidents with one batched planner pass.
+
+    Bulk runs call this before invoking the graph, so plan_node just reuses
+    the stored plan. Without a planner the states are left untouched and
+    plan_node falls back to the static plan.
+    """
+    todo = [s for s in states if not s.agent_plan]
+    if not todo:
+        return states
+    plans = None
+    if USE_HF_PLANNER and planner_available():
+        try:
+            plans = call_planner_batch([s.description for s in todo], batch_size=batch_size)
+        except Exception:
+            plans = None  # plan_node will retry one by one and log the error
+    for s, p in zip(todo, plans or [None] * len(todo)):
+        if p is not None:
+            s.agent_plan = p
+    return states
+
 # ---- Nodes ----
-def plan_node(state: AgentState, st: ShortTerm):
+# Nodes never mutate the shared graph: each one logs into a fresh ShortTerm
+# and returns a partial update whose events are appended to `state.trace`.
+# One compiled graph can therefore serve any number of concurrent runs.
+def plan_node(state: AgentState):
+    st = ShortTerm()
+    if state.agent_plan:
+        st.log("plan", {"plan": state.agent_plan})
+        return {"trace": st.events}
+
     plan = None
-    if USE_HF_PLANNER and call_planner is not None:
+    if USE_HF_PLANNER and planner_available():
+        info = {}
         try:
-            plan = call_planner(state.description)
+            plan = call_planner(state.description, info=info)
         except Exception as e:
             st.log("plan:error", {"msg": str(e)})
             plan = None
+        if "cache" in info:
+            st.log("plan:cache", {"lookup": info["cache"], **PLAN_CACHE.stats()})
+        if "new_tokens" in info:
+            st.log("plan:decode", {k: info[k] for k in ("mode", "new_tokens", "latency_ms")})
 
     if plan is None:
-        plan = {
-            "steps": ["triage", "timeseries", "logs", "hypothesize", "verify", "remediate"],
-            "stop_condition": "confidence>=0.6 and evidence_sources>=2",
-            "confidence_hint": 0.3,
-        }
+        plan = {**STATIC_PLAN, "steps": list(STATIC_PLAN["steps"])}
     st.log("plan", {"plan": plan})
-    return state
-
-# def collect_evidence_node(state: AgentState, st: ShortTerm):
-#     ts = get_timeseries(TimeSeriesIn(sensor_id="sensor_A", window=300), state.scenario)
-#     st.log("tool:get_timeseries", {"n": len(ts.points)})
-#     anom = anomaly_score(AnomalyScoreIn(points=ts.points))
-#     st.log("tool:anomaly_score", {"score": anom.score})
-
-#     logs = search_logs(SearchLogsIn(query="error|warn|vibration|packet|overheat", scenario=state.scenario))
-#     st.log("tool:search_logs", {"hits": len(logs.hits)})
-
-#     kb = kb_query(KBQueryIn(issue=state.description, top_k=3), retriever=rag)
-#     st.log("tool:kb_query", {"notes": [n.id for n in kb.notes]})
-
-#     state.evidence = {
-#         "anomaly_score": anom.score,
-#         "logs": logs.hits[:5],
-#         "kb": [n.model_dump() for n in kb.notes],
-#     }
-#     return state
-
-def collect_evidence_node(state: AgentState, st: ShortTerm):
-    ts = get_timeseries(TimeSeriesIn(sensor_id="sensor_A", window=300), state.scenario)
-    st.log("tool:get_timeseries", {"n": len(ts.points)})
-    anom = anomaly_score(AnomalyScoreIn(points=ts.points))
-    st.log("tool:anomaly_score", {"score": anom.score})
-
-    logs = search_logs(SearchLogsIn(query="error|warn|vibration|packet|overheat|gateway|backhaul|loss|cpu", scenario=state.scenario))
-    st.log("tool:search_logs", {"hits": len(logs.hits)})
+    return {"agent_plan": plan, "trace": st.events}
+
+async def aplan_node(state: AgentState):
+    return await run_blocking(plan_node, state)  # the planner model is blocking
+
+# Evidence is gathered by independent branches that run in parallel and join
+# before `decide`: timeseries -> anomaly, logs -> KB (the KB query is built
+# from the log messages), and the memory recall below. Each returns only its
+# evidence keys.
+LOG_QUERY = "error|warn|vibration|packet|overheat|gateway|backhaul|loss|cpu"
+MORE_LOG_QUERY = "bearing|gateway|temp|cpu"
+# a clear anomaly also pulls the log lines within ±PEAK_WINDOW_S of its peak
+PEAK_WINDOW_S = float(os.getenv("PEAK_WINDOW_S", "300"))
+
+def _peak(ranked: List[SensorScore], times) -> Dict[str, Any] | None:
+    top = ranked[0] if ranked else None
+    if top is None or top.score < 0.6 or not 0 <= top.peak_index < len(times):
+        return None
+    return {"sensor": top.sensor_id, "ts": float(times[top.peak_index]), "window_s": PEAK_WINDOW_S}
+
+def _peak_logs_in(state: AgentState, peak: Dict[str, Any]) -> SearchLogsIn:
+    return SearchLogsIn(query=f"{peak['sensor']}|{LOG_QUERY}", scenario=state.scenario, limit=5,
+                        t0=peak["ts"] - peak["window_s"], t1=peak["ts"] + peak["window_s"])
+
+def _ranked(state: AgentState, st: ShortTerm, ranked: List[SensorScore]) -> List[SensorScore]:
+    # a live feed keeps its rolling score current; prefer it over the stored window
+    for i, r in enumerate(ranked):
+        live = LIVE.score(state.scenario, r.sensor_id)
+        if live is not None and "reason" not in live.details:  # too_short: keep the stored window
+            # keep peak_index / method: the peak-log lookup needs where the peak is
+            ranked[i] = r.model_copy(update={"score": live.score, "n": live.details.get("n", r.n),
+                                             "peak_to_mad": live.details.get("peak_to_mad", r.peak_to_mad),
+                                             "median": live.details.get("median", r.median)})
+    ranked.sort(key=lambda r: -r.score)
+    st.log("tool:anomaly_score", {"score": ranked[0].score if ranked else 0.0, "top": [r.sensor_id for r in ranked[:3]]})
+    return ranked
+
+def _timeseries_evidence(st: ShortTerm, ranked: List[SensorScore], peak: Dict[str, Any] | None,
+                         peak_hits: List[Dict[str, Any]]):
+    evidence = {
+        "anomaly_score": ranked[0].score if ranked else 0.0,
+        "top_sensors": [r.model_dump() for r in ranked[:3] if r.score > 0],
+    }
+    if peak is not None:
+        st.log("tool:search_logs", {"peak_ts": peak["ts"], "window_s": peak["window_s"], "hits": len(peak_hits)})
+        evidence.update(peak=peak, peak_logs=peak_hits)
+    return {"evidence": evidence, "trace": st.events}
 
+def evidence_timeseries_node(state: AgentState):
+    st = ShortTerm()
+    sensor_ids, mat, times = get_timeseries_batch(state.scenario, state.sensors or None, window=300, with_times=True)
+    st.log("tool:get_timeseries", {"sensors": len(sensor_ids), "n": mat.shape[1] if mat.ndim == 2 else 0})
+    ranked = _ranked(state, st, anomaly_score_batch(mat, sensor_ids, method=ANOMALY_METHOD,
+                                                    scenario=state.scenario).ranked)
+    peak = _peak(ranked, times)
+    hits = search_logs(_peak_logs_in(state, peak)).hits if peak is not None else []
+    return _timeseries_evidence(st, ranked, peak, hits)
+
+async def aevidence_timeseries_node(state: AgentState):
+    st = ShortTerm()
+    sensor_ids, mat, times = await aget_timeseries_batch(state.scenario, state.sensors or None, window=300,
+                                                         with_times=True)
+    st.log("tool:get_timeseries", {"sensors": len(sensor_ids), "n": mat.shape[1] if mat.ndim == 2 else 0})
+    ranked = _ranked(state, st, (await aanomaly_score_batch(mat, sensor_ids, method=ANOMALY_METHOD,
+                                                            scenario=state.scenario)).ranked)
+    peak = _peak(ranked, times)
+    hits = (await asearch_logs(_peak_logs_in(state, peak))).hits if peak is not None else []
+    return _timeseries_evidence(st, ranked, peak, hits)
+
+def _kb_query_in(state: AgentState, hits: List[Dict[str, Any]]) -> KBQueryIn:
     # 🔑 Build a stronger RAG query from description + log messages
-    top_msgs = " ".join([str(h.get("msg", "")) for h in logs.hits[:5]])
-    rag_query_text = f"{state.description} {top_msgs}".strip()
+    top_msgs = " ".join([str(h.get("msg", "")) for h in hits[:5]])
+    return KBQueryIn(issue=f"{state.description} {top_msgs}".strip(), top_k=3)
 
-    kb = kb_query(KBQueryIn(issue=rag_query_text, top_k=3), retriever=rag)
+def evidence_logs_node(state: AgentState):
+    st = ShortTerm()
+    logs = search_logs(SearchLogsIn(query=LOG_QUERY, scenario=state.scenario, limit=5))
+    st.log("tool:search_logs", {"hits": len(logs.hits)})
+    kb = kb_query(_kb_query_in(state, logs.hits), retriever=rag)
     st.log("tool:kb_query", {"notes": [n.id for n in kb.notes]})
+    return {"evidence": {"logs": logs.hits[:5], "kb": [n.model_dump() for n in kb.notes]}, "trace": st.events}
 
-    state.evidence = {
-        "anomaly_score": anom.score,
-        "logs": logs.hits[:5],
-        "kb": [n.model_dump() for n in kb.notes],
-    }
-    return state
+async def aevidence_logs_node(state: AgentState):
+    st = ShortTerm()
+    logs = await asearch_logs(SearchLogsIn(query=LOG_QUERY, scenario=state.scenario, limit=5))
+    st.log("tool:search_logs", {"hits": len(logs.hits)})
+    kb = await akb_query(_kb_query_in(state, logs.hits), retriever=rag)
+    st.log("tool:kb_query", {"notes": [n.id for n in kb.notes]})
+    return {"evidence": {"logs": logs.hits[:5], "kb": [n.model_dump() for n in kb.notes]}, "trace": st.events}
+
+# Long-term memory: a third branch recalls similar past incidents that ended
+# in a ticket, and every finished run is stored for the next ones.
+# INCIDENT_MEMORY=0 turns both off process-wide, `AgentState.memory=False` for
+# one run (the eval harness does, so scored reports never depend on earlier runs).
+SIMILAR_MIN_SCORE = 0.6
+
+def memory_enabled(state: AgentState | None = None) -> bool:
+    return os.getenv("INCIDENT_MEMORY", "1") != "0" and (state is None or state.memory)
+
+@functools.lru_cache(maxsize=1)
+def get_memory() -> LongTerm:
+    return LongTerm()
+
+def _memory_text(state: AgentState) -> str:
+    return f"{state.description} {' '.join(state.sensors)}".strip()
+
+def recall_node(state: AgentState):
+    if not memory_enabled(state):
+        return {}
+    st = ShortTerm()
+    hits = get_memory().recall(_memory_text(state), k=3, min_score=SIMILAR_MIN_SCORE,
+                               where=lambda r: bool(r.get("ticket")))
+    similar = [{k: r.get(k) for k in ("id", "scenario", "score", "confidence", "ticket", "summary")} for r in hits]
+    st.log("tool:recall_incidents", {"similar": [s["id"] for s in similar]})
+    return {"evidence": {"similar": similar}, "trace": st.events}
+
+async def arecall_node(state: AgentState):
+    return await run_blocking(recall_node, state)
+
+def remember_node(state: AgentState):
+    if not memory_enabled(state):
+        return {}
+    st = ShortTerm()
+    ev = state.evidence
+    incident_id = f"{state.scenario}-{uuid.uuid4().hex[:12]}"
+    get_memory().upsert(incident_id, _memory_text(state), {
+        "scenario": state.scenario, "summary": state.description, "sensors": state.sensors,
+        "confidence": state.confidence, "ticket": state.ticket_path or None,
+        "evidence": {"anomaly_score": ev.get("anomaly_score", 0.0),
+                     "top_sensors": [s["sensor_id"] for s in ev.get("top_sensors", [])],
+                     "logs": [str(h.get("msg", "")) for h in ev.get("logs", [])[:3]],
+                     "kb": [n["id"] for n in ev.get("kb", [])]},
+    })
+    st.log("memory:upsert", {"id": incident_id})
+    return {"trace": st.events}
 
-def decide_node(state: AgentState, st: ShortTerm):
+async def aremember_node(state: AgentState):
+    return await run_blocking(remember_node, state)
+
+def decide_node(state: AgentState):
+    st = ShortTerm()
     sources = 0
     if state.evidence.get("anomaly_score", 0) >= 0.6:
         sources += 1
@@ -97,19 +240,33 @@ def decide_node(state: AgentState, st: ShortTerm):
     if len(state.evidence.get("kb", [])) > 0:
         sources += 1
     conf = 0.2 + 0.3 * (1 if state.evidence.get("anomaly_score",0)>=0.6 else 0) + 0.25 * (sources>=2)
-    state.confidence = min(1.0, conf)
-    st.log("decide", {"sources": sources, "confidence": state.confidence})
-    return state
+    confidence = min(1.0, conf)
+    st.log("decide", {"sources": sources, "confidence": confidence})
+    return {"confidence": confidence, "trace": st.events}
 
-def maybe_gather_more(state: AgentState, st: ShortTerm):
+def _more_logs_in(state: AgentState) -> SearchLogsIn:
+    prev = len(state.evidence.get("logs", []))
+    return SearchLogsIn(query=MORE_LOG_QUERY, scenario=state.scenario, limit=max(0, 10 - prev))
+
+def _add_logs(state: AgentState, hits: List[Dict[str, Any]]):
+    st = ShortTerm()
+    prev = state.evidence.get("logs", [])
+    logs = (prev + hits)[:10]
+    st.log("branch:more_evidence", {"added": len(logs) - len(prev)})
+    return {"evidence": {"logs": logs}, "trace": st.events}
+
+def maybe_gather_more(state: AgentState):
+    if state.confidence < 0.6:
+        return _add_logs(state, search_logs(_more_logs_in(state)).hits)
+    return {}
+
+async def amaybe_gather_more(state: AgentState):
     if state.confidence < 0.6:
-        logs = search_logs(SearchLogsIn(query="bearing|gateway|temp|cpu", scenario=state.scenario))
-        prev = len(state.evidence.get("logs", []))
-        state.evidence["logs"] = (state.evidence.get("logs", []) + logs.hits)[:10]
-        st.log("branch:more_evidence", {"added": len(state.evidence["logs"]) - prev})
-    return state
+        return _add_logs(state, (await asearch_logs(_more_logs_in(state))).hits)
+    return {}
 
-def write_node(state: AgentState, st: ShortTerm):
+def write_node(state: AgentState):
+    st = ShortTerm()
     sources = 0
     if state.evidence.get("anomaly_score", 0) >= 0.6: sources += 1
     if len(state.evidence.get("logs", [])) > 0: sources += 1
@@ -124,6 +281,18 @@ def write_node(state: AgentState, st: ShortTerm):
 
     ev_logs = state.evidence.get("logs", [])
     kb_cites = "\n".join([f"- {n['id']} (score={n['score']:.3f})" for n in state.evidence.get("kb", [])])
+    top_sensors = ", ".join(f"{s['sensor_id']} ({s['score']:.2f})" for s in state.evidence.get("top_sensors", []))
+    similar = "\n".join(f"- {s['id']} (similarity={s['score']:.2f}, confidence={s['confidence'] or 0:.2f}): {s['ticket']}"
+                        for s in state.evidence.get("similar", []))
+    alerts = "\n".join(f"- {a['id']} at {datetime.fromtimestamp(a['ts'], timezone.utc):%Y-%m-%d %H:%M:%S}Z"
+                       f" [{a['asset'] or '-'}]: {a['description']}" for a in state.alerts)
+    peak = state.evidence.get("peak")
+    peak_logs = "\n".join(f"- {h.get('ts', '?')} {h.get('level', '')} {h.get('msg', '')}"
+                           for h in state.evidence.get("peak_logs", []))
+    peak_md = (f"- **Logs within ±{peak['window_s']:.0f}s of the {peak['sensor']} peak**"
+               f" ({datetime.fromtimestamp(peak['ts'], timezone.utc):%Y-%m-%d %H:%M:%S}Z):\n{peak_logs or 'None'}\n"
+               if peak else "")
+    alerts_md = f"\n## Correlated alerts ({len(state.alerts)})\n{alerts}\n" if state.alerts else ""
 
     md = f"""
 # Incident Report: {state.scenario}
@@ -134,47 +303,120 @@ def write_node(state: AgentState, st: ShortTerm):
 
 ## Evidence
 - **Anomaly Score**: {state.evidence.get('anomaly_score',0):.2f}
+- **Top sensors**: {top_sensors or 'None'}
 - **Log hits** (trimmed):
 {json.dumps(ev_logs[:3], indent=2) if ev_logs else 'None'}
-- **RAG citations**:
+{peak_md}- **RAG citations**:
 {kb_cites or 'None'}
-
+- **Similar past incidents**:
+{similar or 'None'}
+{alerts_md}
 ## Recommendation
 {verdict}
 
-{st.to_markdown()}
+{ShortTerm(state.trace + st.events).to_markdown()}
 """
-    state.report_md = textwrap.dedent(md)
-    st.log("write", {"chars": len(state.report_md)})
-    return state
-
-def ticket_node(state: AgentState, st: ShortTerm):
-    allow = (state.confidence >= 0.6 and (len(state.evidence.get("logs",[]))>0) and len(state.evidence.get("kb",[]))>0)
-    if allow:
-        path = create_ticket({"payload": {"markdown": state.report_md}})
-        st.log("ticket", {"path": path.path})
-    else:
-        st.log("ticket", {"skipped": True})
-    return state
+    report_md = textwrap.dedent(md)
+    st.log("write", {"chars": len(report_md)})
+    return {"report_md": report_md, "trace": st.events}
+
+def _ticket_allowed(state: AgentState) -> bool:
+    return state.confidence >= 0.6 and (len(state.evidence.get("logs",[]))>0) and len(state.evidence.get("kb",[]))>0
+
+def ticket_node(state: AgentState):
+    st = ShortTerm()
+    if _ticket_allowed(state):
+        path = create_ticket({"payload": {"markdown": state.report_md, "scenario": state.scenario}})
+        st.log("ticket", {"id": path.id, "path": path.path, "deduped": path.deduped})
+        return {"ticket_path": path.path, "trace": st.events}
+    st.log("ticket", {"skipped": True})
+    return {"trace": st.events}
+
+async def aticket_node(state: AgentState):
+    st = ShortTerm()
+    if _ticket_allowed(state):
+        path = await acreate_ticket({"payload": {"markdown": state.report_md, "scenario": state.scenario}})
+        st.log("ticket", {"id": path.id, "path": path.path, "deduped": path.deduped})
+        return {"ticket_path": path.path, "trace": st.events}
+    st.log("ticket", {"skipped": True})
+    return {"trace": st.events}
 
 # ---- Graph wiring ----
+def _timed(name: str, fn, afn=None):
+    """Node runnable (sync `fn` for invoke, async `afn` for ainvoke) that
+    records its wall time in state.timings[name] (ms) and, with spans
+    enabled, the node span plus its tool spans in state.spans. Nodes
+    without I/O pass no `afn` and run inline on the event loop."""
+    def done(out, t0, sink):
+        out = {**out, "timings": {name: round((time.perf_counter() - t0) * 1000.0, 3)}}
+        if sink:
+            out["spans"] = sink
+        return out
+
+    def run(s):
+        with spans.collect() as sink:
+            t0 = time.perf_counter()
+            with spans.span(name, "node"):
+                out = fn(s)
+        return done(out, t0, sink)
+
+    async def arun(s):
+        with spans.collect() as sink:
+            t0 = time.perf_counter()
+            with spans.span(name, "node"):
+                out = await afn(s) if afn is not None else fn(s)
+        return done(out, t0, sink)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
 def build_graph():
+    """Compile a fresh graph. Prefer get_graph(), which compiles once."""
     g = StateGraph(AgentState)
-    st = ShortTerm()
 
-    g.add_node("plan", lambda s: plan_node(s, st))
-    g.add_node("collect_evidence", lambda s: collect_evidence_node(s, st))
-    g.add_node("decide", lambda s: decide_node(s, st))
-    g.add_node("maybe_more", lambda s: maybe_gather_more(s, st))
-    g.add_node("write", lambda s: write_node(s, st))
-    g.add_node("ticket", lambda s: ticket_node(s, st))
+    g.add_node("plan", _timed("plan", plan_node, aplan_node))
+    g.add_node("evidence_timeseries", _timed("evidence_timeseries", evidence_timeseries_node, aevidence_timeseries_node))
+    g.add_node("evidence_logs", _timed("evidence_logs", evidence_logs_node, aevidence_logs_node))
+    g.add_node("recall", _timed("recall", recall_node, arecall_node))
+    g.add_node("decide", _timed("decide", decide_node))
+    g.add_node("maybe_more", _timed("maybe_more", maybe_gather_more, amaybe_gather_more))
+    g.add_node("write", _timed("write", write_node))
+    g.add_node("ticket", _timed("ticket", ticket_node, aticket_node))
+    g.add_node("remember", _timed("remember", remember_node, aremember_node))
 
     g.add_edge(START, "plan")
-    g.add_edge("plan", "collect_evidence")
-    g.add_edge("collect_evidence", "decide")
+    # fan out: the evidence branches run in the same step, decide waits for all
+    g.add_edge("plan", "evidence_timeseries")
+    g.add_edge("plan", "evidence_logs")
+    g.add_edge("plan", "recall")
+    g.add_edge(["evidence_timeseries", "evidence_logs", "recall"], "decide")
     g.add_edge("decide", "maybe_more")
     g.add_edge("maybe_more", "write")
     g.add_edge("write", "ticket")
-    g.add_edge("ticket", END)
+    g.add_edge("ticket", "remember")
+    g.add_edge("remember", END)
 
     return g.compile()
+
+@functools.lru_cache(maxsize=1)
+def get_graph():
+    """The process-wide compiled graph. All per-run data lives in the state,
+    so it is safe to share across threads and concurrent (a)invoke calls."""
+    return build_graph()
+
+def incident_concurrency() -> int:
+    return max(1, int(os.getenv("INCIDENT_CONCURRENCY", "64")))
+
+async def arun_incidents(states: List[AgentState], concurrency: int | None = None) -> List[Dict[str, Any]]:
+    """Investigate many incidents on one event loop; results line up with `states`.
+
+    At most `concurrency` (INCIDENT_CONCURRENCY) runs are in flight at
+    once; their tool calls share the bounded tool pool (TOOL_CONCURRENCY).
+    """
+    sem = asyncio.Semaphore(concurrency or incident_concurrency())
+    app = get_graph()
+
+    async def one(state: AgentState):
+        async with sem:
+            return await app.ainvoke(state)
+
+    return await asyncio.gather(*(one(s) for s in states))
@@ -1,34 +1,366 @@
 from __future__ import annotations
-import os, json
+import os, functools, json, re, threading, time
+import importlib.util
 from pathlib import Path
-from transformers import pipeline
+from .plancache import PLAN_CACHE, PlanCache
+from .spans import traced
 
 PROMPTS_DIR = Path(__file__).resolve().parents[1] / "app" / "prompts"
 
 # You can override with: export HUGGINGFACE_MODEL=HuggingFaceH4/zephyr-7b-beta
 MODEL_NAME = os.getenv("HUGGINGFACE_MODEL", "distilgpt2")
-_gen = pipeline("text-generation", model=MODEL_NAME, device=-1)
 
-def call_planner(desc: str) -> dict:
+# Decoding modes (PLANNER_DECODING):
+#   legacy - max_length=256, then take the first "{" .. last "}" of the whole text
+#   json   - prime with "{", generate only new tokens, stop when the object closes;
+#            the object is checked field by field against the plan schema
+#   steps  - prime with '{"steps": ["' and constrain decoding to the steps list
+#            of the plan schema: a logits processor only allows tokens that
+#            continue STEP ('", "' STEP)* '"]' with STEP from STEP_VOCAB, and
+#            generation stops at the "]". Only the steps are model output;
+#            stop_condition / confidence_hint always come from DEFAULT_PLAN.
+# "schema" is the old name of "steps" and is still accepted.
+DECODING_MODES = ("legacy", "json", "steps")
+STEP_VOCAB = ("triage", "timeseries", "logs", "hypothesize", "verify", "remediate")
+DEFAULT_PLAN = {
+    "steps": list(STEP_VOCAB),
+    "stop_condition": "confidence>=0.6 and evidence_sources>=2",
+    "confidence_hint": 0.3,
+}
+
+# Pipelines are built on first use (one per model name), never at import,
+# so entry points that fall back to the static plan never load torch.
+_gens: dict = {}
+_gen_lock = threading.Lock()
+
+
+def planner_enabled() -> bool:
+    """False when NO_PLANNER=1 (set by --no-planner on the CLIs)."""
+    return os.getenv("NO_PLANNER", "0").strip().lower() not in ("1", "true", "yes")
+
+
+def planner_available() -> bool:
+    """Planner is enabled and transformers is installed (checked without importing it)."""
+    return planner_enabled() and importlib.util.find_spec("transformers") is not None
+
+
+def current_model() -> str:
+    return os.getenv("HUGGINGFACE_MODEL", MODEL_NAME)
+
+
+def decoding_mode() -> str:
+    mode = os.getenv("PLANNER_DECODING", "steps").strip().lower()
+    mode = "steps" if mode == "schema" else mode
+    return mode if mode in DECODING_MODES else "steps"
+
+
+def quantize_mode() -> str:
+    """"int8" for a dynamically quantized CPU model, else ""."""
+    return "int8" if os.getenv("PLANNER_QUANTIZE", "").strip().lower() == "int8" else ""
+
+
+def max_new_tokens() -> int:
+    return int(os.getenv("PLANNER_MAX_NEW_TOKENS", "96"))
+
+
+def _cache_model_id() -> str:
+    # decoding mode and quantization change the output, so they are part of the key
+    return f"{current_model()}|{decoding_mode()}|{quantize_mode()}"
+
+
+def _generator(model_name: str | None = None, quantize: str | None = None):
+    name = model_name or current_model()
+    quantize = quantize_mode() if quantize is None else quantize
+    gen = _gens.get((name, quantize))
+    if gen is None:
+        with _gen_lock:
+            gen = _gens.get((name, quantize))
+            if gen is None:
+                from transformers import pipeline  # heavy: pulls in torch
+                gen = pipeline("text-generation", model=name, device=-1)
+                if quantize == "int8":
+                    import torch
+                    # dynamic quantization only handles nn.Linear: GPT-2 style blocks
+                    # (transformers' Conv1D) are converted first, or only the LM head
+                    # would be int8
+                    _conv1d_to_linear(gen.model)
+                    gen.model = torch.quantization.quantize_dynamic(gen.model, {torch.nn.Linear}, dtype=torch.qint8)
+                # batched prompts need a pad token; decoder-only models pad on the left
+                if gen.tokenizer.pad_token_id is None:
+                    gen.tokenizer.pad_token = gen.tokenizer.eos_token
+                gen.tokenizer.padding_side = "left"
+                _gens[(name, quantize)] = gen
+    return gen
+
+
+def _conv1d_to_linear(model) -> int:
+    """Replace transformers' Conv1D modules (x @ W + b, W stored in x out) with
+    equivalent nn.Linear ones, in place; returns how many were replaced."""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    swaps = [(name, m) for name, m in model.named_modules() if isinstance(m, Conv1D)]
+    for name, conv in swaps:
+        parent_name, _, child = name.rpartition(".")
+        nx, nf = conv.weight.shape
+        lin = torch.nn.Linear(nx, nf, bias=conv.bias is not None)
+        with torch.no_grad():
+            lin.weight.copy_(conv.weight.t())
+            if conv.bias is not None:
+                lin.bias.copy_(conv.bias)
+        setattr(model.get_submodule(parent_name) if parent_name else model, child, lin)
+    return len(swaps)
+
+
+def warmup() -> bool:
+    """Load the planner model now (e.g. in a long-running worker). Returns False if disabled."""
+    if not planner_available():
+        return False
+    _generator()
+    return True
+
+
+@traced("llm:call_planner", "llm")
+def call_planner(desc: str, info: dict | None = None, cache: PlanCache | None = PLAN_CACHE) -> dict:
     """Use a Hugging Face model to produce a JSON planning object.
     Falls back to a static plan if parsing fails.
+
+    Plans are cached per (model + decoding settings, planner prompt, normalized
+    description). When `info` is given it receives `cache` ("memory", "disk"
+    or "miss") and, after generation, `mode`, `new_tokens` and `latency_ms`.
     """
     prompt = (PROMPTS_DIR / "planner.md").read_text()
-    user = f"Incident description: {desc}\n\nProduce JSON plan with fields: steps[], stop_condition, confidence_hint (0-1)."
+    key = PlanCache.key(_cache_model_id(), prompt, desc) if cache is not None else None
+    if cache is not None:
+        plan, tier = cache.lookup(key)
+        if info is not None:
+            info["cache"] = tier
+        if plan is not None:
+            return plan
+
+    t0 = time.perf_counter()
+    (plan, n_tokens), = _decode([prompt + "\n" + _user_msg(desc)])
+    if info is not None:
+        info.update(mode=decoding_mode(), new_tokens=n_tokens,
+                    latency_ms=round((time.perf_counter() - t0) * 1000.0, 1))
+    if cache is not None:
+        cache.put(key, plan)
+    return plan
+
+
+def _user_msg(desc: str) -> str:
+    return f"Incident description: {desc}\n\nProduce JSON plan with fields: steps[], stop_condition, confidence_hint (0-1)."
+
+
+def _stopping(tokenizer, done, prompt_len: int):
+    """StoppingCriteria for one `generate` call whose (padded) prompts are
+    `prompt_len` tokens: ends each row once `done(new_text)` is true."""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _Stop(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            rows = [done(tokenizer.decode(r[prompt_len:], skip_special_tokens=True)) for r in input_ids]
+            return torch.tensor(rows, dtype=torch.bool, device=input_ids.device)
 
-    txt = _gen(prompt + "\n" + user, max_length=256, num_return_sequences=1)[0]["generated_text"]
+    return StoppingCriteriaList([_Stop()])
+
+
+# ---------- steps grammar ----------
+# Character automaton for what follows the primed '{"steps": ["'. States:
+# ("name", p) inside a step name with prefix p, ("quote",) after its closing
+# quote, ("comma",) / ("space",) inside the '", "' separator, ("end",) after "]".
+_START = ("name", "")
+_STEP_CHARS = frozenset("".join(STEP_VOCAB)) | frozenset('", ]')
+
+
+def _step_char(state, ch: str):
+    kind = state[0]
+    if kind == "name":
+        p = state[1] + ch
+        if any(s.startswith(p) for s in STEP_VOCAB):
+            return ("name", p)
+        return ("quote",) if ch == '"' and state[1] in STEP_VOCAB else None
+    if kind == "quote":
+        return {",": ("comma",), "]": ("end",)}.get(ch)
+    if kind == "comma":
+        return {" ": ("space",), '"': _START}.get(ch)
+    if kind == "space":
+        return _START if ch == '"' else None
+    return None
+
+
+@functools.lru_cache(maxsize=4)
+def _step_table(tokenizer):
+    """state -> {token id: next state} for every token whose text keeps the
+    steps list well formed from that state (built once per tokenizer)."""
+    states = [("name", s[:i]) for s in STEP_VOCAB for i in range(len(s) + 1)]
+    states = list(dict.fromkeys(states + [("quote",), ("comma",), ("space",), ("end",)]))
+    texts = {}
+    for i in range(len(tokenizer)):
+        t = tokenizer.decode([i])
+        if t and _STEP_CHARS.issuperset(t):
+            texts[i] = t
+    table = {}
+    for state in states:
+        moves = {}
+        for i, t in texts.items():
+            nxt = state
+            for ch in t:
+                nxt = _step_char(nxt, ch)
+                if nxt is None:
+                    break
+            if nxt is not None:
+                moves[i] = nxt
+        table[state] = moves
+    return table
+
+
+def _steps_processor(tokenizer, prompt_len: int):
+    """LogitsProcessor for one `generate` call whose (padded) prompts are
+    `prompt_len` tokens: masks every token that would break the steps list;
+    once it is closed (or no token fits) only EOS remains."""
+    import torch
+    from transformers import LogitsProcessor, LogitsProcessorList
+
+    table = _step_table(tokenizer)
+    eos = tokenizer.eos_token_id
+
+    class _Steps(LogitsProcessor):
+        def __call__(self, input_ids, scores):
+            mask = torch.full_like(scores, float("-inf"))
+            for r, ids in enumerate(input_ids[:, prompt_len:].tolist()):
+                state = _START
+                for t in ids:
+                    state = table.get(state, {}).get(t)
+                    if state is None:
+                        break
+                allowed = [i for i in table.get(state, {}) if i < scores.shape[1]] if state else []
+                mask[r, allowed or [eos]] = 0.0
+            return scores + mask
+
+    return LogitsProcessorList([_Steps()])
+
+
+def _decode(texts: list[str], batch_size: int = 1) -> list[tuple[dict, int]]:
+    """Run the pipeline in the current decoding mode; returns (plan, new_tokens) per text."""
+    gen = _generator()
+    tok = gen.tokenizer
+    mode = decoding_mode()
+
+    if mode == "legacy":
+        outs = gen(texts, batch_size=batch_size, max_length=256, num_return_sequences=1)
+        res = []
+        for t, out in zip(texts, outs):
+            full = out[0]["generated_text"]
+            res.append((_parse_plan(full), len(tok(full).input_ids) - len(tok(t).input_ids)))
+        return res
+
+    prefix = "{" if mode == "json" else '{"steps": ["'
+    done = _json_closed if mode == "json" else (lambda s: "]" in s)
+    res = []
+    # generate directly (not through the pipeline) so each batch's stopping
+    # criteria know exactly where its prompts end
+    for i in range(0, len(texts), max(1, batch_size)):
+        enc = tok([t + "\n" + prefix for t in texts[i:i + batch_size]], return_tensors="pt", padding=True)
+        n = enc["input_ids"].shape[1]
+        extra = {"logits_processor": _steps_processor(tok, n)} if mode == "steps" else {}
+        out = gen.model.generate(**enc, max_new_tokens=max_new_tokens(), do_sample=False,
+                                 pad_token_id=tok.pad_token_id, stopping_criteria=_stopping(tok, done, n), **extra)
+        for new in tok.batch_decode(out[:, n:], skip_special_tokens=True):
+            plan = _parse_plan(prefix + new) if mode == "json" else _normalize_steps(new)
+            res.append((plan, len(tok(new).input_ids)))
+    return res
+
+
+def _json_closed(text: str) -> bool:
+    """True once the "{" primed before `text` is balanced (strings respected)."""
+    depth, in_str, esc = 1, False, False
+    for ch in text:
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+def _normalize_steps(steps_text: str) -> dict:
+    """Plan from a constrained steps list: its complete step names, first
+    occurrence each (a list cut off by max_new_tokens keeps what it has),
+    everything else from DEFAULT_PLAN."""
+    steps = []
+    for item in re.split(r'[",]+', steps_text.split("]", 1)[0]):
+        word = item.strip()
+        if word in STEP_VOCAB and word not in steps:
+            steps.append(word)
+    return {**DEFAULT_PLAN, "steps": steps or list(DEFAULT_PLAN["steps"])}
+
+
+def _parse_plan(txt: str) -> dict:
+    """The first "{" .. last "}" of `txt` as a plan, checked by `_validate_plan`."""
     start = txt.find("{"); end = txt.rfind("}")
     snippet = txt[start:end+1] if (start != -1 and end != -1 and end > start) else ""
-
     try:
         plan = json.loads(snippet)
-        # basic shape check
-        if not isinstance(plan.get("steps", []), list):
-            raise ValueError("steps not list")
-        return plan
-    except Exception:
-        return {
-            "steps":["triage","timeseries","logs","hypothesize","verify","remediate"],
-            "stop_condition":"confidence>=0.6 and evidence_sources>=2",
-            "confidence_hint":0.3
-        }
+    except ValueError:
+        plan = None
+    return _validate_plan(plan if isinstance(plan, dict) else {})
+
+
+def _validate_plan(plan: dict) -> dict:
+    """The plan schema, field by field: `steps` a non-empty list of known step
+    names (unknown entries dropped, first occurrence kept), `stop_condition` a
+    non-empty string, `confidence_hint` a number in [0, 1]. A field that is
+    missing or does not fit comes from DEFAULT_PLAN; other keys are dropped."""
+    steps = plan.get("steps")
+    steps = [s for s in dict.fromkeys(s.strip().lower() for s in steps if isinstance(s, str))
+             if s in STEP_VOCAB] if isinstance(steps, list) else []
+    stop = plan.get("stop_condition")
+    hint = plan.get("confidence_hint")
+    ok_hint = isinstance(hint, (int, float)) and not isinstance(hint, bool) and 0.0 <= hint <= 1.0
+    return {
+        "steps": steps if steps else list(DEFAULT_PLAN["steps"]),
+        "stop_condition": stop.strip() if isinstance(stop, str) and stop.strip() else DEFAULT_PLAN["stop_condition"],
+        "confidence_hint": float(hint) if ok_hint else DEFAULT_PLAN["confidence_hint"],
+    }
+
+
+@traced("llm:call_planner_batch", "llm")
+def call_planner_batch(descs: list[str], batch_size: int = 8, cache: PlanCache | None = PLAN_CACHE) -> list[dict]:
+    """Plan many incidents at once; results line up with `descs`.
+
+    Cached plans are returned directly. The remaining unique descriptions
+    go through the pipeline in left-padded batches of `batch_size`.
+    """
+    prompt = (PROMPTS_DIR / "planner.md").read_text()
+    model = _cache_model_id()
+    keys = [PlanCache.key(model, prompt, d) for d in descs]
+    plans: dict = {}
+    todo: dict = {}  # key -> description, first occurrence wins
+    for k, d in zip(keys, descs):
+        if k in plans or k in todo:
+            continue
+        plan = cache.get(k) if cache is not None else None
+        if plan is not None:
+            plans[k] = plan
+        else:
+            todo[k] = d
+
+    if todo:
+        texts = [prompt + "\n" + _user_msg(d) for d in todo.values()]
+        for k, (plan, _) in zip(todo, _decode(texts, batch_size=batch_size)):
+            plans[k] = plan
+            if cache is not None:
+                cache.put(k, plan)
+    return [plans[k] for k in keys]
@@ -0,0 +1,299 @@
+# app/logindex.py  (persistent inverted index over JSONL logs)
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+from array import array
+import hashlib, json, os, pathlib, re, shutil, threading
+import numpy as np
+from .logstream import loads, parse_ts
+
+# same root as the timeseries store and RAG index (INCIDENT_CACHE_DIR)
+CACHE_DIR = pathlib.Path(os.getenv("INCIDENT_CACHE_DIR") or pathlib.Path(__file__).resolve().parents[1] / ".cache") / "logindex"
+INDEX_VERSION = 3
+FIELDS = ("level", "sensor", "gateway")
+
+# Tokens are maximal runs of word characters in the lowercased `json.dumps` of
+# each record, the text search_logs has always matched against (not the raw
+# line: `1e3` is indexed as `1000.0`, `\u0041` as `a`).
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+def _signature(path: pathlib.Path) -> Dict[str, Any]:
+    st = path.stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _index_dir(path: pathlib.Path) -> pathlib.Path:
+    key = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"{path.name}-{key}"
+
+
+def _to_csr(groups: Dict[str, array]):
+    """Flatten {key: line ids} into (keys, indptr, postings) CSR arrays."""
+    keys = sorted(groups)
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    for i, k in enumerate(keys):
+        indptr[i + 1] = indptr[i] + len(groups[k])
+    postings = np.empty(int(indptr[-1]), dtype=np.int64)
+    for i, k in enumerate(keys):
+        postings[indptr[i]:indptr[i + 1]] = np.frombuffer(groups[k], dtype=np.int64)
+    return keys, indptr, postings
+
+
+class LogIndex:
+    """Inverted index over one JSONL log file.
+
+    Maps every word token (and the values of `level`/`sensor`/`gateway`) to the
+    line numbers containing it, plus a byte offset per line so hits can be read
+    back with a seek. Line timestamps are kept sorted (`ts_sorted`, with the
+    line of each in `ts_order`), so a time range is two binary searches. The
+    index is saved under `.cache/logindex/` and rebuilt only when the log's
+    mtime or size changes.
+    """
+
+    def __init__(self, source: pathlib.Path, sig: Dict[str, Any], offsets: np.ndarray,
+                 terms: List[str], indptr: np.ndarray, postings: np.ndarray,
+                 fields: Dict[str, Any], ts_sorted: np.ndarray, ts_order: np.ndarray,
+                 ts_monotonic: bool):
+        self.source = source
+        self.sig = sig
+        self.offsets = offsets
+        self.terms = terms
+        self.indptr = indptr
+        self.postings = postings
+        self.ts_sorted = ts_sorted  # epoch seconds, ascending, NaN (no ts) last
+        self.ts_order = ts_order
+        self.ts_monotonic = ts_monotonic  # file already in time order: ts_order is 0..n-1
+        # field -> {"values": [...], "indptr": ..., "postings": ...} (CSR per field)
+        self.fields = fields
+        for d in fields.values():
+            d["ids"] = {v: i for i, v in enumerate(d["values"])}
+        self._expand_cache: Dict[str, np.ndarray] = {}
+
+    # ---------- build / persist ----------
+    @classmethod
+    def build(cls, path: pathlib.Path) -> "LogIndex":
+        path = pathlib.Path(path)
+        sig = _signature(path)
+        offsets = array("q")
+        stamps = array("d")
+        words: Dict[str, array] = {}
+        field_vals: Dict[str, Dict[str, array]] = {f: {} for f in FIELDS}
+        n = 0
+        pos = 0
+        with open(path, "rb") as f:
+            for raw in f:
+                start = pos
+                pos += len(raw)
+                if not raw.strip():
+                    continue
+                j = loads(raw)
+                offsets.append(start)
+                stamps.append(parse_ts(j.get("ts")) if isinstance(j, dict) else float("nan"))
+                for tok in set(_WORD.findall(json.dumps(j).lower())):
+                    words.setdefault(tok, array("q")).append(n)
+                for fld in FIELDS:
+                    v = j.get(fld) if isinstance(j, dict) else None
+                    if v is not None:
+                        field_vals[fld].setdefault(str(v).lower(), array("q")).append(n)
+                n += 1
+
+        terms, indptr, postings = _to_csr(words)
+        fields = {}
+        for fld, groups in field_vals.items():
+            vals, f_indptr, f_post = _to_csr(groups)
+            fields[fld] = {"values": vals, "indptr": f_indptr, "postings": f_post}
+        ts = np.frombuffer(stamps, dtype=np.float64)
+        order = np.argsort(ts, kind="stable")
+        return cls(path, sig, np.frombuffer(offsets, dtype=np.int64).copy(),
+                   terms, indptr, postings, fields, ts[order], order,
+                   bool(np.all(order == np.arange(len(order)))))
+
+    def save(self) -> pathlib.Path:
+        out = _index_dir(self.source)
+        tmp = out.with_name(out.name + f".tmp{os.getpid()}.{threading.get_ident()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "offsets.npy", self.offsets)
+        np.save(tmp / "indptr.npy", self.indptr)
+        np.save(tmp / "postings.npy", self.postings)
+        np.save(tmp / "ts_sorted.npy", self.ts_sorted)
+        np.save(tmp / "ts_order.npy", self.ts_order)
+        field_meta = {}
+        for fld, d in self.fields.items():
+            np.save(tmp / f"{fld}.indptr.npy", d["indptr"])
+            np.save(tmp / f"{fld}.postings.npy", d["postings"])
+            field_meta[fld] = list(d["values"])
+        meta = {
+            "version": INDEX_VERSION,
+            "source": str(self.source.resolve()),
+            **self.sig,
+            "terms": self.terms,
+            "fields": field_meta,
+            "ts_monotonic": self.ts_monotonic,
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(tmp, out)
+        return out
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> Optional["LogIndex"]:
+        """Load a saved index if it is still valid for `path`, else None."""
+        path = pathlib.Path(path)
+        d = _index_dir(path)
+        try:
+            meta = json.loads((d / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        sig = _signature(path)
+        if meta.get("version") != INDEX_VERSION or any(meta.get(k) != v for k, v in sig.items()):
+            return None
+        fields = {}
+        for fld, vals in meta["fields"].items():
+            fields[fld] = {
+                "values": vals,
+                "indptr": np.load(d / f"{fld}.indptr.npy", mmap_mode="r"),
+                "postings": np.load(d / f"{fld}.postings.npy", mmap_mode="r"),
+            }
+        return cls(path, sig,
+                   np.load(d / "offsets.npy", mmap_mode="r"),
+                   meta["terms"],
+                   np.load(d / "indptr.npy", mmap_mode="r"),
+                   np.load(d / "postings.npy", mmap_mode="r"),
+                   fields,
+                   np.load(d / "ts_sorted.npy", mmap_mode="r"),
+                   np.load(d / "ts_order.npy", mmap_mode="r"),
+                   meta["ts_monotonic"])
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "LogIndex":
+        """Return a valid index for `path`, building and saving it if needed."""
+        path = pathlib.Path(path)
+        cached = _OPEN.get(str(path))
+        if cached is not None and cached.sig == _signature(path):
+            return cached
+        with _OPEN_LOCK:  # tool threads share one build per log
+            cached = _OPEN.get(str(path))
+            if cached is not None and cached.sig == _signature(path):
+                return cached
+            idx = cls.load(path)
+            if idx is None:
+                idx = cls.build(path)
+                try:
+                    idx.save()
+                except OSError:
+                    pass  # read-only checkout: keep the in-memory index
+            _OPEN[str(path)] = idx
+        return idx
+
+    # ---------- query ----------
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _expand(self, word: str) -> List[np.ndarray]:
+        """Posting lists of every term containing `word` (substring semantics)."""
+        hit = self._expand_cache.get(word)
+        if hit is None:
+            hit = [self.postings[self.indptr[j]:self.indptr[j + 1]]
+                   for j, t in enumerate(self.terms) if word in t]
+            if len(self._expand_cache) > 1024:
+                self._expand_cache.clear()
+            self._expand_cache[word] = hit
+        return hit
+
+    def _field_lines(self, fld: str, value: str) -> List[np.ndarray]:
+        d = self.fields.get(fld)
+        i = d["ids"].get(value.lower()) if d is not None else None
+        if i is None:
+            return []
+        return [d["postings"][d["indptr"][i]:d["indptr"][i + 1]]]
+
+    @staticmethod
+    def _window(lists: List[np.ndarray], lo: int, hi: int) -> np.ndarray:
+        """Sorted union of the entries of `lists` that fall in [lo, hi)."""
+        parts = []
+        for post in lists:
+            a, b = np.searchsorted(post, (lo, hi))
+            if b > a:
+                parts.append(post[a:b])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts)) if len(parts) > 1 else np.asarray(parts[0])
+
+    def lines_between(self, t0: Optional[float] = None, t1: Optional[float] = None) -> np.ndarray:
+        """Sorted line numbers whose `ts` is in [t0, t1] (either bound open)."""
+        lo = 0 if t0 is None else int(np.searchsorted(self.ts_sorted, t0, side="left"))
+        # NaN sorts last and never compares <= t1, so an open end stops before it
+        hi = (int(np.searchsorted(self.ts_sorted, np.inf, side="right")) if t1 is None
+              else int(np.searchsorted(self.ts_sorted, t1, side="right")))
+        if self.ts_monotonic:
+            return np.arange(lo, hi, dtype=np.int64)
+        return np.sort(self.ts_order[lo:hi])
+
+    def read_line(self, line_no: int, f) -> Dict[str, Any]:
+        f.seek(int(self.offsets[line_no]))
+        return loads(f.readline())
+
+    def query(self, query: str, limit: int = 20, level: Optional[str] = None,
+              sensor: Optional[str] = None, gateway: Optional[str] = None,
+              t0: Optional[float] = None, t1: Optional[float] = None) -> List[Dict[str, Any]]:
+        """OR-query over `|`-separated tokens, in file order, up to `limit` hits.
+
+        Matches the old scan: a token hits a line if it is a substring of the
+        line's lowercased JSON. Plain word tokens are answered from the index
+        alone; tokens with spaces or punctuation are narrowed through the
+        index and then verified against the line text. Posting lists are
+        walked in growing line-number windows, so the cost follows `limit`
+        rather than the total number of matches. `t0`/`t1` (epoch seconds,
+        inclusive) restrict hits to that time range: the walk starts at the
+        range's first line and stops after its last.
+        """
+        exact: List[np.ndarray] = []
+        verify = []  # (token, [posting lists per word]) -> AND of words, then substring check
+        for tok in query.lower().split("|"):
+            words = _WORD.findall(tok)
+            if words and words[0] == tok:
+                exact.extend(self._expand(tok))
+            else:
+                # punctuation-only tokens have no words: every line is a candidate
+                verify.append((tok, [self._expand(w) for w in words]))
+        filters = [self._field_lines(fld, val)
+                   for fld, val in (("level", level), ("sensor", sensor), ("gateway", gateway))
+                   if val is not None]
+
+        hits: List[Dict[str, Any]] = []
+        lo, n = 0, len(self)
+        if t0 is not None or t1 is not None:
+            in_range = self.lines_between(t0, t1)
+            if not len(in_range):
+                return hits
+            filters.append([in_range])
+            lo, n = int(in_range[0]), int(in_range[-1]) + 1
+        span = max(4096, limit * 64)
+        with open(self.source, "rb") as f:
+            while lo < n and len(hits) < limit:
+                hi = min(n, lo + span)
+                exact_lines = self._window(exact, lo, hi)
+                cand = []
+                for _, per_word in verify:
+                    c = np.arange(lo, hi, dtype=np.int64)
+                    for lists in per_word:
+                        c = np.intersect1d(c, self._window(lists, lo, hi), assume_unique=True)
+                    cand.append(c)
+                lines = np.union1d(exact_lines, np.concatenate(cand)) if cand else exact_lines
+                for flt in filters:
+                    lines = np.intersect1d(lines, self._window(flt, lo, hi), assume_unique=True)
+                is_exact = np.isin(lines, exact_lines, assume_unique=True)
+
+                for line_no, ok in zip(lines.tolist(), is_exact.tolist()):
+                    if len(hits) >= limit:
+                        break
+                    j = self.read_line(line_no, f)
+                    if ok or any(tok in json.dumps(j).lower() for tok, _ in verify):
+                        hits.append(j)
+                lo, span = hi, span * 2
+        return hits
+
+
+_OPEN: Dict[str, LogIndex] = {}
+_OPEN_LOCK = threading.Lock()
@@ -0,0 +1,108 @@
+# app/logstream.py  (streaming JSONL reader for live and rotated logs)
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timezone
+import gzip, io, json, math, pathlib, re
+
+# Faster JSON decoding when available; same Python objects either way.
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - optional speedup
+    loads = json.loads
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - only needed for .zst rotations
+    zstandard = None
+
+CHUNK_BYTES = 1 << 20  # decompressed read size; memory stays flat per file
+
+# float literals; json.dumps rewrites those that are not in repr() form (1e3 -> 1000.0)
+_FLOAT = re.compile(rb"\d+\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+")
+
+
+def parse_ts(value: Any) -> float:
+    """Epoch seconds of a log line's `ts` (ISO 8601, naive = UTC, or a number); NaN if absent."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            d = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+        except ValueError:
+            return math.nan
+        return (d if d.tzinfo else d.replace(tzinfo=timezone.utc)).timestamp()
+    return math.nan
+
+
+def log_paths(log_dir: pathlib.Path, scenario: str) -> List[pathlib.Path]:
+    """Live log first, then rotations (`.1`, `.2`, ...), each plain, `.gz` or `.zst`."""
+    pat = re.compile(rf"^{re.escape(scenario)}\.jsonl(?:\.(\d+))?(\.gz|\.zst)?$")
+    found = []
+    for p in log_dir.glob(f"{scenario}.jsonl*"):
+        m = pat.match(p.name)
+        if m:
+            found.append((int(m.group(1) or 0), m.group(2) or "", p))
+    return [p for _, _, p in sorted(found)]
+
+
+def open_log(path: pathlib.Path):
+    """Binary, line-iterable stream over a plain, gzip or zstd JSONL file."""
+    path = pathlib.Path(path)
+    if path.suffix == ".gz":
+        return io.BufferedReader(gzip.open(path, "rb"), buffer_size=CHUNK_BYTES)
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path.name}: install `zstandard` to read .zst logs")
+        fh = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(fh, read_size=CHUNK_BYTES, closefd=True)
+        return io.BufferedReader(reader, buffer_size=CHUNK_BYTES)
+    return open(path, "rb", buffering=CHUNK_BYTES)
+
+
+def _same_words(raw: bytes) -> bool:
+    """True if an ASCII line's words are exactly those of its `json.dumps`: no
+    escapes, and every float literal already in the form json.dumps writes."""
+    return b"\\" not in raw and all(repr(float(m)).encode() == m for m in _FLOAT.findall(raw))
+
+
+def iter_records(path: pathlib.Path) -> Iterator[Dict[str, Any]]:
+    with open_log(path) as f:
+        for raw in f:
+            if raw.strip():
+                yield loads(raw)
+
+
+def iter_matches(path: pathlib.Path, query: str, level: Optional[str] = None,
+                 sensor: Optional[str] = None, gateway: Optional[str] = None,
+                 t0: Optional[float] = None, t1: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Yield records matching an `|` OR-query, lazily, in file order.
+
+    Same rule as the indexed search: a token matches if it is a substring of
+    the record's lowercased `json.dumps`. ASCII lines that json.dumps would
+    write back with the same words, and whose raw text cannot contain any
+    token's words, are skipped without being decoded. `t0`/`t1`
+    (epoch seconds, inclusive) keep only lines whose `ts` falls between them.
+    """
+    toks = query.lower().split("|")
+    words = [[w.encode() for w in re.findall(r"[a-z0-9_]+", t)] for t in toks]
+    filters = [(k, v.lower()) for k, v in (("level", level), ("sensor", sensor), ("gateway", gateway))
+               if v is not None]
+    with open_log(path) as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            if raw.isascii() and _same_words(raw):
+                low = raw.lower()
+                if not any(all(w in low for w in ws) for ws in words):
+                    continue
+            j = loads(raw)
+            if any(str(j.get(k, "")).lower() != v for k, v in filters):
+                continue
+            if t0 is not None or t1 is not None:
+                ts = parse_ts(j.get("ts"))
+                if not ((t0 is None or ts >= t0) and (t1 is None or ts <= t1)):
+                    continue  # NaN (no ts) fails both comparisons
+            text = json.dumps(j).lower()
+            if any(tok in text for tok in toks):
+                yield j
@@ -1,22 +1,26 @@
 from __future__ import annotations
-import argparse, yaml, pathlib
+import argparse, yaml, pathlib, os
 from rich.console import Console
 from rich.markdown import Markdown
-from app.graph import build_graph, AgentState
+from app.graph import get_graph, AgentState
+from app import spans
 
-DATA_DIR = pathlib.Path(__file__).resolve().parents[1] / "data" / "scenarios"
+DATA_DIR = pathlib.Path(os.getenv("INCIDENT_DATA_DIR") or pathlib.Path(__file__).resolve().parents[1] / "data") / "scenarios"
 console = Console()
 
-def run_scenario(name: str, verbose: bool = False):
+def run_scenario(name: str, verbose: bool = False, trace_out: pathlib.Path | None = None):
     with open(DATA_DIR / f"{name}.yaml") as f:
         meta = yaml.safe_load(f)
-    state = AgentState(scenario=name, description=meta["description"])
+    state = AgentState(scenario=name, description=meta["description"], sensors=meta.get("sensors", []))
 
-    app = build_graph()
+    app = get_graph()
     console.rule(f"[bold]Incident: {name}")
 
     result = app.invoke(state)        # <- returns a dict-like state
     report_md = result.get("report_md", "")
+    if trace_out is not None:
+        spans.to_chrome_trace(result.get("spans", []), trace_out)
+        console.print(f"Chrome trace written to {trace_out} (open in ui.perfetto.dev)")
     console.rule("[bold]Final Report")
     console.print(Markdown(report_md))
 
@@ -25,5 +29,12 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--scenario", required=True)
     p.add_argument("--verbose", action="store_true")
+    p.add_argument("--trace-out", type=pathlib.Path, default=None,
+                   help="Record node/tool spans and write a Chrome/Perfetto trace JSON here.")
+    p.add_argument("--no-planner", action="store_true", help="Use the static plan; never load torch/transformers.")
     args = p.parse_args()
-    run_scenario(args.scenario, args.verbose)
+    if args.no_planner:
+        os.environ["NO_PLANNER"] = "1"
+    if args.trace_out is not None:
+        spans.enable(alloc=os.getenv("TRACE_SPANS", "").lower() == "alloc")
+    run_scenario(args.scenario, args.verbose, args.trace_out)
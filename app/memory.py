@@ -1,9 +1,21 @@
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+from pathlib import Path
+import hashlib, json, os, threading, time, zlib
+import numpy as np
+
+from .rag import analyze
+
+try:
+    import fcntl  # serialises writers across processes on POSIX
+except ImportError:  # Windows: one writing process per store
+    fcntl = None
+
+MEMORY_DIR = Path(os.getenv("INCIDENT_MEMORY_DIR") or Path(__file__).resolve().parents[1] / "models" / "memory")
 
 class ShortTerm:
-    def __init__(self):
-        self.events: List[Dict[str, Any]] = []
+    def __init__(self, events: List[Dict[str, Any]] | None = None):
+        self.events: List[Dict[str, Any]] = list(events or [])
     def log(self, kind: str, data: Dict[str, Any]):
         self.events.append({"kind": kind, **data})
     def to_markdown(self) -> str:
@@ -12,9 +24,286 @@ class ShortTerm:
             lines.append(f"- **{e['kind']}**: {{ {', '.join(f'{k}:{v}' for k,v in e.items() if k!='kind')} }}")
         return "\n".join(lines)
 
+# ---------- Long-term incident memory ----------
+def embed(text: str, dim: int = 128) -> np.ndarray:
+    """Unit-length hashed bag of unigrams and bigrams (signed feature hashing)."""
+    toks = analyze(text)
+    feats = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+    v = np.zeros(dim, dtype=np.float32)
+    if not feats:
+        return v
+    h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.int64, count=len(feats))
+    sign = np.where((h >> 16) & 1, 1.0, -1.0)
+    np.add.at(v, h % dim, sign)
+    v = np.sign(v) * np.log1p(np.abs(v))  # damp repeated tokens
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+def _id_hash(summary_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(summary_id.encode("utf-8"), digest_size=8).digest(), "little")
+
 class LongTerm:
-    # Placeholder for future vector store of past incidents
-    def __init__(self, name: str = "incidents"):
+    """Append-only on-disk store of past incidents with approximate recall.
+
+    Each record (any JSON dict with an "id") goes to `records.jsonl`; its
+    byte offset and an int8-quantised embedding go to flat binary files
+    that are memory-mapped on read. The offset is written last, so a crash
+    mid-append leaves the row invisible and the next append overwrites it.
+    Rows are never rewritten: upserting an id again appends a new row and
+    tombstones the id's previous one in `dead.u8` (one byte per row), so
+    recall only ever sees the newest version of each id. The previous rows
+    are found by scanning `ids.u64`, a 64-bit hash of each row's id written
+    in the same append, so no JSON is re-read.
+
+    Recall is an IVF index: spherical k-means centroids (trained once the
+    store holds TRAIN_MIN rows, retrained when it grows RETRAIN_GROWTH-fold),
+    each row's nearest centroid, and the rows sorted by centroid. A query
+    scans the `nprobe` closest lists plus the rows appended since the last
+    sort (at most MERGE_TAIL) and re-ranks them by cosine. Smaller stores
+    are scanned exactly.
+    """
+
+    TRAIN_MIN = 16384
+    RETRAIN_GROWTH = 8
+    MERGE_TAIL = 8192
+    NPROBE = 32
+
+    def __init__(self, name: str = "incidents", root: Optional[Path] = None, dim: int = 128,
+                 nprobe: int = NPROBE, seed: int = 0):
         self.name = name
-    def upsert(self, summary_id: str, text: str, meta: Dict[str, Any]):
-        pass
+        self.path = Path(root or MEMORY_DIR) / name
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._mapped: Dict[str, Tuple[Tuple[int, int], np.ndarray]] = {}
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        else:
+            meta = {"dim": dim, "seed": seed}
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        self.dim, self.seed = meta["dim"], meta["seed"]
+
+    # ---------- files ----------
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    def _rows(self, name: str, width: int) -> int:
+        try:
+            return self._file(name).stat().st_size // width
+        except FileNotFoundError:
+            return 0
+
+    def __len__(self) -> int:
+        return min(self._rows("offsets.i64", 8), self._rows("vectors.i8", self.dim))
+
+    def _map(self, name: str, dtype, width: int) -> np.ndarray:
+        """Memory-mapped view of a flat file as (rows, width); remapped when it changes."""
+        p = self._file(name)
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            return np.empty((0, width), dtype=dtype)
+        key = (st.st_size, st.st_mtime_ns)
+        hit = self._mapped.get(name)
+        if hit is None or hit[0] != key:
+            rows = st.st_size // (np.dtype(dtype).itemsize * width)
+            # plain ndarray view of the map: memmap.__getitem__ is slow on many small slices
+            arr = (np.asarray(np.memmap(p, dtype=dtype, mode="r", shape=(rows, width))) if rows
+                   else np.empty((0, width), dtype=dtype))
+            hit = self._mapped[name] = (key, arr)
+        return hit[1]
+
+    def _vectors(self, rows, scale: bool = True) -> np.ndarray:
+        x = self._map("vectors.i8", np.int8, self.dim)[rows].astype(np.float32)
+        return x / 127.0 if scale else x
+
+    def _centroids(self) -> Optional[np.ndarray]:
+        c = self._map("centroids.f32", np.float32, self.dim)
+        return c if len(c) else None
+
+    def _trained_on(self) -> int:
+        try:
+            return json.loads(self._file("ivf.json").read_text(encoding="utf-8"))["trained_on"]
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    @staticmethod
+    def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(x @ np.asarray(centroids).T, axis=1).astype(np.int32)
+
+    def _replace(self, name: str, data: bytes):
+        tmp = self._file(f"{name}.tmp{os.getpid()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, self._file(name))
+
+    # ---------- write ----------
+    def upsert(self, summary_id: str, text: str, meta: Dict[str, Any]) -> int:
+        """Store one incident; `text` is what recall matches against. Returns its row."""
+        return self.extend([(summary_id, text, meta)])[0]
+
+    def extend(self, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> List[int]:
+        """Append many incidents in one write per file."""
+        items = list(items)
+        if not items:
+            return []
+        vecs = np.stack([embed(text, self.dim) for _, text, _ in items])
+        q = np.clip(np.rint(vecs * 127.0), -127, 127).astype(np.int8)
+        lines = [(json.dumps({"id": i, "ts": time.time(), **meta}) + "\n").encode("utf-8")
+                 for i, _, meta in items]
+        with self._lock, open(self._file("lock"), "a+b") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            n = len(self)
+            with open(self._file("records.jsonl"), "ab") as f:
+                start = f.seek(0, os.SEEK_END)
+                f.write(b"".join(lines))
+            offsets = start + np.concatenate([[0], np.cumsum([len(b) for b in lines[:-1]])]).astype(np.int64)
+            with open(self._file("vectors.i8"), "ab") as f:
+                f.truncate(n * self.dim)  # drop a half-written row from a crash
+                f.write(q.tobytes())
+            with open(self._file("dead.u8"), "ab") as f:
+                f.truncate(n)
+                f.write(bytes(len(items)))
+            hashes = np.array([_id_hash(i) for i, _, _ in items], dtype=np.uint64)
+            self._backfill_ids(n)
+            with open(self._file("ids.u64"), "ab") as f:
+                f.truncate(n * 8)
+                f.write(hashes.tobytes())
+            with open(self._file("offsets.i64"), "ab") as f:
+                f.truncate(n * 8)
+                f.write(offsets.tobytes())
+            self._supersede(n, hashes)
+            self._index(n + len(items))
+        return list(range(n, n + len(items)))
+
+    def _backfill_ids(self, n: int):
+        """Hash the ids of rows [len(ids.u64), n), stored before that file existed (hold the lock)."""
+        done = self._rows("ids.u64", 8)
+        if done >= n:
+            return
+        offsets = self._map("offsets.i64", np.int64, 1)
+        with open(self._file("records.jsonl"), "rb") as f, open(self._file("ids.u64"), "ab") as out:
+            out.truncate(done * 8)
+            f.seek(int(offsets[done, 0]))
+            out.write(np.array([_id_hash(json.loads(f.readline())["id"]) for _ in range(done, n)],
+                               dtype=np.uint64).tobytes())
+
+    def _supersede(self, n: int, hashes: np.ndarray):
+        """Tombstone every earlier row of the ids just stored as rows [n, n + len(hashes)) (hold the lock)."""
+        ids = self._map("ids.u64", np.uint64, 1)[:n, 0]
+        live = self._map("dead.u8", np.uint8, 1)[:n, 0] == 0
+        dead = np.flatnonzero(live & np.isin(ids, hashes))
+        # an id repeated within the batch: all but its last row
+        _, last = np.unique(hashes[::-1], return_index=True)
+        repeated = np.setdiff1d(np.arange(len(hashes)), len(hashes) - 1 - last)
+        dead = np.concatenate([dead, n + repeated])
+        if len(dead):
+            with open(self._file("dead.u8"), "r+b") as f:
+                for row in dead.tolist():
+                    f.seek(row)
+                    f.write(b"\x01")
+
+    def _index(self, n: int):
+        """Bring the IVF lists up to `n` rows: train, assign the new rows, re-sort."""
+        centroids = self._centroids()
+        trained = self._trained_on()
+        if n >= self.TRAIN_MIN and (centroids is None or n > self.RETRAIN_GROWTH * trained):
+            self._train(n)
+            return
+        if centroids is None:
+            return  # small store: recall scans it exactly
+        done = min(self._rows("lists.i32", 4), n)
+        with open(self._file("lists.i32"), "ab") as f:
+            f.truncate(done * 4)
+            for lo in range(done, n, 65536):
+                f.write(self._assign(self._vectors(slice(lo, min(n, lo + 65536))), centroids).tobytes())
+        if n - self._sorted() > self.MERGE_TAIL:
+            self._sort(n)
+
+    def _train(self, n: int):
+        nlist = int(min(2048, max(64, 2 * np.sqrt(n))))
+        rng = np.random.default_rng(self.seed)
+        x = self._vectors(np.sort(rng.choice(n, size=min(n, 32 * nlist), replace=False)))
+        c = x[rng.choice(len(x), size=nlist, replace=False)]
+        for _ in range(8):  # spherical k-means
+            a = self._assign(x, c)
+            sums = np.zeros_like(c)
+            np.add.at(sums, a, x)
+            nonempty = np.bincount(a, minlength=nlist) > 0
+            c[nonempty] = sums[nonempty]
+            c /= np.maximum(np.linalg.norm(c, axis=1, keepdims=True), 1e-9)
+        lists = np.concatenate([self._assign(self._vectors(slice(lo, min(n, lo + 65536))), c)
+                                for lo in range(0, n, 65536)])
+        self._replace("centroids.f32", c.astype(np.float32).tobytes())
+        self._replace("lists.i32", lists.tobytes())
+        self._file("ivf.json").write_text(json.dumps({"nlist": nlist, "trained_on": n}), encoding="utf-8")
+        self._sort(n)
+
+    def _sorted(self) -> int:
+        return self._map("ivf.i32", np.int32, 1).size
+
+    def _sort(self, n: int):
+        """Rows [0, n) ordered by list, plus where each list starts."""
+        lists = np.asarray(self._map("lists.i32", np.int32, 1)[:n, 0])
+        order = np.argsort(lists, kind="stable").astype(np.int32)
+        starts = np.searchsorted(lists[order], np.arange(len(self._centroids()) + 1)).astype(np.int64)
+        self._replace("starts.i64", starts.tobytes())
+        self._replace("ivf.i32", order.tobytes())
+
+    def reindex(self):
+        """Retrain the centroids on everything stored (or drop them for a small store)."""
+        with self._lock:
+            n = len(self)
+            if n >= self.TRAIN_MIN:
+                self._train(n)
+
+    # ---------- read ----------
+    def record(self, row: int) -> Dict[str, Any]:
+        off = int(self._map("offsets.i64", np.int64, 1)[row, 0])
+        with open(self._file("records.jsonl"), "rb") as f:
+            f.seek(off)
+            return json.loads(f.readline())
+
+    def candidates(self, vec: np.ndarray) -> np.ndarray:
+        """Rows in the `nprobe` lists closest to `vec`, plus the unsorted tail."""
+        n = len(self)
+        centroids = self._centroids()
+        rows = self._map("ivf.i32", np.int32, 1)[:, 0]
+        starts = self._map("starts.i64", np.int64, 1)[:, 0]
+        m = min(n, len(rows))
+        if centroids is None or not m or len(starts) != len(centroids) + 1:
+            return np.arange(n)
+        probe = min(self.nprobe, len(centroids))
+        near = np.argpartition(-(centroids @ vec), probe - 1)[:probe]
+        parts = [rows[starts[j]:starts[j + 1]] for j in near] + [np.arange(m, n, dtype=np.int32)]
+        cand = np.sort(np.concatenate(parts))  # sequential reads of the vector file
+        return cand[cand < n]
+
+    def recall(self, text: str, k: int = 3, min_score: float = 0.0,
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        """Up to `k` stored incidents most similar to `text` (cosine >= min_score),
+        best first, newest version of each id, each with its "score"; `where` filters records."""
+        if not len(self):
+            return []
+        vec = embed(text, self.dim)
+        cand = self.candidates(vec)
+        if not len(cand):
+            return []
+        scores = self._vectors(cand, scale=False) @ (vec / 127.0)
+        dead = self._map("dead.u8", np.uint8, 1)[:, 0]
+        old = cand < len(dead)
+        scores[old] = np.where(dead[cand[old]] != 0, -np.inf, scores[old])  # superseded versions
+        top = min(len(scores), max(64, 16 * k))
+        order = np.argpartition(-scores, top - 1)[:top]
+        order = order[np.argsort(-scores[order], kind="stable")]
+        out, seen = [], set()
+        for i in order:
+            if scores[i] < min_score or len(out) == k:
+                break
+            rec = self.record(int(cand[i]))
+            if rec["id"] in seen or (where is not None and not where(rec)):
+                continue
+            seen.add(rec["id"])
+            out.append({**rec, "score": round(float(scores[i]), 4)})
+        return out
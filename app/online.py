@@ -0,0 +1,203 @@
+# app/online.py  (incremental rolling median/MAD scoring for live sensor feeds)
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import accumulate
+import math, threading
+
+from .tools import AnomalyScoreOut, mad_score, append_samples
+
+
+class _SortedWindow:
+    """Sorted multiset stored as a list of sorted buckets.
+
+    add/remove are O(log n + bucket size); k-th element and rank lookups are
+    O(log n) once the bucket prefix sums are refreshed (one C-level pass over
+    bucket lengths per modification).
+    """
+
+    def __init__(self, load: int = 256):
+        self._load = load
+        self._lists: List[List[float]] = []
+        self._maxes: List[float] = []
+        self._cum: Optional[List[int]] = None
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, x: float):
+        if not self._lists:
+            self._lists.append([x])
+            self._maxes.append(x)
+        else:
+            i = bisect_left(self._maxes, x)
+            if i == len(self._maxes):
+                i -= 1
+                self._lists[i].append(x)
+                self._maxes[i] = x
+            else:
+                insort(self._lists[i], x)
+            lst = self._lists[i]
+            if len(lst) > 2 * self._load:
+                half = lst[self._load:]
+                del lst[self._load:]
+                self._maxes[i] = lst[-1]
+                self._lists.insert(i + 1, half)
+                self._maxes.insert(i + 1, half[-1])
+        self._len += 1
+        self._cum = None
+
+    def remove(self, x: float):
+        i = bisect_left(self._maxes, x)
+        lst = self._lists[i]
+        del lst[bisect_left(lst, x)]
+        if lst:
+            self._maxes[i] = lst[-1]
+        else:
+            del self._lists[i]
+            del self._maxes[i]
+        self._len -= 1
+        self._cum = None
+
+    def _prefix(self) -> List[int]:
+        if self._cum is None:
+            self._cum = list(accumulate(map(len, self._lists)))
+        return self._cum
+
+    def __getitem__(self, k: int) -> float:
+        cum = self._prefix()
+        i = bisect_right(cum, k)
+        return self._lists[i][k - (cum[i - 1] if i else 0)]
+
+    def rank(self, x: float) -> int:
+        """Number of elements strictly less than x."""
+        i = bisect_left(self._maxes, x)
+        if i == len(self._maxes):
+            return self._len
+        cum = self._prefix()
+        return (cum[i - 1] if i else 0) + bisect_left(self._lists[i], x)
+
+    def min(self) -> float:
+        return self._lists[0][0]
+
+    def max(self) -> float:
+        return self._lists[-1][-1]
+
+
+class RollingMADDetector:
+    """Sliding-window robust spike score, updated one sample at a time.
+
+    Keeps the last `window` samples in a sorted bucket list, so each update
+    is sublinear in the window. The median is read directly; the MAD is the
+    k-th smallest of two implicitly sorted deviation sequences (below and
+    above the median), found by binary search without materializing
+    |x - median|. Scores match `anomaly_score` on the same window.
+    NaN samples are ignored.
+    """
+
+    def __init__(self, window: int = 300, load: int = 256):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self._buf: deque = deque()
+        self._sorted = _SortedWindow(load)
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def update(self, x: float) -> float:
+        """Push one sample and return the current score."""
+        self._push(x)
+        return self.score()
+
+    def extend(self, xs: Iterable[float]) -> float:
+        """Push many samples and return the score after the last one."""
+        for x in xs:
+            self._push(x)
+        return self.score()
+
+    def _push(self, x: float):
+        x = float(x)
+        if math.isnan(x):
+            return
+        if len(self._buf) == self.window:
+            self._sorted.remove(self._buf.popleft())
+        self._buf.append(x)
+        self._sorted.add(x)
+
+    def stats(self) -> Tuple[float, float, float]:
+        """(median, mad, peak) of the current window; n must be >= 1."""
+        s, n = self._sorted, len(self._sorted)
+        med = s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2
+        p = s.rank(med)  # s[:p] < med <= s[p:]
+
+        def left(t):  # t-th smallest deviation below the median
+            return med - s[p - 1 - t]
+
+        def right(t):
+            return s[p + t] - med
+
+        def kth(k):
+            na, nb = p, n - p
+            lo, hi = max(0, k + 1 - nb), min(k + 1, na)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if left(i) < right(k - i):
+                    lo = i + 1
+                else:
+                    hi = i
+            j = k + 1 - lo
+            return max(left(lo - 1) if lo > 0 else -math.inf, right(j - 1) if j > 0 else -math.inf)
+
+        mad = kth(n // 2) if n % 2 else (kth(n // 2 - 1) + kth(n // 2)) / 2
+        peak = max(med - s.min(), s.max() - med)
+        return med, mad, peak
+
+    def score(self) -> float:
+        return self.result().score
+
+    def result(self) -> AnomalyScoreOut:
+        n = len(self._buf)
+        if n < 5:
+            return AnomalyScoreOut(score=0.0, details={"reason": "too_short", "n": n})
+        med, mad, peak = self.stats()
+        peak_to_mad = peak / (mad + 1e-8)
+        return AnomalyScoreOut(score=mad_score(peak_to_mad),
+                               details={"peak_to_mad": peak_to_mad, "median": med, "n": n, "live": True})
+
+
+class LiveDetectors:
+    """Registry of per-(scenario, sensor) detectors fed by live ingest."""
+
+    def __init__(self, window: int = 300):
+        self.window = window
+        self._detectors: Dict[Tuple[str, str], RollingMADDetector] = {}
+        self._lock = threading.Lock()
+
+    def feed(self, scenario: str, sensor_id: str, values: Iterable[float]) -> float:
+        key = (scenario, sensor_id)
+        with self._lock:
+            det = self._detectors.get(key)
+            if det is None:
+                det = self._detectors[key] = RollingMADDetector(self.window)
+            return det.extend(values)
+
+    def score(self, scenario: str, sensor_id: str) -> Optional[AnomalyScoreOut]:
+        """Current score, or None when the sensor has no live feed."""
+        with self._lock:
+            det = self._detectors.get((scenario, sensor_id))
+            return det.result() if det is not None and len(det) else None
+
+
+LIVE = LiveDetectors()
+
+
+def ingest_samples(scenario: str, times, values: Dict[str, Iterable[float]]) -> Dict[str, Any]:
+    """Live ingest: append the rows to the scenario's store (so stored windows
+    see them too) and feed each sensor's detector. Returns the new row count
+    and the live score per sensor."""
+    values = {sid: list(v) for sid, v in values.items()}
+    rows = append_samples(scenario, times, values)
+    return {"rows": rows, "scores": {sid: LIVE.feed(scenario, sid, v) for sid, v in values.items()}}
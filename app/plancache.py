@@ -0,0 +1,126 @@
+# app/plancache.py  (two-tier cache for planner output)
+from __future__ import annotations
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import hashlib, json, os, pathlib, re, threading
+
+CACHE_DIR = pathlib.Path(os.getenv("INCIDENT_CACHE_DIR") or pathlib.Path(__file__).resolve().parents[1] / ".cache") / "plans"
+
+
+def normalize(desc: str) -> str:
+    return re.sub(r"\s+", " ", desc).strip().lower()
+
+
+class PlanCache:
+    """Plans keyed by (model, planner prompt hash, normalized description).
+
+    Lookups hit an in-memory LRU first, then one JSON file per key on disk.
+    The disk tier is trimmed oldest-first (by mtime, refreshed on every hit)
+    once it grows past `max_bytes`.
+    """
+
+    def __init__(self, root: pathlib.Path = CACHE_DIR, max_items: int = 512, max_bytes: int = 64 << 20):
+        self.root = pathlib.Path(root)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, desc: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        raw = json.dumps([model, prompt_hash, normalize(desc)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def lookup(self, key: str):
+        """(plan, tier) where tier is "memory", "disk" or "miss"."""
+        with self._lock:
+            plan = self._mem.get(key)
+            if plan is not None:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return plan, "memory"
+        path = self._path(key)
+        try:
+            plan = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # keep recently used entries away from eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None, "miss"
+        with self._lock:
+            self._remember(key, plan)
+            self.hits["disk"] += 1
+        return plan, "disk"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.lookup(key)[0]
+
+    def put(self, key: str, plan: Dict[str, Any]):
+        data = json.dumps(plan).encode("utf-8")
+        path = self._path(key)
+        with self._lock:
+            self._remember(key, plan)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            return  # memory tier still works on a read-only checkout
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_bytes()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict_disk()
+
+    def _remember(self, key: str, plan: Dict[str, Any]):
+        self._mem[key] = plan
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def _entries(self):
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            yield st.st_mtime, st.st_size, p
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict_disk(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.8)  # trim below the cap so puts don't evict every time
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits["memory"] + self.hits["disk"], "disk_hits": self.hits["disk"],
+                    "misses": self.misses, "memory_items": len(self._mem)}
+
+    def clear_memory(self):
+        with self._lock:
+            self._mem.clear()
+
+
+PLAN_CACHE = PlanCache()
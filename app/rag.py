@@ -1,34 +1,580 @@
-# app/rag.py  (pure-Python TF-IDF retriever)
+# app/rag.py  (KB retrievers over persisted, incrementally updated inverted indexes)
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Mapping, Optional, Tuple
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
+import hashlib, json, os, re, shutil, threading, unicodedata
+import numpy as np
+
+KB_DIR = Path(os.getenv("INCIDENT_DATA_DIR") or Path(__file__).resolve().parents[1] / "data") / "kb"
+CACHE_DIR = Path(os.getenv("INCIDENT_CACHE_DIR") or Path(__file__).resolve().parents[1] / ".cache") / "rag"
+RAG_ENGINE = os.getenv("RAG_ENGINE", "bm25").strip().lower()  # bm25 | tfidf
+INDEX_VERSION = 2
+SNIPPET_CHARS = 300
+PASSAGE_WORDS = 80
+
+# same analysis as TfidfVectorizer(strip_accents="unicode"): lowercase, strip
+# accents, tokens of 2+ word characters
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+_BLANK = re.compile(r"\n\s*\n")
+
+
+def analyze(text: str) -> List[str]:
+    text = text.lower()
+    try:
+        text.encode("ascii")
+    except UnicodeEncodeError:
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _TOKEN.findall(text)
+
+
+def passages(text: str, max_words: int = PASSAGE_WORDS) -> List[str]:
+    """Split a note into passages: paragraphs, packed line by line up to `max_words`."""
+    out: List[str] = []
+    for block in _BLANK.split(text):
+        cur: List[str] = []
+        n = 0
+        for line in block.splitlines():
+            words = line.split()
+            if not words:
+                continue
+            if cur and n + len(words) > max_words:
+                out.append("\n".join(cur))
+                cur, n = [], 0
+            while len(words) > max_words:  # one overlong line: cut it by words
+                out.append(" ".join(words[:max_words]))
+                words = words[max_words:]
+            cur.append(" ".join(words))
+            n += len(words)
+        if cur:
+            out.append("\n".join(cur))
+    return out
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Texts:
+    """Unit texts as one UTF-8 blob plus offsets; loads memory-mapped.
+
+    Updates work on the bytes: `select` keeps some units and `extend`
+    appends encoded ones, so the other units are never decoded."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def empty(cls) -> "_Texts":
+        return cls(np.empty(0, np.uint8), np.zeros(1, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def select(self, keep: np.ndarray) -> "_Texts":
+        lens = np.diff(np.asarray(self.offsets))
+        blob = np.asarray(self.blob)[np.repeat(keep, lens)]
+        return _Texts(blob, np.concatenate([[0], np.cumsum(lens[keep])]).astype(np.int64))
+
+    def extend(self, encoded: List[bytes]) -> "_Texts":
+        if not encoded:
+            return self
+        blob = np.concatenate([np.asarray(self.blob), np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+        ends = self.offsets[-1] + np.cumsum([len(b) for b in encoded])
+        return _Texts(blob, np.concatenate([np.asarray(self.offsets), ends]).astype(np.int64))
+
+
+class _NoteFiles(Mapping):
+    """note id -> text of `<kb_dir>/<id>.md`, read only when the text is asked for."""
+
+    def __init__(self, paths: Iterable[Path]):
+        self.paths = {p.stem: p for p in paths}
+
+    def __getitem__(self, note_id: str) -> str:
+        return self.paths[note_id].read_text(encoding="utf-8", errors="ignore")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+class KBIndex:
+    """TF-IDF index over KB notes stored term-major (an inverted index).
+
+    Postings are over units: whatever `split` cuts a note into (here one
+    unit per note, cited as its first SNIPPET_CHARS). For each term the
+    postings hold (unit, raw count). IDF and the L2 norms are derived from
+    the postings, so adding or removing notes only tokenizes the changed
+    notes and re-sorts the postings arrays; nothing is refit. Scores equal
+    TfidfVectorizer(smooth_idf, l2) + linear_kernel.
+
+    Saved under `.cache/rag/<content hash>/` as .npy files that load
+    memory-mapped; the content hash covers the index kind and every note's
+    id and text.
+    """
+
+    KIND = "tfidf"
+    PARAMS = ""
+
+    def __init__(self, ids: List[str], hashes: List[str], terms: List[str], unit_note: np.ndarray,
+                 unit_len: np.ndarray, texts, indptr: np.ndarray, docs: np.ndarray, counts: np.ndarray):
+        self.ids = ids
+        self.hashes = hashes
+        self.terms = terms
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.unit_note = unit_note  # unit -> note position, non-decreasing
+        self.unit_len = unit_len    # tokens per unit
+        self.texts = texts          # citation text per unit
+        self.indptr = indptr
+        self.docs = docs
+        self.counts = counts
+        self._idf: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_units(self) -> int:
+        return len(self.unit_note)
+
+    @property
+    def content_hash(self) -> str:
+        h = hashlib.sha256(f"{self.KIND}:{self.PARAMS}\n".encode("utf-8"))
+        for i, s in sorted(zip(self.ids, self.hashes)):
+            h.update(f"{i}:{s}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def split(text: str) -> List[Tuple[str, str]]:
+        """(text to index, text to cite) for each unit of a note."""
+        return [(text, text[:SNIPPET_CHARS])]
+
+    # ---------- build / update ----------
+    @classmethod
+    def empty(cls) -> "KBIndex":
+        return cls([], [], [], np.empty(0, np.int32), np.empty(0, np.int32), _Texts.empty(),
+                   np.zeros(1, dtype=np.int64), np.empty(0, np.int32), np.empty(0, np.float32))
+
+    @classmethod
+    def from_texts(cls, notes: Mapping[str, str]) -> "KBIndex":
+        idx = cls.empty()
+        idx.add(notes)
+        return idx
+
+    @classmethod
+    def build(cls, kb_dir: Path) -> "KBIndex":
+        return cls.from_texts(_NoteFiles(sorted(Path(kb_dir).glob("*.md"))))
+
+    def _triplets(self):
+        term = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.indptr))
+        return term, np.asarray(self.docs, dtype=np.int64), np.asarray(self.counts, dtype=np.float32)
+
+    def _set_postings(self, term: np.ndarray, doc: np.ndarray, count: np.ndarray):
+        order = np.lexsort((doc, term))
+        self.docs = doc[order].astype(np.int32)
+        self.counts = count[order].astype(np.float32)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(term, minlength=len(self.terms)))]).astype(np.int64)
+        self._idf = self._norms = None
+
+    def remove(self, ids: Iterable[str]):
+        drop = set(ids)
+        if not drop.intersection(self.ids):
+            return
+        keep = np.array([i not in drop for i in self.ids], dtype=bool)
+        unit_note = np.asarray(self.unit_note, dtype=np.int64)
+        ukeep = keep[unit_note]
+        note_remap = np.cumsum(keep) - 1  # old position -> new position
+        unit_remap = np.cumsum(ukeep) - 1
+        term, doc, count = self._triplets()
+        live = ukeep[doc]
+        self.ids = [i for i, k in zip(self.ids, keep) if k]
+        self.hashes = [h for h, k in zip(self.hashes, keep) if k]
+        self.texts = self.texts.select(ukeep)
+        self.unit_note = note_remap[unit_note[ukeep]].astype(np.int32)
+        self.unit_len = np.asarray(self.unit_len)[ukeep]
+        self._set_postings(term[live], unit_remap[doc[live]], count[live])
+
+    def add(self, notes: Mapping[str, str]):
+        """Add notes (id -> text); ids that already exist are replaced.
+
+        Notes are tokenized one at a time (`build` passes a mapping that reads
+        each file when asked) and only the new citation texts are encoded."""
+        existing = set(self.ids)
+        self.remove([i for i in notes if i in existing])
+        cites: List[bytes] = []
+        term, doc, count = self._triplets()
+        new_t, new_d, new_c = [term], [doc], [count]
+        unit_note, unit_len = list(np.asarray(self.unit_note)), list(np.asarray(self.unit_len))
+        for text_id, text in notes.items():
+            n = len(self.ids)
+            self.ids.append(text_id)
+            self.hashes.append(_sha(text))
+            for src, cite in self.split(text):
+                tf: Dict[int, int] = {}
+                toks = analyze(src)
+                for tok in toks:
+                    t = self.vocab.get(tok)
+                    if t is None:
+                        t = self.vocab[tok] = len(self.terms)
+                        self.terms.append(tok)
+                    tf[t] = tf.get(t, 0) + 1
+                new_t.append(np.fromiter(tf.keys(), dtype=np.int64, count=len(tf)))
+                new_d.append(np.full(len(tf), len(unit_note), dtype=np.int64))
+                new_c.append(np.fromiter(tf.values(), dtype=np.float32, count=len(tf)))
+                cites.append(cite.encode("utf-8"))
+                unit_note.append(n)
+                unit_len.append(len(toks))
+        self.texts = self.texts.extend(cites)
+        self.unit_note = np.asarray(unit_note, dtype=np.int32)
+        self.unit_len = np.asarray(unit_len, dtype=np.int32)
+        self._set_postings(np.concatenate(new_t), np.concatenate(new_d), np.concatenate(new_c))
+
+    # ---------- persistence ----------
+    def save(self, root: Path = CACHE_DIR) -> Path:
+        out = Path(root) / self.content_hash
+        tmp = out.with_name(out.name + f".tmp{os.getpid()}.{threading.get_ident()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "indptr.npy", self.indptr)
+        np.save(tmp / "docs.npy", self.docs)
+        np.save(tmp / "counts.npy", self.counts)
+        np.save(tmp / "unit_note.npy", self.unit_note)
+        np.save(tmp / "unit_len.npy", self.unit_len)
+        self._save_derived(tmp)
+        np.asarray(self.texts.blob).tofile(tmp / "texts.bin")
+        np.save(tmp / "text_offsets.npy", np.asarray(self.texts.offsets, dtype=np.int64))
+        meta = {"version": INDEX_VERSION, "kind": self.KIND, "params": self.PARAMS,
+                "ids": self.ids, "hashes": self.hashes, "terms": self.terms}
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(tmp, out)
+        return out
+
+    def _save_derived(self, path: Path):
+        np.save(path / "norms.npy", self.norms())
+
+    def _load_derived(self, path: Path):
+        self._norms = np.load(path / "norms.npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["KBIndex"]:
+        path = Path(path)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+            if (meta.get("version"), meta.get("kind"), meta.get("params")) != (INDEX_VERSION, cls.KIND, cls.PARAMS):
+                return None
+            offsets = np.load(path / "text_offsets.npy", mmap_mode="r")
+            blob = (np.memmap(path / "texts.bin", dtype=np.uint8, mode="r") if offsets[-1]
+                    else np.empty(0, np.uint8))  # mmap refuses empty files
+            idx = cls(meta["ids"], meta["hashes"], meta["terms"],
+                      np.load(path / "unit_note.npy", mmap_mode="r"),
+                      np.load(path / "unit_len.npy", mmap_mode="r"),
+                      _Texts(blob, offsets),
+                      np.load(path / "indptr.npy", mmap_mode="r"),
+                      np.load(path / "docs.npy", mmap_mode="r"),
+                      np.load(path / "counts.npy", mmap_mode="r"))
+            idx._load_derived(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return idx
+
+    @classmethod
+    def open(cls, kb_dir: Path = KB_DIR, root: Path = CACHE_DIR) -> "KBIndex":
+        """Index for `kb_dir`, loaded from cache, updated in place, or built.
+
+        A small pointer file per KB directory and index kind remembers the
+        last content hash and each note's (size, mtime). Unchanged stats mean
+        a straight load; otherwise only new, changed or deleted notes are
+        applied to the last index and the result is saved under its new
+        content hash.
+        """
+        kb_dir, root = Path(kb_dir), Path(root)
+        files = {p.stem: p for p in sorted(kb_dir.glob("*.md"))}
+        stats = {}
+        for i, p in files.items():
+            st = p.stat()
+            stats[i] = [st.st_size, st.st_mtime_ns]
+        key = hashlib.sha256(str(kb_dir.resolve()).encode()).hexdigest()[:16]
+        pointer = root / f"kb-{cls.KIND}-{key}.json"
+        try:
+            ptr = json.loads(pointer.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            ptr = None
+
+        prev = cls.load(root / ptr["content_hash"]) if ptr else None
+        if prev is not None and ptr["stats"] == stats:
+            return prev
+        if prev is None:
+            idx = cls.build(kb_dir)
+        else:
+            idx = prev
+            known = dict(zip(idx.ids, idx.hashes))
+            changed = {}
+            for i, p in files.items():
+                if ptr["stats"].get(i) != stats[i] or i not in known:
+                    text = p.read_text(encoding="utf-8", errors="ignore")
+                    if known.get(i) != _sha(text):
+                        changed[i] = text
+            idx.remove([i for i in known if i not in files])
+            if changed:
+                idx.add(changed)
+        try:
+            if not (root / idx.content_hash / "meta.json").exists():
+                idx.save(root)
+                if ptr and ptr["content_hash"] != idx.content_hash:
+                    shutil.rmtree(root / ptr["content_hash"], ignore_errors=True)
+            tmp = pointer.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_text(json.dumps({"content_hash": idx.content_hash, "stats": stats}), encoding="utf-8")
+            os.replace(tmp, pointer)
+        except OSError:
+            pass  # read-only checkout: keep the in-memory index
+        return idx
+
+    # ---------- query ----------
+    def _query_terms(self, query: str):
+        """(term ids, query counts) of the query tokens that still have postings."""
+        q: Dict[int, int] = {}
+        for tok in analyze(query):
+            t = self.vocab.get(tok)
+            if t is not None:
+                q[t] = q.get(t, 0) + 1
+        qt = np.fromiter(q.keys(), dtype=np.int64, count=len(q))
+        qc = np.fromiter(q.values(), dtype=np.float64, count=len(q))
+        live = self.indptr[qt + 1] > self.indptr[qt]  # terms left behind by removed notes don't count
+        return qt[live], qc[live]
+
+    def idf(self) -> np.ndarray:
+        if self._idf is None:
+            df = np.diff(np.asarray(self.indptr)).astype(np.float64)
+            self._idf = np.log((1.0 + self.n_units) / (1.0 + df)) + 1.0
+        return self._idf
+
+    def norms(self) -> np.ndarray:
+        if self._norms is None:
+            term, doc, count = self._triplets()
+            w = count.astype(np.float64) * self.idf()[term]
+            self._norms = np.sqrt(np.bincount(doc, weights=w * w, minlength=self.n_units))
+        return self._norms
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of `query` with every unit (TF-IDF, L2)."""
+        sims = np.zeros(self.n_units)
+        qt, qc = self._query_terms(query)
+        if not len(qt):
+            return sims
+        idf = self.idf()
+        qw = qc * idf[qt]
+        qnorm = np.sqrt(np.sum(qw * qw))
+        for t, w in zip(qt, qw):
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            sims[self.docs[lo:hi]] += self.counts[lo:hi] * (idf[t] * w)
+        norms = np.asarray(self.norms())
+        np.divide(sims, norms * qnorm, out=sims, where=norms > 0)
+        return sims
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        sims = self.scores(query)
+        idxs = sims.argsort()[::-1][:top_k]
+        return [{"id": self.ids[self.unit_note[i]], "snippet": self.texts[i], "score": float(sims[i])}
+                for i in idxs]
+
+
+class BM25Index(KBIndex):
+    """Okapi BM25 over passages (see `passages`), cited passage by passage.
+
+    Same postings, persistence and incremental updates as KBIndex, plus a
+    per-posting impact tf*(k1+1)/(tf+k1*(1-b+b*len/avglen)) and its per-term
+    maximum, derived after each update and saved with the index.
+
+    `search` is exact but prunes like MaxScore: short postings lists are
+    scored sparsely first; if the long lists left over cannot lift any
+    other passage past the current k-th best note, only the surviving
+    passages are completed, by binary search in those lists, instead of
+    scanning them. Top-k uses argpartition and keeps the best passage of
+    each note.
+    """
+
+    KIND = "bm25"
+    K1, B = 1.5, 0.75
+    PARAMS = f"k1={K1},b={B},words={PASSAGE_WORDS}"
+    PRUNE_POSTINGS = 4096  # lists up to this length are always scored up front
+
+    _impacts: Optional[np.ndarray] = None
+    _max_impact: Optional[np.ndarray] = None
+
+    @staticmethod
+    def split(text: str) -> List[Tuple[str, str]]:
+        return [(p, p) for p in passages(text)]
+
+    def _set_postings(self, term: np.ndarray, doc: np.ndarray, count: np.ndarray):
+        super()._set_postings(term, doc, count)
+        self._impacts = self._max_impact = None
+
+    def _save_derived(self, path: Path):
+        impacts, max_impact = self.impacts()
+        np.save(path / "impacts.npy", impacts)
+        np.save(path / "max_impact.npy", max_impact)
+
+    def _load_derived(self, path: Path):
+        self._impacts = np.load(path / "impacts.npy", mmap_mode="r")
+        self._max_impact = np.load(path / "max_impact.npy", mmap_mode="r")
+
+    def idf(self) -> np.ndarray:
+        # Lucene's variant: never negative, so very common terms still count a little
+        if self._idf is None:
+            df = np.diff(np.asarray(self.indptr)).astype(np.float64)
+            self._idf = np.log1p((self.n_units - df + 0.5) / (df + 0.5))
+        return self._idf
+
+    def impacts(self):
+        """(per-posting impact, per-term max impact); idf is applied at query time."""
+        if self._impacts is None:
+            lens = np.asarray(self.unit_len, dtype=np.float32)
+            avg = max(float(lens.mean()), 1.0) if len(lens) else 1.0
+            tf = np.asarray(self.counts, dtype=np.float32)
+            norm = self.K1 * (1.0 - self.B + self.B * lens[np.asarray(self.docs)] / avg)
+            self._impacts = (tf * (self.K1 + 1.0) / (tf + norm)).astype(np.float32)
+            indptr = np.asarray(self.indptr)
+            nonempty = np.flatnonzero(np.diff(indptr) > 0)
+            self._max_impact = np.zeros(len(self.terms), dtype=np.float32)
+            if len(nonempty):
+                self._max_impact[nonempty] = np.maximum.reduceat(self._impacts, indptr[nonempty])
+        return self._impacts, self._max_impact
+
+    def _weighted_terms(self, query: str):
+        qt, qc = self._query_terms(query)
+        order = np.argsort(self.indptr[qt + 1] - self.indptr[qt], kind="stable")  # rarest first
+        qt = qt[order]
+        return qt, qc[order] * self.idf()[qt]
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of `query` against every passage (0 where no term matches)."""
+        out = np.zeros(self.n_units)
+        impacts, _ = self.impacts()
+        for t, w in zip(*self._weighted_terms(query)):
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            out[self.docs[lo:hi]] += w * impacts[lo:hi]
+        return out
+
+    def _top_notes(self, units: np.ndarray, s: np.ndarray, top_k: int) -> np.ndarray:
+        """Positions in `units` of the best unit of each of the `top_k` best notes."""
+        unit_note = np.asarray(self.unit_note)
+        pool = min(len(units), 4 * top_k)
+        while True:
+            cand = np.arange(len(units)) if pool >= len(units) else np.argpartition(-s, pool - 1)[:pool]
+            cand = cand[np.argsort(-s[cand], kind="stable")]
+            _, first = np.unique(unit_note[units[cand]], return_index=True)
+            best = cand[np.sort(first)[:top_k]]
+            if len(best) == top_k or len(cand) == len(units):
+                return best
+            pool *= 4  # a few notes took the pool with several passages each: widen it
+
+    def _pad(self, hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Fill `hits` up to `top_k` with unmatched notes (score 0, first passage), in note order."""
+        if len(hits) >= top_k:
+            return hits
+        seen = {h["id"] for h in hits}
+        unit_note = np.asarray(self.unit_note)
+        for u in np.flatnonzero(np.diff(unit_note, prepend=-1)):  # first passage of each note
+            note_id = self.ids[unit_note[u]]
+            if note_id not in seen:
+                hits.append({"id": note_id, "snippet": self.texts[u], "score": 0.0})
+                if len(hits) == top_k:
+                    break
+        return hits
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Best passage of each of the `top_k` best notes. As with TF-IDF, `top_k`
+        notes come back whenever the KB has them: notes no query term matches
+        fill the remaining slots with score 0."""
+        if top_k <= 0:
+            return []
+        qt, qw = self._weighted_terms(query)
+        if not len(qt):
+            return self._pad([], top_k)
+        impacts, max_impact = self.impacts()
+        lo, hi = self.indptr[qt], self.indptr[qt + 1]
+        rest = np.cumsum((qw * max_impact[qt])[::-1])[::-1]  # best score still possible from term j on
+        j = max(1, int(np.sum(hi - lo <= self.PRUNE_POSTINGS)))
+
+        # short lists: accumulate sparsely over the passages they touch
+        docs = np.concatenate([self.docs[a:b] for a, b in zip(lo[:j], hi[:j])])
+        vals = np.concatenate([w * impacts[a:b] for w, a, b in zip(qw[:j], lo[:j], hi[:j])])
+        units, inv = np.unique(docs, return_inverse=True)
+        s = np.bincount(inv, weights=vals, minlength=len(units))
+        if j < len(qt):
+            best = self._top_notes(units, s, top_k)
+            if len(best) == top_k and s[best[-1]] > rest[j]:
+                # nothing outside `units` can catch up: complete the survivors by binary search
+                keep = s >= s[best[-1]] - rest[j]
+                units, s = units[keep], s[keep]
+                for w, a, b in zip(qw[j:], lo[j:], hi[j:]):
+                    post = self.docs[a:b]
+                    pos = np.minimum(np.searchsorted(post, units), b - a - 1)
+                    found = post[pos] == units
+                    s[found] += w * impacts[a + pos[found]]
+            else:
+                acc = np.zeros(self.n_units)
+                acc[units] = s
+                for w, a, b in zip(qw[j:], lo[j:], hi[j:]):
+                    acc[self.docs[a:b]] += w * impacts[a:b]
+                units = np.flatnonzero(acc)
+                s = acc[units]
+        if not len(units):
+            return self._pad([], top_k)
+        unit_note = np.asarray(self.unit_note)
+        return self._pad([{"id": self.ids[unit_note[units[i]]], "snippet": self.texts[units[i]], "score": float(s[i])}
+                          for i in self._top_notes(units, s, top_k)], top_k)
+
+
+ENGINES = {"bm25": BM25Index, "tfidf": KBIndex}
 
-KB_DIR = Path(__file__).resolve().parents[1] / "data" / "kb"
 
 class SimpleRAG:
-    def __init__(self):
-        self.docs: List[str] = []
-        self.ids: List[str] = []
-        for p in sorted(KB_DIR.glob("*.md")):
-            self.docs.append(p.read_text(encoding="utf-8", errors="ignore"))
-            self.ids.append(p.stem)
-        # basic TF-IDF (you can tweak analyzer/stop_words/etc.)
-        self.vectorizer = TfidfVectorizer(strip_accents="unicode")
-        self.doc_mat = self.vectorizer.fit_transform(self.docs) if self.docs else None
+    """Retriever callable used by kb_query; the index is opened on first use."""
+
+    def __init__(self, kb_dir: Path = KB_DIR, engine: Optional[str] = None):
+        self.kb_dir = Path(kb_dir)
+        self.engine = engine or RAG_ENGINE
+        if self.engine not in ENGINES:
+            raise ValueError(f"unknown RAG engine {self.engine!r}; expected one of {sorted(ENGINES)}")
+        self._index: Optional[KBIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> KBIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = ENGINES[self.engine].open(self.kb_dir)
+        return self._index
+
+    def add(self, notes: Dict[str, str]):
+        """Write notes (id -> markdown) into the KB and update the index in place."""
+        for note_id, text in notes.items():
+            (self.kb_dir / f"{note_id}.md").write_text(text, encoding="utf-8")
+        self._reopen()
+
+    def remove(self, ids: Iterable[str]):
+        for note_id in ids:
+            (self.kb_dir / f"{note_id}.md").unlink(missing_ok=True)
+        self._reopen()
+
+    def _reopen(self):
+        # open() sees the changed files and applies just those to the saved index
+        with self._lock:
+            self._index = ENGINES[self.engine].open(self.kb_dir)
 
     def __call__(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        if not self.docs or self.doc_mat is None:
+        if not len(self.index):
             return []
-        qv = self.vectorizer.transform([query])
-        sims = linear_kernel(qv, self.doc_mat).ravel()  # cosine for L2-normalized tf-idf
-        idxs = sims.argsort()[::-1][:top_k]
-        out = []
-        for i in idxs:
-            out.append({
-                "id": self.ids[i],
-                "snippet": self.docs[i][:300],
-                "score": float(sims[i])
-            })
-        return out
+        return self.index.search(query, top_k)
@@ -0,0 +1,135 @@
+# app/spans.py  (span instrumentation: wall / CPU / allocation per node and tool call)
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import functools, json, os, pathlib, threading, time, tracemalloc
+
+import numpy as np
+
+# TRACE_SPANS=1 records spans; TRACE_SPANS=alloc also tracks allocations with
+# tracemalloc (noticeably slower). Off, span() hands back one shared no-op
+# context manager and traced() functions cost a single flag check.
+_mode = os.getenv("TRACE_SPANS", "").strip().lower()
+_enabled = _mode in ("1", "true", "yes", "alloc")
+_alloc = _mode == "alloc"
+
+_T0 = time.perf_counter_ns()
+_NOOP = nullcontext()
+_current: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("spans", default=None)
+
+
+def enable(alloc: bool = False):
+    global _enabled, _alloc
+    _enabled, _alloc = True, alloc
+    if alloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled, _alloc
+    if _alloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled, _alloc = False, False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+if _alloc:
+    enable(alloc=True)
+
+
+@contextmanager
+def _span(name: str, cat: str, args: Optional[Dict[str, Any]]):
+    sink = _current.get()
+    alloc0 = tracemalloc.get_traced_memory()[0] if _alloc else 0
+    cpu0 = time.thread_time_ns()
+    t0 = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        t1 = time.perf_counter_ns()
+        rec = {"name": name, "cat": cat, "start_us": (t0 - _T0) / 1000.0, "wall_ms": (t1 - t0) / 1e6,
+               "cpu_ms": (time.thread_time_ns() - cpu0) / 1e6, "tid": threading.get_ident()}
+        if _alloc:
+            # process-wide counter: concurrent threads show up in each other's deltas
+            rec["alloc_kb"] = (tracemalloc.get_traced_memory()[0] - alloc0) / 1024.0
+        if args:
+            rec["args"] = args
+        if sink is not None:
+            sink.append(rec)
+
+
+def span(name: str, cat: str = "app", args: Optional[Dict[str, Any]] = None):
+    """Context manager timing a block; a no-op unless spans are enabled."""
+    if not _enabled:
+        return _NOOP
+    return _span(name, cat, args)
+
+
+def traced(name: str, cat: str = "tool"):
+    """Decorator: run the function inside span(name, cat)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _span(name, cat, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def collect():
+    """Collect spans finished in this context (thread / task) into a list.
+
+    Yields None when disabled. Work handed to other threads keeps feeding
+    the list if it runs under a copy of this context (see tools.run_blocking).
+    """
+    if not _enabled:
+        yield None
+        return
+    sink: List[Dict[str, Any]] = []
+    token = _current.set(sink)
+    try:
+        yield sink
+    finally:
+        _current.reset(token)
+
+
+# ---------- export ----------
+def to_chrome_trace(spans: Iterable[Dict[str, Any]], path: Optional[pathlib.Path] = None) -> Dict[str, Any]:
+    """Chrome / Perfetto trace JSON (complete "X" events); written to `path` if given."""
+    pid = os.getpid()
+    events = []
+    for s in spans:
+        args = {"cpu_ms": round(s["cpu_ms"], 3), **s.get("args", {})}
+        if "alloc_kb" in s:
+            args["alloc_kb"] = round(s["alloc_kb"], 1)
+        events.append({"name": s["name"], "cat": s["cat"], "ph": "X", "ts": s["start_us"],
+                       "dur": s["wall_ms"] * 1000.0, "pid": pid, "tid": s["tid"], "args": args})
+    trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+    if path is not None:
+        pathlib.Path(path).write_text(json.dumps(trace), encoding="utf-8")
+    return trace
+
+
+def aggregate(spans: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per span name: count, wall p50/p95/p99/total, CPU total and allocation total."""
+    by: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        by.setdefault(s["name"], []).append(s)
+    out = {}
+    for name, ss in sorted(by.items()):
+        wall = np.array([s["wall_ms"] for s in ss])
+        p50, p95, p99 = np.percentile(wall, [50, 95, 99])
+        row = {"count": len(ss), "wall_p50_ms": round(float(p50), 3), "wall_p95_ms": round(float(p95), 3),
+               "wall_p99_ms": round(float(p99), 3), "wall_total_ms": round(float(wall.sum()), 3),
+               "cpu_total_ms": round(sum(s["cpu_ms"] for s in ss), 3)}
+        if any("alloc_kb" in s for s in ss):
+            row["alloc_total_kb"] = round(sum(s.get("alloc_kb", 0.0) for s in ss), 1)
+        out[name] = row
+    return out
@@ -0,0 +1,182 @@
+# app/tickets.py  (content-addressed ticket store with an append-only index)
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse, hashlib, json, os, pathlib, re, threading, time
+
+try:
+    import fcntl  # serialises index appends across processes on POSIX
+except ImportError:  # Windows: O_APPEND writes of one batch are still atomic enough for one writer
+    fcntl = None
+
+# sections that differ between runs of the same incident: the trace (timings),
+# similar past incidents (earlier runs of it) and the correlated alerts (arrival times)
+_TRACE = re.compile(r"^## Trace\b.*", re.S | re.M)
+_SIMILAR = re.compile(r"^- \*\*Similar past incidents\*\*:.*\n(?:[^#\n].*\n?)*", re.M)
+_ALERTS = re.compile(r"^## Correlated alerts\b.*?(?=^## |\Z)", re.S | re.M)
+_BLANKS = re.compile(r"\n{3,}")
+_SCENARIO = re.compile(r"^# Incident Report: (\S+)", re.M)
+
+
+def canonical(markdown: str) -> str:
+    """A ticket without its run-dependent sections (trace, similar incidents, correlated alerts)."""
+    for pattern in (_TRACE, _ALERTS, _SIMILAR):
+        markdown = pattern.sub("", markdown)
+    return _BLANKS.sub("\n\n", markdown).strip()
+
+
+def content_hash(markdown: str) -> str:
+    """sha256 of `canonical(markdown)`: reruns of the same incident share one ticket."""
+    return hashlib.sha256(canonical(markdown).encode("utf-8")).hexdigest()
+
+
+class TicketStore:
+    """Tickets stored once per content hash, plus an append-only JSONL index.
+
+    A ticket lives at `<root>/<hash[:2]>/<hash>.md`, so identical reports
+    share one file and different ones can never overwrite each other. Every
+    `put` appends one index line (ticket id, scenario, time, hash, path,
+    whether the file was new), batches in a single write. The index is
+    folded into "latest overall" / "latest per scenario" maps as it is
+    read, and each append also rewrites `latest.json` (those maps plus the
+    index offset they cover) under the same lock. A fresh handle starts
+    from that pointer, so even the first lookup in a process is one small
+    read; after that only lines appended since the last one (including
+    other processes') are read.
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root)
+        self.index_path = self.root / "index.jsonl"
+        self.pointer_path = self.root / "latest.json"
+        self._lock = threading.Lock()
+        self._read_to = 0
+        self._latest: Optional[Dict[str, Any]] = None
+        self._by_scenario: Dict[str, Dict[str, Any]] = {}
+        self.count = 0
+
+    def path_for(self, h: str) -> pathlib.Path:
+        return self.root / h[:2] / f"{h}.md"
+
+    # ---------- write ----------
+    def put(self, markdown: str, scenario: str = "") -> Dict[str, Any]:
+        return self.put_many([(markdown, scenario)])[0]
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Store (markdown, scenario) pairs; returns their index entries in order."""
+        entries = []
+        for markdown, scenario in items:
+            h = content_hash(markdown)
+            path = self.path_for(h)
+            new = not path.exists()
+            if new:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+                tmp.write_text(markdown, encoding="utf-8")
+                os.replace(tmp, path)  # same content from a racing writer is the same bytes
+            entries.append({"ticket": h[:16], "scenario": scenario, "ts": round(time.time(), 3), "hash": h,
+                            "path": path.relative_to(self.root).as_posix(), "new": new})
+        if not entries:
+            return []
+        data = "".join(json.dumps(e) + "\n" for e in entries).encode("utf-8")
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.index_path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self._catch_up()  # lines other writers appended before ours
+            f.write(data)
+            f.flush()
+            self._catch_up()
+            self._write_pointer()
+        return [self._resolve(e) for e in entries]
+
+    def _write_pointer(self):
+        """Save the folded maps and the index offset they cover (hold both locks)."""
+        state = {"offset": self._read_to, "count": self.count, "latest": self._latest,
+                 "by_scenario": self._by_scenario}
+        tmp = self.pointer_path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.pointer_path)
+
+    # ---------- read ----------
+    def _resolve(self, e: Dict[str, Any]) -> Dict[str, Any]:
+        return {**e, "path": str(self.root / e["path"])}
+
+    def _load_pointer(self):
+        """Start a fresh handle from `latest.json` instead of the top of the index."""
+        try:
+            state = json.loads(self.pointer_path.read_text(encoding="utf-8"))
+            if state["offset"] > self.index_path.stat().st_size:
+                return  # index replaced or truncated: fold it from the start
+        except (OSError, ValueError, KeyError):
+            return
+        self._read_to, self.count = state["offset"], state["count"]
+        self._latest, self._by_scenario = state["latest"], state["by_scenario"]
+
+    def _catch_up(self):
+        """Fold index lines appended since the last call into the maps (hold the lock)."""
+        if self._read_to == 0:
+            self._load_pointer()
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._read_to)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1  # a line still being written is picked up next time
+        for line in data[:end].splitlines():
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue
+            self._latest = e
+            if e.get("scenario"):
+                self._by_scenario[e["scenario"]] = e
+            self.count += 1
+        self._read_to += end
+
+    def latest(self, scenario: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Most recent index entry, overall or for one scenario (absolute path)."""
+        with self._lock:
+            self._catch_up()
+            e = self._latest if scenario is None else self._by_scenario.get(scenario)
+        return self._resolve(e) if e else None
+
+    def scenarios(self) -> List[str]:
+        with self._lock:
+            self._catch_up()
+            return sorted(self._by_scenario)
+
+    def read(self, entry: Dict[str, Any]) -> str:
+        return pathlib.Path(entry["path"]).read_text(encoding="utf-8")
+
+    # ---------- legacy ----------
+    def import_files(self, paths: Iterable[pathlib.Path]) -> Dict[str, int]:
+        """Index old `ticket_<ts>.md` files in mtime order (the files are left in place)."""
+        paths = sorted(paths, key=lambda p: p.stat().st_mtime)
+        items = []
+        for p in paths:
+            md = p.read_text(encoding="utf-8", errors="ignore")
+            m = _SCENARIO.search(md)
+            items.append((md, m.group(1) if m else ""))
+        entries = self.put_many(items)
+        return {"files": len(entries), "unique": sum(e["new"] for e in entries)}
+
+
+def main():
+    from .tools import MODELS_DIR, ticket_store
+
+    p = argparse.ArgumentParser(description="Ticket store maintenance.")
+    p.add_argument("--import-legacy", action="store_true",
+                   help=f"Index the old {MODELS_DIR}/ticket_*.md files into the store")
+    p.add_argument("--latest", nargs="?", const="", default=None, metavar="SCENARIO",
+                   help="Print the latest index entry (optionally for one scenario)")
+    args = p.parse_args()
+    store = ticket_store()
+    if args.import_legacy:
+        print(json.dumps(store.import_files(MODELS_DIR.glob("ticket_*.md"))))
+    if args.latest is not None:
+        print(json.dumps(store.latest(args.latest or None)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,88 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field, PlainSerializer, PlainValidator, WithJsonSchema
+from typing import Annotated, List, Dict, Any, Literal, Optional
 import pandas as pd
-import json, time, pathlib
-from sklearn.ensemble import IsolationForest
+import asyncio, contextvars, functools, os, threading, pathlib
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import numpy as np
+from .logindex import LogIndex
+from .logstream import log_paths, iter_matches, parse_ts
+from .tsstore import TimeSeriesStore, TIME_COL
+from .spans import traced
+from .tickets import TicketStore
+from .anomaly import ModelRegistry
 
-DATA_DIR = pathlib.Path(__file__).resolve().parents[1] / "data"
+# INCIDENT_DATA_DIR points every entry point at another data tree (e.g. bench.synth output)
+DATA_DIR = pathlib.Path(os.getenv("INCIDENT_DATA_DIR") or pathlib.Path(__file__).resolve().parents[1] / "data")
 MODELS_DIR = pathlib.Path(__file__).resolve().parents[1] / "models"
 MODELS_DIR.mkdir(exist_ok=True)
+# mad = robust spike rule (default); model = per-sensor IsolationForest from app.anomaly, MAD where none
+ANOMALY_METHOD = os.getenv("ANOMALY_METHOD", "mad")
 
 # ---------- Pydantic Schemas ----------
+def _float_array(v) -> np.ndarray:
+    # a float64 ndarray (e.g. a memory-mapped store column) passes through as
+    # the same buffer; lists and other dtypes are converted once
+    a = np.asarray(v, dtype=np.float64)
+    if a.ndim != 1:
+        raise ValueError(f"expected a 1-D array, got shape {a.shape}")
+    return a
+
+# 1-D float64 array field: validated without copying, a list in JSON; may be a
+# read-only view, so tools must not write to it
+FloatArray = Annotated[np.ndarray, PlainValidator(_float_array),
+                       PlainSerializer(lambda a: a.tolist(), return_type=List[float], when_used="json"),
+                       WithJsonSchema({"type": "array", "items": {"type": "number"}})]
+
 class TimeSeriesIn(BaseModel):
     sensor_id: str
     window: int = Field(600, description="seconds")
+    t0: Optional[float] = Field(None, description="range start (inclusive); overrides window")
+    t1: Optional[float] = Field(None, description="range end (inclusive); overrides window")
 
 class TimeSeriesOut(BaseModel):
-    points: List[float]
+    points: FloatArray
     sampling_hz: float = 1.0
+    timestamps: FloatArray = Field(default_factory=lambda: np.empty(0),
+                                   description="epoch seconds per point (stored time + scenario time_origin)")
 
 class SearchLogsIn(BaseModel):
     query: str
     scenario: str
+    level: Optional[str] = None
+    sensor: Optional[str] = None
+    gateway: Optional[str] = None
+    limit: int = 20
+    t0: Optional[float] = Field(None, description="epoch seconds; only lines with ts >= t0")
+    t1: Optional[float] = Field(None, description="epoch seconds; only lines with ts <= t1")
 
 class SearchLogsOut(BaseModel):
     hits: List[Dict[str, Any]]
 
 class AnomalyScoreIn(BaseModel):
-    points: List[float]
+    points: FloatArray
+    method: Literal["mad", "model"] = "mad"
+    scenario: Optional[str] = Field(None, description="method=model: whose models to use")
+    sensor_id: Optional[str] = None
 
 class AnomalyScoreOut(BaseModel):
     score: float  # 0-1 anomaly confidence
     details: Dict[str, Any]
 
+class SensorScore(BaseModel):
+    sensor_id: str
+    score: float
+    peak_to_mad: float
+    median: float
+    n: int
+    method: str = "mad"  # which rule produced `score`
+    peak_index: int = -1  # sample of the largest deviation within the window
+
+class AnomalyBatchOut(BaseModel):
+    ranked: List[SensorScore]  # highest score first
+
 class KBQueryIn(BaseModel):
     issue: str
     top_k: int = 3
@@ -50,78 +100,287 @@ class TicketIn(BaseModel):
 
 class TicketOut(BaseModel):
     path: str
+    id: str = ""
+    deduped: bool = False
 
 # ---------- Tools (pure Python stubs; swap for real infra) ----------
 
+_origins: Dict[str, tuple] = {}
+
+def time_origin(scenario: str) -> float:
+    """Epoch seconds of the scenario's timeseries `time` 0 (`time_origin` in its YAML; 0 if absent)."""
+    path = DATA_DIR / "scenarios" / f"{scenario}.yaml"
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return 0.0
+    hit = _origins.get(scenario)
+    if hit is None or hit[0] != (path, mtime):
+        meta = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+        origin = meta.get("time_origin")
+        # YAML turns an unquoted ISO timestamp into a datetime; parse_ts takes either form
+        origin = origin.isoformat() if hasattr(origin, "isoformat") else origin
+        hit = _origins[scenario] = ((path, mtime), 0.0 if origin is None else parse_ts(origin))
+    return hit[1]
+
+def _open_store(scenario: str) -> Optional[TimeSeriesStore]:
+    try:
+        # CSV is converted once into memory-mapped columns; reads cost O(window)
+        return TimeSeriesStore.open(scenario, DATA_DIR / "timeseries" / f"{scenario}.csv")
+    except OSError:
+        return None
+
+@traced("tool:get_timeseries")
 def get_timeseries(inp: TimeSeriesIn, scenario: str):
-    csv_path = DATA_DIR / "timeseries" / f"{scenario}.csv"
-    df = pd.read_csv(csv_path)
-    values = df["value"].tail(inp.window).tolist()
-    return TimeSeriesOut(points=values, sampling_hz=1.0)
+    store = _open_store(scenario)
+    if store is None:
+        # fallback: parse the CSV directly (e.g. read-only cache dir)
+        df = pd.read_csv(DATA_DIR / "timeseries" / f"{scenario}.csv")
+        col = inp.sensor_id if inp.sensor_id in df.columns else "value"
+        if inp.t0 is not None or inp.t1 is not None:
+            t = df["time"]
+            df = df[(t >= (inp.t0 if inp.t0 is not None else -np.inf)) & (t <= (inp.t1 if inp.t1 is not None else np.inf))]
+        else:
+            df = df.tail(inp.window)
+        return TimeSeriesOut(points=df[col].to_numpy(dtype=float), sampling_hz=1.0,
+                             timestamps=df["time"].to_numpy(dtype=float) + time_origin(scenario))
 
+    col = store.resolve(inp.sensor_id)
+    if inp.t0 is not None or inp.t1 is not None:
+        times, values = store.range(col, inp.t0, inp.t1)
+    else:
+        times, values = store.tail(TIME_COL, inp.window), store.tail(col, inp.window)
+    # `points` is a read-only view of the mapped column: no copy, no per-sample floats
+    return TimeSeriesOut(points=values, sampling_hz=1.0, timestamps=times + time_origin(scenario))
+
+@traced("tool:get_timeseries_batch")
+def get_timeseries_batch(scenario: str, sensor_ids: Optional[List[str]] = None, window: int = 600,
+                         with_times: bool = False):
+    """Last `window` samples for many sensors as a (sensors x samples) float array.
+
+    `sensor_ids=None` means every sensor column of the scenario. Rows are
+    NaN where a sensor has no value (e.g. live appends that skipped it).
+    With `with_times=True` returns `(ids, mat, times)`, `times` being the
+    epoch seconds of each column (see `time_origin`).
+    """
+    store = _open_store(scenario)
+    if store is None:
+        df = pd.read_csv(DATA_DIR / "timeseries" / f"{scenario}.csv").tail(window)
+        ids = sensor_ids or [c for c in df.columns if c != "time"]
+        cols = [c if c in df.columns else "value" for c in ids]
+        out = ids, df[cols].to_numpy(dtype=float).T
+        times = df["time"].to_numpy(dtype=float) if "time" in df else np.arange(len(df), dtype=float)
+    else:
+        ids = sensor_ids or store.columns
+        rows = [store.tail(store.resolve(sid), window) for sid in ids]
+        # one sensor: a (1 x samples) view of its column; several must be stacked
+        out = ids, rows[0][None, :] if len(rows) == 1 else np.stack(rows) if rows else np.empty((0, 0))
+        times = store.tail(TIME_COL, window)
+    return (*out, times + time_origin(scenario)) if with_times else out
+
+@traced("tool:append_samples")
+def append_samples(scenario: str, times, values: Dict[str, Any]) -> int:
+    """Append live rows (stored-time units, one array per sensor) to the scenario's
+    store; returns its new row count. Sensors not given are NaN for these rows."""
+    store = _open_store(scenario)
+    if store is None:
+        raise FileNotFoundError(DATA_DIR / "timeseries" / f"{scenario}.csv")
+    return store.append(times, {store.resolve(sid): v for sid, v in values.items()})
+
+@traced("tool:search_logs")
 def search_logs(inp: SearchLogsIn):
-    path = DATA_DIR / "logs" / f"{inp.scenario}.jsonl"
-    hits = []
-    with open(path) as f:
-        for line in f:
-            j = json.loads(line)
-            if any(tok in json.dumps(j).lower() for tok in inp.query.lower().split("|")):
-                hits.append(j)
-    return SearchLogsOut(hits=hits[:20])
-
-def _load_or_train_iso() -> IsolationForest:
-    model_path = MODELS_DIR / "anomaly_model.pkl"
-    if model_path.exists():
-        import joblib
-        return joblib.load(model_path)
-    X = np.random.normal(0, 1, size=(2000, 1))
-    iso = IsolationForest(n_estimators=100, contamination=0.05, random_state=42)
-    iso.fit(X)
-    try:
-        import joblib
-        joblib.dump(iso, model_path)
-    except Exception:
-        pass
-    return iso
-
-# def anomaly_score(inp: AnomalyScoreIn):
-#     x = np.array(inp.points).reshape(-1, 1)
-#     iso = _load_or_train_iso()
-#     raw = iso.decision_function(x)  # higher is normal
-#     conf = float(np.clip(-raw.mean(), 0, 1))
-#     return AnomalyScoreOut(score=conf, details={"raw_mean": float(raw.mean())})
+    paths = log_paths(DATA_DIR / "logs", inp.scenario)
+    if not paths:
+        raise FileNotFoundError(DATA_DIR / "logs" / f"{inp.scenario}.jsonl")
+    filters = {"level": inp.level, "sensor": inp.sensor, "gateway": inp.gateway}
+    hits: List[Dict[str, Any]] = []
+    # live log first, then rotations; stop as soon as `limit` hits are found
+    for path in paths:
+        remaining = inp.limit - len(hits)
+        if remaining <= 0:
+            break
+        if path.suffix == ".jsonl":
+            # inverted index is built on first use and reused until the log changes;
+            # a time range is answered from its sorted timestamps, without a scan
+            hits += LogIndex.open(path).query(inp.query, limit=remaining, t0=inp.t0, t1=inp.t1, **filters)
+        else:
+            # compressed rotations are streamed, never decompressed to disk
+            hits += islice(iter_matches(path, inp.query, t0=inp.t0, t1=inp.t1, **filters), remaining)
+    return SearchLogsOut(hits=hits)
+
+_anomaly_registries: Dict[pathlib.Path, ModelRegistry] = {}
+_anomaly_registries_lock = threading.Lock()
+
+def anomaly_registry() -> ModelRegistry:
+    """The anomaly model registry under MODELS_DIR (looked up per call so benches can redirect it)."""
+    root = MODELS_DIR / "anomaly"
+    with _anomaly_registries_lock:
+        reg = _anomaly_registries.get(root)
+        if reg is None:
+            reg = _anomaly_registries[root] = ModelRegistry(root)
+    return reg
+
+@traced("tool:anomaly_score")
 def anomaly_score(inp: AnomalyScoreIn) -> AnomalyScoreOut:
-    import numpy as np
-    x = np.array(inp.points, dtype=float)
+    x = inp.points  # read only; every step below allocates its own result
     n = len(x)
     if n < 5:
         return AnomalyScoreOut(score=0.0, details={"reason": "too_short", "n": n})
+    if inp.method == "model":
+        r = anomaly_score_batch(x, [inp.sensor_id or "value"], method="model", scenario=inp.scenario).ranked[0]
+        return AnomalyScoreOut(score=r.score, details={"method": r.method, "peak_to_mad": r.peak_to_mad,
+                                                       "median": r.median})
 
     med = float(np.median(x))
-    mad = float(np.median(np.abs(x - med))) + 1e-8  # median absolute deviation (robust)
-    peak = float(np.max(np.abs(x - med)))
+    dev = np.abs(x - med)
+    peak = float(np.max(dev))
+    mad = float(np.median(dev, overwrite_input=True)) + 1e-8  # median absolute deviation (robust)
     peak_to_mad = peak / mad
+    return AnomalyScoreOut(score=mad_score(peak_to_mad), details={"peak_to_mad": peak_to_mad, "median": med})
+
+@traced("tool:anomaly_score_batch")
+def anomaly_score_batch(points, sensor_ids: List[str], lengths=None, method: str = "mad",
+                        scenario: Optional[str] = None) -> AnomalyBatchOut:
+    """Score many sensors in one vectorized pass; same rule as `anomaly_score`.
+
+    `points` is a (sensors x samples) array. Rows may be ragged: pass
+    `lengths` (valid leading samples per row) and/or pad with NaN. Sorting
+    each row once (NaNs last) gives the median by index; sorting the
+    deviations once more gives the MAD and the peak. With method="model"
+    the scenario's anomaly models score the rows instead (one forest call
+    per sensor group, see app.anomaly); rows without a model keep MAD.
+    """
+    x = np.asarray(points, dtype=float)  # may be a read-only view: never written
+    if x.ndim < 2:
+        x = x.reshape(1, -1)
+    if lengths is not None:
+        x = np.where(np.arange(x.shape[1])[None, :] >= np.asarray(lengths)[:, None], np.nan, x)
+    n = np.sum(~np.isnan(x), axis=1)
+    rows = np.arange(x.shape[0])
+    lo, hi = np.maximum(n - 1, 0) // 2, np.minimum(n // 2, max(x.shape[1] - 1, 0))
 
+    def row_median(sorted_x):
+        return (sorted_x[rows, lo] + sorted_x[rows, hi]) / 2 if sorted_x.size else np.zeros(len(rows))
+
+    med = row_median(np.sort(x, axis=1))
+    dev = np.sort(np.abs(x - med[:, None]), axis=1)
+    mad = row_median(dev) + 1e-8
+    peak = dev[rows, np.maximum(n - 1, 0)] if dev.size else np.zeros(len(rows))
+    # where in the window the peak is (NaN never wins; an all-NaN row gets 0)
+    peak_at = (np.argmax(np.nan_to_num(np.abs(x - med[:, None]), nan=-1.0), axis=1) if x.size
+               else np.zeros(len(rows), dtype=int))
+    with np.errstate(invalid="ignore"):
+        peak_to_mad = peak / mad
+        score = np.clip((peak_to_mad - 3.0) / 7.0, 0.0, 1.0)
+    score = np.where(n < 5, 0.0, score)
+    modelled = np.zeros(len(rows), dtype=bool)
+    if method == "model" and scenario is not None and len(rows):
+        store = _open_store(scenario)
+        if store is not None:
+            def column(sid):
+                try:
+                    return store.resolve(sid)
+                except KeyError:
+                    return sid  # no such column: no model either
+            model_score = anomaly_registry().score(scenario, store, [column(sid) for sid in sensor_ids], x)
+            modelled = ~np.isnan(model_score) & (n >= 5)
+            score = np.where(modelled, model_score, score)
+
+    order = np.lexsort((-np.nan_to_num(peak_to_mad), -score))
+    return AnomalyBatchOut(ranked=[
+        SensorScore(sensor_id=sensor_ids[i], score=float(score[i]), peak_to_mad=float(peak_to_mad[i]),
+                    median=float(med[i]), n=int(n[i]), method="model" if modelled[i] else "mad",
+                    peak_index=int(peak_at[i]) if n[i] else -1)
+        for i in order
+    ])
+
+def mad_score(peak_to_mad: float) -> float:
     # Map robust spike ratio to [0,1]; 3≈mild, 6≈clear, 10+≈very strong
-    score = max(0.0, min(1.0, (peak_to_mad - 3.0) / 7.0))
-    return AnomalyScoreOut(score=float(score), details={"peak_to_mad": peak_to_mad, "median": med})
+    return float(max(0.0, min(1.0, (peak_to_mad - 3.0) / 7.0)))
 
 
+@traced("tool:kb_query")
 def kb_query(inp: KBQueryIn, retriever):
     docs = retriever(inp.issue, top_k=inp.top_k)
     return KBQueryOut(notes=[KBNote(id=d["id"], snippet=d["snippet"], score=float(d["score"])) for d in docs])
 
-# def create_ticket(inp: TicketIn):
-#     ts = int(time.time())
-#     out_path = MODELS_DIR / f"ticket_{ts}.md"
-#     with open(out_path, "w") as f:
-#         f.write(inp.payload["markdown"])
-#     return TicketOut(path=str(out_path))
+_ticket_stores: Dict[pathlib.Path, TicketStore] = {}
+_ticket_stores_lock = threading.Lock()
+
+def ticket_store() -> TicketStore:
+    """The ticket store under MODELS_DIR (looked up per call so benches can redirect it)."""
+    root = MODELS_DIR / "tickets"
+    with _ticket_stores_lock:
+        store = _ticket_stores.get(root)
+        if store is None:
+            store = _ticket_stores[root] = TicketStore(root)
+    return store
+
+def _ticket_out(entry: Dict[str, Any]) -> TicketOut:
+    return TicketOut(path=entry["path"], id=entry["ticket"], deduped=not entry["new"])
+
+@traced("tool:create_ticket")
 def create_ticket(inp: TicketIn | dict) -> TicketOut:
-    ts = int(time.time())
-    out_path = MODELS_DIR / f"ticket_{ts}.md"
     # support both pydantic model and plain dict
     payload = inp.payload if hasattr(inp, "payload") else inp["payload"]
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(payload["markdown"])
-    return TicketOut(path=str(out_path))
+    return _ticket_out(ticket_store().put(payload["markdown"], payload.get("scenario", "")))
+
+@traced("tool:create_tickets")
+def create_tickets(inps: List[TicketIn | dict]) -> List[TicketOut]:
+    """Store many tickets with a single index append."""
+    payloads = [i.payload if hasattr(i, "payload") else i["payload"] for i in inps]
+    entries = ticket_store().put_many((p["markdown"], p.get("scenario", "")) for p in payloads)
+    return [_ticket_out(e) for e in entries]
+
+
+# ---------- Async tools ----------
+# Same tools for event-loop callers (graph `ainvoke`). The blocking bodies
+# (file I/O, index builds, numpy) run on one bounded thread pool, so a single
+# loop can keep many investigations in flight without starting a thread per
+# call. TOOL_CONCURRENCY sets the pool size.
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def tool_concurrency() -> int:
+    return max(1, int(os.getenv("TOOL_CONCURRENCY", "8")))
+
+def tool_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=tool_concurrency(), thread_name_prefix="tool")
+    return _executor
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run `fn(*args, **kwargs)` on the tool pool and await the result.
+
+    The call runs in a copy of the caller's context, so spans it records
+    land in the calling node's span list.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(tool_executor(), functools.partial(ctx.run, fn, *args, **kwargs))
+
+async def aget_timeseries(inp: TimeSeriesIn, scenario: str) -> TimeSeriesOut:
+    return await run_blocking(get_timeseries, inp, scenario)
+
+async def aget_timeseries_batch(scenario: str, sensor_ids: Optional[List[str]] = None, window: int = 600,
+                                with_times: bool = False):
+    return await run_blocking(get_timeseries_batch, scenario, sensor_ids, window, with_times)
+
+async def asearch_logs(inp: SearchLogsIn) -> SearchLogsOut:
+    return await run_blocking(search_logs, inp)
+
+async def aanomaly_score(inp: AnomalyScoreIn) -> AnomalyScoreOut:
+    return await run_blocking(anomaly_score, inp)
+
+async def aanomaly_score_batch(points, sensor_ids: List[str], lengths=None, method: str = "mad",
+                               scenario: Optional[str] = None) -> AnomalyBatchOut:
+    return await run_blocking(anomaly_score_batch, points, sensor_ids, lengths, method, scenario)
+
+async def akb_query(inp: KBQueryIn, retriever) -> KBQueryOut:
+    return await run_blocking(kb_query, inp, retriever)
+
+async def acreate_ticket(inp: TicketIn | dict) -> TicketOut:
+    return await run_blocking(create_ticket, inp)
@@ -0,0 +1,185 @@
+# app/tsstore.py  (columnar, memory-mapped timeseries store)
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import json, os, pathlib, shutil, threading
+import numpy as np
+import pandas as pd
+
+# INCIDENT_CACHE_DIR moves every generated index / store (e.g. into a bench's tmp dir)
+CACHE_DIR = pathlib.Path(os.getenv("INCIDENT_CACHE_DIR") or pathlib.Path(__file__).resolve().parents[1] / ".cache") / "timeseries"
+DTYPE = np.dtype("<f8")
+TIME_COL = "time"
+STORE_VERSION = 1
+_BUILD_LOCK = threading.Lock()  # one CSV conversion at a time per process
+_OPEN: Dict[pathlib.Path, Tuple[tuple, "TimeSeriesStore"]] = {}  # root -> (signature, store)
+
+
+class TimeSeriesStore:
+    """Raw little-endian float64 columns (`time.f64`, `<sensor>.f64`, ...) per scenario.
+
+    Columns are memory-mapped on read, so a tail or time-range read touches
+    only the rows it returns. `time` must be non-decreasing; it is what
+    `range()` bisects. A sensor CSV is converted once (in chunks) and the
+    store is rebuilt only if that CSV's path, mtime or size changes; rows
+    added with `append()` live in the store itself. Opened stores are kept
+    per root and reused until `meta.json` or the CSV changes.
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root)
+        self.meta = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))
+        self._maps: Dict[str, np.ndarray] = {}
+
+    # ---------- create / convert ----------
+    @classmethod
+    def create(cls, root: pathlib.Path, columns: List[str], source: Optional[Dict] = None) -> "TimeSeriesStore":
+        root = pathlib.Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        for c in [TIME_COL, *columns]:
+            (root / f"{c}.f64").write_bytes(b"")
+        meta = {"version": STORE_VERSION, "columns": list(columns), "source": source}
+        (root / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        return cls(root)
+
+    @classmethod
+    def from_csv(cls, csv_path: pathlib.Path, root: pathlib.Path, chunksize: int = 1_000_000) -> "TimeSeriesStore":
+        csv_path = pathlib.Path(csv_path)
+        st = csv_path.stat()
+        tmp = root.with_name(root.name + f".tmp{os.getpid()}.{threading.get_ident()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        columns = [c for c in pd.read_csv(csv_path, nrows=0).columns if c != TIME_COL]
+        source = {"csv": str(csv_path.resolve()), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        store = cls.create(tmp, columns, source)
+        row = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            times = chunk[TIME_COL].to_numpy(DTYPE) if TIME_COL in chunk else np.arange(row, row + len(chunk), dtype=DTYPE)
+            store.append(times, {c: chunk[c].to_numpy(DTYPE) for c in columns})
+            row += len(chunk)
+        shutil.rmtree(root, ignore_errors=True)
+        os.replace(tmp, root)
+        return cls(root)
+
+    @classmethod
+    def open(cls, scenario: str, csv_path: Optional[pathlib.Path] = None) -> "TimeSeriesStore":
+        """Open the store for `scenario`, converting `csv_path` first if needed."""
+        root = CACHE_DIR / scenario
+        sig = cls._signature(root, csv_path)
+        hit = _OPEN.get(root)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        store = cls._open_valid(root, csv_path)
+        if store is None:
+            if csv_path is None or not pathlib.Path(csv_path).exists():
+                raise FileNotFoundError(csv_path or root)
+            with _BUILD_LOCK:
+                # another thread may have converted it while we waited
+                store = cls._open_valid(root, csv_path) or cls.from_csv(csv_path, root)
+            sig = cls._signature(root, csv_path)
+        _OPEN[root] = (sig, store)
+        return store
+
+    @staticmethod
+    def _signature(root: pathlib.Path, csv_path: Optional[pathlib.Path]) -> tuple:
+        """What an open store depends on: its meta.json and the CSV it came from."""
+        def stat(p):
+            try:
+                st = pathlib.Path(p).stat()
+            except OSError:
+                return None
+            return st.st_mtime_ns, st.st_size
+        return stat(root / "meta.json"), None if csv_path is None else (str(csv_path), stat(csv_path))
+
+    @classmethod
+    def _open_valid(cls, root: pathlib.Path, csv_path: Optional[pathlib.Path]) -> Optional["TimeSeriesStore"]:
+        try:
+            store = cls(root)
+        except (OSError, ValueError):
+            return None
+        if store.meta.get("version") != STORE_VERSION:
+            return None
+        src = store.meta.get("source")
+        if csv_path is None or src is None or not pathlib.Path(csv_path).exists():
+            return store
+        # the cache is named after the scenario: another CSV under that name is a miss
+        st = pathlib.Path(csv_path).stat()
+        if (src.get("csv"), src.get("mtime_ns"), src.get("size")) == (
+                str(pathlib.Path(csv_path).resolve()), st.st_mtime_ns, st.st_size):
+            return store
+        return None
+
+    # ---------- read ----------
+    @property
+    def columns(self) -> List[str]:
+        return list(self.meta["columns"])
+
+    def _column(self, name: str) -> np.ndarray:
+        path = self.root / f"{name}.f64"
+        n = path.stat().st_size // DTYPE.itemsize
+        m = self._maps.get(name)
+        if m is None or len(m) != n:
+            m = np.memmap(path, dtype=DTYPE, mode="r", shape=(n,)) if n else np.empty(0, dtype=DTYPE)
+            self._maps[name] = m
+        return m
+
+    def __len__(self) -> int:
+        # `time` is written last on append, so it bounds every other column
+        return len(self._column(TIME_COL))
+
+    def resolve(self, sensor_id: str) -> str:
+        """Column for `sensor_id`; single-sensor CSVs store it as `value`."""
+        if sensor_id in self.meta["columns"]:
+            return sensor_id
+        if "value" in self.meta["columns"]:
+            return "value"
+        raise KeyError(sensor_id)
+
+    def times(self) -> np.ndarray:
+        return self._column(TIME_COL)
+
+    def tail(self, column: str, n: int) -> np.ndarray:
+        """Last `n` values of `column` as a read-only view."""
+        total = len(self)
+        return self._column(column)[max(0, total - n):total]
+
+    def range(self, column: str, t0: Optional[float] = None, t1: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(times, values) with t0 <= time <= t1; either bound may be open."""
+        total = len(self)
+        t = self._column(TIME_COL)[:total]
+        lo = 0 if t0 is None else int(np.searchsorted(t, t0, side="left"))
+        hi = total if t1 is None else int(np.searchsorted(t, t1, side="right"))
+        return t[lo:hi], self._column(column)[lo:hi]
+
+    # ---------- write ----------
+    def append(self, times, values: Dict[str, np.ndarray]) -> int:
+        """Append rows for every column; returns the new row count.
+
+        Times must not go backwards. Missing sensor columns are filled with NaN.
+        """
+        times = np.ascontiguousarray(times, dtype=DTYPE).ravel()
+        if not len(times):
+            return len(self)
+        if np.any(np.diff(times) < 0):
+            raise ValueError("append: times must be non-decreasing")
+        prev = self._column(TIME_COL)
+        if len(prev) and times[0] < prev[-1]:
+            raise ValueError(f"append: time {times[0]} is before last stored time {prev[-1]}")
+        unknown = set(values) - set(self.meta["columns"])
+        if unknown:
+            raise KeyError(f"append: unknown columns {sorted(unknown)}")
+        cols = {}
+        for c in self.meta["columns"]:
+            v = values.get(c)
+            v = np.full(len(times), np.nan, dtype=DTYPE) if v is None else np.ascontiguousarray(v, dtype=DTYPE).ravel()
+            if len(v) != len(times):
+                raise ValueError(f"append: column {c!r} has {len(v)} rows, expected {len(times)}")
+            cols[c] = v
+        for c, v in cols.items():
+            path = self.root / f"{c}.f64"
+            # drop rows an interrupted append wrote past the `time` column
+            if path.stat().st_size > len(prev) * DTYPE.itemsize:
+                os.truncate(path, len(prev) * DTYPE.itemsize)
+            with open(path, "ab") as f:
+                f.write(v.tobytes())
+        with open(self.root / f"{TIME_COL}.f64", "ab") as f:
+            f.write(times.tobytes())
+        return len(self)
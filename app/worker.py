@@ -0,0 +1,469 @@
+# app/worker.py  (resident incident worker: warm models, job queue, pool, metrics)
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse, json, os, pathlib, queue, threading, time, uuid
+import numpy as np
+from pydantic import BaseModel, ValidationError
+
+from .graph import get_graph, AgentState
+from .ingest import Alert, AlertGroup, Correlator, MIN_SIMILARITY
+from .tools import DATA_DIR, get_timeseries_batch
+from .online import ingest_samples
+from .logindex import LogIndex
+from .logstream import log_paths
+from . import spans
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SPOOL_DIR = ROOT / "spool"
+
+
+class IncidentJob(BaseModel):
+    id: str = ""
+    scenario: str
+    description: str = ""
+    sensors: List[str] = []
+    ts: Optional[float] = None  # epoch seconds the alert fired (correlating intake; default: arrival)
+    asset: str = ""  # what the alert is about (correlating intake; derived when empty)
+    alerts: List[Dict[str, Any]] = []  # the correlated alerts a group's job stands for
+
+
+class SampleBatch(BaseModel):
+    """Live rows for one scenario: stored-time units, one list per sensor."""
+    scenario: str
+    times: List[float]
+    values: Dict[str, List[float]]
+
+
+class IncidentWorker:
+    """Runs incidents from an in-process queue on `workers` threads.
+
+    Everything expensive (planner model, RAG index, log indexes, timeseries
+    stores, the compiled graph) is loaded once by `start()`, so queued
+    incidents only pay for their own tool calls. Finished results are kept
+    in a bounded LRU for lookups and handed to `on_done` when given.
+
+    With `correlate_window_s > 0` every submitted incident is an alert fed
+    through an `app.ingest.Correlator` first: near-duplicate alerts about
+    the same asset wait in an open group, which is queued as one job once
+    it has been idle for the window (checked against the wall clock, so
+    alert `ts` should be epoch seconds near now). Each alert still gets its
+    own result, the group's with "group" set to the leader's id.
+    """
+
+    def __init__(self, workers: int = 4, keep_results: int = 10_000, window: int = 10_000,
+                 correlate_window_s: float = 0.0, min_similarity: float = MIN_SIMILARITY):
+        self.workers = max(1, workers)
+        self.keep_results = keep_results
+        self.correlator = Correlator(correlate_window_s, min_similarity) if correlate_window_s > 0 else None
+        self._grouping: Dict[str, Optional[Callable]] = {}  # alert id -> on_done, while its group is open
+        self._group_of: Dict[str, str] = {}  # alert id -> its group's job id, while that job is queued
+        self._corr_lock = threading.Lock()
+        self._ticker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._q: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._latency = deque(maxlen=window)  # enqueue -> done (ms)
+        self._service = deque(maxlen=window)  # graph invoke only (ms)
+        self._spans = deque(maxlen=window * 16)  # recent node/tool spans when TRACE_SPANS is on
+        self.processed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+
+    # ---------- lifecycle ----------
+    def warmup(self) -> Dict[str, float]:
+        """Load models and per-scenario caches now; returns ms per step."""
+        from . import llm, graph
+        out = {}
+        t0 = time.perf_counter()
+        llm.warmup()  # no-op with NO_PLANNER=1
+        out["planner_ms"] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        graph.rag("warmup", top_k=1)
+        out["rag_ms"] = (time.perf_counter() - t0) * 1000.0
+        if graph.memory_enabled():
+            t0 = time.perf_counter()
+            graph.get_memory().recall("warmup", k=1)
+            out["memory_ms"] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        for p in sorted((DATA_DIR / "scenarios").glob("*.yaml")):
+            try:
+                get_timeseries_batch(p.stem, window=1)  # converts the CSV once, maps the columns
+            except OSError:
+                pass
+            for path in log_paths(DATA_DIR / "logs", p.stem):
+                if path.suffix == ".jsonl":
+                    LogIndex.open(path)
+        out["stores_ms"] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        get_graph()
+        out["graph_ms"] = (time.perf_counter() - t0) * 1000.0
+        return {k: round(v, 1) for k, v in out.items()}
+
+    def start(self, warm: bool = True) -> Dict[str, float]:
+        timings = self.warmup() if warm else {}
+        self.started_at = time.perf_counter()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"incident-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.correlator is not None:
+            self._stopping.clear()
+            self._ticker = threading.Thread(target=self._tick, name="incident-correlator", daemon=True)
+            self._ticker.start()
+        return timings
+
+    def stop(self, drain: bool = True):
+        """Stop the worker threads. `drain=True` finishes every queued job first;
+        otherwise queued jobs are dropped (a job already running completes).
+        Open alert groups are queued when draining and dropped otherwise.
+        Dropped ids keep a "dropped" result, so `result()` never reports them
+        as still queued or correlating."""
+        if self._ticker is not None:
+            self._stopping.set()
+            self._ticker.join()
+            self._ticker = None
+        if self.correlator is not None:
+            with self._corr_lock:
+                groups = self.correlator.flush()
+                if drain:
+                    self._submit_groups(groups)
+                else:
+                    self._grouping.clear()
+                    for g in groups:
+                        self._drop(g.leader.id, [a.id for a in g.members])
+        if drain:
+            self._q.join()
+        else:
+            while True:
+                try:
+                    job, _ = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                self._drop(job.id, [a["id"] for a in job.alerts])
+                self._q.task_done()
+        for _ in self._threads:
+            self._q.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads.clear()
+
+    def _drop(self, job_id: str, alert_ids: List[str]):
+        """Record a job that will never run (and every alert of its group) as dropped."""
+        with self._lock:
+            self._pending.pop(job_id, None)
+            self._results[job_id] = {"id": job_id, "status": "dropped"}
+            for alert_id in alert_ids:
+                self._group_of.pop(alert_id, None)
+                self._results[alert_id] = {"id": alert_id, "status": "dropped", "group": job_id}
+            while len(self._results) > self.keep_results:
+                self._results.popitem(last=False)
+
+    # ---------- queue ----------
+    def submit(self, job: IncidentJob, on_done=None) -> str:
+        """Queue one incident (or, when correlating, add it as an alert); returns its id."""
+        job_id = job.id or uuid.uuid4().hex[:12]
+        job = job.model_copy(update={"id": job_id})
+        if self.correlator is None:
+            self._put(job, on_done)
+            return job_id
+        alert = Alert(id=job_id, scenario=job.scenario, description=job.description, sensors=job.sensors,
+                      asset=job.asset, **({"ts": job.ts} if job.ts is not None else {}))
+        with self._corr_lock:
+            self._grouping[job_id] = on_done
+            self._submit_groups(self.correlator.add(alert))
+        return job_id
+
+    def _put(self, job: IncidentJob, on_done):
+        with self._lock:
+            self._pending[job.id] = time.perf_counter()
+        self._q.put((job, on_done))
+
+    def _submit_groups(self, groups: List[AlertGroup]):
+        """Queue one job per closed group (hold `_corr_lock`)."""
+        for g in groups:
+            st = g.state()
+            job = IncidentJob(id=g.leader.id, scenario=st.scenario, description=st.description,
+                              sensors=st.sensors, alerts=st.alerts)
+            members = [(a.id, self._grouping.pop(a.id, None)) for a in g.members]
+            with self._lock:
+                self._group_of.update((a.id, job.id) for a in g.members[1:])
+            self._put(job, lambda res, members=members: self._fan_out(res, members))
+
+    @staticmethod
+    def _fan_out(res: Dict[str, Any], members: List[Tuple[str, Optional[Callable]]]):
+        for alert_id, on_done in members:
+            if on_done is not None:
+                try:
+                    on_done({**res, "id": alert_id, "group": res["id"]})
+                except Exception:
+                    pass  # one failing sink must not starve the other members
+
+    def _tick(self):
+        """Queue alert groups once they have been idle for the correlation window."""
+        while not self._stopping.wait(min(1.0, self.correlator.window_s / 4)):
+            with self._corr_lock:
+                self._submit_groups(self.correlator.expire(time.time()))
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._corr_lock:
+            if job_id in self._grouping:
+                return {"id": job_id, "status": "correlating"}
+        with self._lock:
+            if job_id in self._results:
+                return self._results[job_id]
+            group = self._group_of.get(job_id)
+            if job_id in self._pending or group in self._pending:
+                return {"id": job_id, "status": "queued", **({"group": group} if group else {})}
+        return None
+
+    def _loop(self):
+        app = get_graph()
+        while True:
+            item = self._q.get()
+            if item is None:
+                self._q.task_done()
+                return
+            job, on_done = item
+            t0 = time.perf_counter()
+            run_spans = []
+            try:
+                out = app.invoke(AgentState(scenario=job.scenario, description=job.description, sensors=job.sensors,
+                                            alerts=job.alerts))
+                res = {"id": job.id, "status": "done", "scenario": job.scenario,
+                       "confidence": float(out.get("confidence", 0.0)),
+                       "anomaly_score": float((out.get("evidence") or {}).get("anomaly_score", 0.0)),
+                       "kb": [n["id"] for n in (out.get("evidence") or {}).get("kb", [])],
+                       "timings": out.get("timings", {}), "report_md": out.get("report_md", "")}
+                run_spans = out.get("spans", [])
+            except Exception as e:
+                res = {"id": job.id, "status": "failed", "scenario": job.scenario, "error": repr(e)}
+            done = time.perf_counter()
+            with self._lock:
+                queued_at = self._pending.pop(job.id, t0)
+                res["latency_ms"] = round((done - queued_at) * 1000.0, 3)
+                res["service_ms"] = round((done - t0) * 1000.0, 3)
+                self._latency.append(res["latency_ms"])
+                self._service.append(res["service_ms"])
+                self._spans.extend(run_spans)
+                if res["status"] == "done":
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                self._results[job.id] = res
+                for a in job.alerts:  # every member of a correlated group, the leader included
+                    self._group_of.pop(a["id"], None)
+                    self._results[a["id"]] = {**res, "id": a["id"], "group": job.id}
+                while len(self._results) > self.keep_results:
+                    self._results.popitem(last=False)
+            if on_done is not None:
+                try:
+                    on_done(res)
+                except Exception:
+                    pass  # a failing sink must not kill the worker thread
+            self._q.task_done()
+
+    # ---------- metrics ----------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = np.asarray(self._latency, dtype=float)
+            svc = np.asarray(self._service, dtype=float)
+            processed, failed = self.processed, self.failed
+            recent_spans = list(self._spans)
+        uptime = time.perf_counter() - self.started_at if self.started_at else 0.0
+
+        def pct(a: np.ndarray) -> Dict[str, float]:
+            if not a.size:
+                return {}
+            p50, p95, p99 = np.percentile(a, [50, 95, 99])
+            return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+        with self._corr_lock:
+            grouping = len(self._grouping)
+        out = {"workers": self.workers, "queue_depth": self._q.qsize(), "correlating": grouping,
+               "processed": processed, "failed": failed,
+               "uptime_s": round(uptime, 3), "throughput_per_s": round(processed / uptime, 3) if uptime else 0.0,
+               "latency": pct(lat), "service": pct(svc)}
+        if recent_spans:
+            out["spans"] = spans.aggregate(recent_spans)
+        return out
+
+
+# ---------- JSONL spool directory ----------
+class SpoolReader:
+    """Feeds a worker from `<root>/incoming/*.jsonl` (one incident per line).
+
+    A file is claimed by renaming it into `processing/`; each result is
+    written to `done/<id>.json` and the claimed file is removed once all of
+    its incidents are finished. Files left in `processing/` by a crash are
+    picked up again on start.
+    """
+
+    def __init__(self, root: pathlib.Path, worker: IncidentWorker, poll_s: float = 0.5):
+        self.root = pathlib.Path(root)
+        self.worker = worker
+        self.poll_s = poll_s
+        for sub in ("incoming", "processing", "done"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+        self._left: Dict[pathlib.Path, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        for path in sorted((self.root / "processing").glob("*.jsonl")):
+            self._enqueue(path)
+        self._thread = threading.Thread(target=self._poll, name="spool-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            incoming = []
+            for path in (self.root / "incoming").glob("*.jsonl"):
+                try:
+                    incoming.append((path.stat().st_mtime, path))
+                except OSError:
+                    continue  # claimed by another reader since the glob
+            for _, path in sorted(incoming):
+                claimed = self.root / "processing" / path.name
+                try:
+                    os.replace(path, claimed)
+                except OSError:
+                    continue  # another reader got it
+                self._enqueue(claimed)
+            self._stop.wait(self.poll_s)
+
+    def _enqueue(self, path: pathlib.Path):
+        jobs = []
+        for i, line in enumerate(path.read_text(encoding="utf-8").splitlines()):
+            if not line.strip():
+                continue
+            try:
+                job = IncidentJob.model_validate_json(line)
+            except ValidationError as e:
+                self._write({"id": f"{path.stem}-{i}", "status": "invalid", "error": str(e)})
+                continue
+            jobs.append(job if job.id else job.model_copy(update={"id": f"{path.stem}-{i}"}))
+        if not jobs:
+            path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._left[path] = len(jobs)
+        for job in jobs:
+            self.worker.submit(job, on_done=lambda res, path=path: self._done(path, res))
+
+    def _write(self, res: Dict[str, Any]):
+        out = self.root / "done" / f"{res['id']}.json"
+        tmp = out.with_suffix(f".tmp{threading.get_ident()}")
+        tmp.write_text(json.dumps(res), encoding="utf-8")
+        os.replace(tmp, out)
+
+    def _done(self, path: pathlib.Path, res: Dict[str, Any]):
+        self._write(res)
+        with self._lock:
+            self._left[path] -= 1
+            finished = self._left[path] == 0
+            if finished:
+                del self._left[path]
+        if finished:
+            path.unlink(missing_ok=True)
+
+
+# ---------- local HTTP endpoint ----------
+def make_http_server(worker: IncidentWorker, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """POST /incidents (object or list) -> {"ids": [...]}; GET /incidents/<id>; GET /stats.
+
+    POST /samples ({"scenario", "times", "values": {sensor: [...]}}) appends
+    live rows to the scenario's store and feeds the live detectors, whose
+    scores the graph prefers over the stored window.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: Any):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.rstrip("/") == "/samples":
+                try:
+                    batch = SampleBatch.model_validate_json(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    return self._send(200, ingest_samples(batch.scenario, batch.times, batch.values))
+                except (ValueError, KeyError, OSError) as e:  # ValidationError is a ValueError
+                    return self._send(400, {"error": str(e)})
+            if self.path.rstrip("/") != "/incidents":
+                return self._send(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+                items = body if isinstance(body, list) else [body]
+                jobs = [IncidentJob.model_validate(it) for it in items]
+            except (ValueError, ValidationError) as e:
+                return self._send(400, {"error": str(e)})
+            self._send(202, {"ids": [worker.submit(j) for j in jobs]})
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                return self._send(200, worker.stats())
+            if self.path.startswith("/incidents/"):
+                res = worker.result(self.path[len("/incidents/"):])
+                if res is None:
+                    return self._send(404, {"error": "unknown id"})
+                return self._send(200 if res["status"] != "queued" else 202, res)
+            self._send(404, {"error": "not found"})
+
+        def log_message(self, fmt, *args):
+            pass  # keep stdout for the stats lines
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Resident incident worker: warm models once, serve many incidents.")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--spool", type=pathlib.Path, default=None, help=f"JSONL spool directory (e.g. {SPOOL_DIR})")
+    p.add_argument("--http", type=int, default=None, metavar="PORT", help="Serve a local HTTP endpoint on PORT")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--stats-every", type=float, default=10.0, help="Seconds between stats lines on stdout")
+    p.add_argument("--correlate-window", type=float, default=0.0, metavar="S",
+                   help="Group near-duplicate alerts idle up to S seconds into one run (0 = every incident runs)")
+    p.add_argument("--min-similarity", type=float, default=MIN_SIMILARITY)
+    p.add_argument("--no-planner", action="store_true", help="Use the static plan; never load torch/transformers.")
+    args = p.parse_args()
+    if args.no_planner:
+        os.environ["NO_PLANNER"] = "1"
+    if args.spool is None and args.http is None:
+        p.error("give --spool DIR and/or --http PORT")
+
+    worker = IncidentWorker(workers=args.workers, correlate_window_s=args.correlate_window,
+                            min_similarity=args.min_similarity)
+    print(json.dumps({"warmup": worker.start()}), flush=True)
+    spool = SpoolReader(args.spool, worker) if args.spool else None
+    if spool:
+        spool.start()
+    server = make_http_server(worker, args.host, args.http) if args.http is not None else None
+    if server:
+        threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    try:
+        while True:
+            time.sleep(args.stats_every)
+            print(json.dumps(worker.stats()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server:
+            server.shutdown()
+        if spool:
+            spool.stop()
+        worker.stop(drain=False)
@@ -0,0 +1,101 @@
+# bench/anomaly.py
+"""
+Anomaly scoring: MAD rule vs. per-sensor-group IsolationForest models.
+
+    python -m bench.anomaly --scenarios 9 --sensors 1000 --samples 5000
+
+A bench.synth tree is generated (one injected fault sensor per fault
+scenario). For each scenario the last 300 samples of every sensor are
+scored in one `anomaly_score_batch` call. Reported:
+
+  * train_s             - fitting the scenario's models (--group class|sensor)
+  * mad / model         - p50/p95 of the batch call, warm
+  * model_cold_ms       - first model call per scenario in a fresh registry
+                          (joblib load of the forests)
+  * top1                - fault scenarios whose fault sensor ranks first
+  * normal_max          - highest score on a no-fault scenario (lower is better)
+  * registry            - loaded models, resident MB vs. --budget-mb, evictions
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+
+from bench.synth import generate
+
+
+def pct(ms) -> dict:
+    p50, p95 = np.percentile(np.asarray(ms, dtype=float), [50, 95])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3)}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scenarios", type=int, default=9)
+    p.add_argument("--sensors", type=int, default=1000)
+    p.add_argument("--samples", type=int, default=5000)
+    p.add_argument("--group", choices=("class", "sensor"), default="class")
+    p.add_argument("--budget-mb", type=float, default=256.0)
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    data_dir = pathlib.Path(tempfile.mkdtemp(prefix="bench_anomaly_data_"))
+    generate(data_dir, scenarios=args.scenarios, sensors=args.sensors, samples=args.samples,
+             log_lines=100, notes=4, seed=args.seed)
+    os.environ["INCIDENT_DATA_DIR"] = str(data_dir)
+    os.environ["INCIDENT_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_anomaly_cache_")
+
+    from app import tools
+    from app.anomaly import ModelRegistry
+
+    tools.MODELS_DIR = pathlib.Path(tempfile.mkdtemp(prefix="bench_anomaly_models_"))
+    root = tools.MODELS_DIR / "anomaly"
+    scenarios = sorted(q.stem for q in (data_dir / "scenarios").glob("*.yaml"))
+
+    train_s = 0.0
+    reg = ModelRegistry(root, budget_mb=args.budget_mb, group=args.group)
+    for name in scenarios:
+        t0 = time.perf_counter()
+        reg.train(name, tools._open_store(name))
+        train_s += time.perf_counter() - t0
+
+    # a fresh registry sees only the files: the first call per scenario loads its models
+    tools._anomaly_registries[root] = reg = ModelRegistry(root, budget_mb=args.budget_mb, group=args.group)
+    mad_ms, model_ms, cold_ms, top1, faults, normal_max = [], [], [], 0, 0, {"mad": 0.0, "model": 0.0}
+    for name in scenarios:
+        ids, mat = tools.get_timeseries_batch(name, None, window=300)
+        t0 = time.perf_counter()
+        ranked = {"model": tools.anomaly_score_batch(mat, ids, method="model", scenario=name).ranked}
+        cold_ms.append((time.perf_counter() - t0) * 1000.0)
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            ranked["mad"] = tools.anomaly_score_batch(mat, ids).ranked
+            mad_ms.append((time.perf_counter() - t0) * 1000.0)
+            t0 = time.perf_counter()
+            tools.anomaly_score_batch(mat, ids, method="model", scenario=name)
+            model_ms.append((time.perf_counter() - t0) * 1000.0)
+        if "normal" in name:
+            for m, r in ranked.items():
+                normal_max[m] = max(normal_max[m], r[0].score)
+            continue
+        # the injected fault is the sensor with the largest peak over the window
+        fault = ranked["mad"][int(np.argmax([r.peak_to_mad for r in ranked["mad"]]))].sensor_id
+        faults += 1
+        top1 += ranked["model"][0].sensor_id == fault
+
+    print(json.dumps({
+        "scenarios": len(scenarios), "sensors": args.sensors, "group": args.group,
+        "train_s": round(train_s, 2), "mad": pct(mad_ms), "model": pct(model_ms),
+        "model_cold_ms": pct(cold_ms), "top1": f"{top1}/{faults}",
+        "normal_max": {k: round(v, 3) for k, v in normal_max.items()}, "registry": reg.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench/graph_compile.py
+"""
+Per-incident cost of compiling the agent graph on every run vs. reusing one.
+
+    python -m bench.graph_compile --incidents 200
+
+Runs the same incidents twice with the static plan: once calling
+`build_graph().invoke(...)` per incident (the old CLI / dashboard / eval
+pattern) and once through the shared `get_graph()`. Also reports the cost
+of `build_graph()` alone and a threaded run on the shared graph. Tickets
+are written to a temporary directory.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["NO_PLANNER"] = "1"
+
+SCENARIOS = [
+    ("bearing_wear_03", "High vibration spike reported on sensor_A near line 2."),
+    ("packet_loss_02", "Telemetry gaps detected; gateway reports packet loss intermittently."),
+]
+
+
+def timed(fn, n: int) -> list[float]:
+    out = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def summary(ms: list[float]) -> dict:
+    return {"p50_ms": round(statistics.median(ms), 3), "mean_ms": round(statistics.mean(ms), 3)}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--incidents", type=int, default=200)
+    p.add_argument("--threads", type=int, default=8)
+    args = p.parse_args()
+
+    from app import memory, tools
+    from app.graph import build_graph, get_graph, AgentState
+    tools.MODELS_DIR = pathlib.Path(tempfile.mkdtemp(prefix="bench_tickets_"))
+    memory.MEMORY_DIR = tools.MODELS_DIR / "memory"
+
+    states = [AgentState(scenario=s, description=d) for s, d in SCENARIOS]
+    state = lambda i: states[i % len(states)]
+    get_graph().invoke(states[0])  # warm caches (log index, timeseries store, RAG)
+
+    compile_ms = timed(lambda i: build_graph(), args.incidents)
+    recompile = timed(lambda i: build_graph().invoke(state(i)), args.incidents)
+    shared = timed(lambda i: get_graph().invoke(state(i)), args.incidents)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as ex:
+        list(ex.map(lambda i: get_graph().invoke(state(i)), range(args.incidents)))
+    threaded_s = time.perf_counter() - t0
+
+    print(json.dumps({
+        "incidents": args.incidents,
+        "compile_only": summary(compile_ms),
+        "recompile_per_incident": summary(recompile),
+        "shared_graph": summary(shared),
+        "saved_per_incident_ms": round(statistics.mean(recompile) - statistics.mean(shared), 3),
+        "shared_graph_threaded": {"threads": args.threads,
+                                  "incidents_per_s": round(args.incidents / threaded_s, 1)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
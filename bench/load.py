@@ -0,0 +1,148 @@
+# bench/load.py
+"""
+End-to-end load benchmark over synthetic data trees of growing size.
+
+    python -m bench.load --sizes small medium --incidents 200 --out load.json
+
+For each size preset (see SIZES) a tree is generated with `bench.synth`
+and a fresh interpreter runs `--incidents` incidents (cycling through the
+scenarios) through the shared graph with the static plan. Reported per size:
+
+  * generate_s        - time to write the tree
+  * cold_ms           - first incident (builds log indexes, timeseries stores, RAG)
+  * e2e               - p50/p95/p99 per incident after the first
+  * nodes             - p50/p95/p99 per graph node (from state.timings)
+  * throughput_per_s  - warm incidents per second, sequential and --threads
+  * peak_rss_mb       - max resident set size of the run
+
+The JSON includes the git commit so runs can be diffed between commits.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+SIZES = {
+    "small": dict(scenarios=20, sensors=8, samples=2_000, log_lines=1_000, notes=20),
+    "medium": dict(scenarios=50, sensors=32, samples=20_000, log_lines=20_000, notes=200),
+    "large": dict(scenarios=100, sensors=64, samples=100_000, log_lines=200_000, notes=2_000),
+}
+
+
+def pct(ms) -> dict:
+    a = np.asarray(ms, dtype=float)
+    if not a.size:
+        return {}
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def run_child(incidents: int, threads: int) -> dict:
+    """Runs inside the fresh interpreter; INCIDENT_DATA_DIR is already set."""
+    from concurrent.futures import ThreadPoolExecutor
+    import yaml
+    from app import memory, tools
+    from app.graph import get_graph, AgentState
+
+    tools.MODELS_DIR = pathlib.Path(tempfile.mkdtemp(prefix="bench_tickets_"))
+    memory.MEMORY_DIR = tools.MODELS_DIR / "memory"
+    scen_dir = tools.DATA_DIR / "scenarios"
+    states = []
+    for p in sorted(scen_dir.glob("*.yaml")):
+        meta = yaml.safe_load(p.read_text(encoding="utf-8"))
+        states.append(AgentState(scenario=p.stem, description=meta["description"], sensors=meta.get("sensors", [])))
+    app = get_graph()
+
+    # first pass over every scenario builds its caches: report it as cold
+    cold = []
+    for s in states:
+        t0 = time.perf_counter()
+        app.invoke(s)
+        cold.append((time.perf_counter() - t0) * 1000.0)
+
+    e2e, nodes = [], {}
+    t_start = time.perf_counter()
+    for i in range(incidents):
+        t0 = time.perf_counter()
+        out = app.invoke(states[i % len(states)])
+        e2e.append((time.perf_counter() - t0) * 1000.0)
+        for name, ms in (out.get("timings") or {}).items():
+            nodes.setdefault(name, []).append(ms)
+    seq_s = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(lambda i: app.invoke(states[i % len(states)]), range(incidents)))
+    thr_s = time.perf_counter() - t_start
+
+    return {
+        "cold_ms": pct(cold),
+        "e2e": pct(e2e),
+        "nodes": {k: pct(v) for k, v in sorted(nodes.items())},
+        "throughput_per_s": {"sequential": round(incidents / seq_s, 2),
+                             f"threads_{threads}": round(incidents / thr_s, 2)},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    p.add_argument("--incidents", type=int, default=200)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", type=pathlib.Path, default=None, help="Also write the JSON here")
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.incidents, args.threads)))
+        return
+
+    from bench.synth import generate
+
+    results = {}
+    for size in args.sizes:
+        data_dir = pathlib.Path(tempfile.mkdtemp(prefix=f"bench_load_{size}_"))
+        t0 = time.perf_counter()
+        info = generate(data_dir, seed=args.seed, **SIZES[size])
+        gen_s = time.perf_counter() - t0
+        env = {**os.environ, "INCIDENT_DATA_DIR": str(data_dir), "NO_PLANNER": "1",
+               "INCIDENT_CACHE_DIR": tempfile.mkdtemp(prefix=f"bench_load_{size}_cache_")}
+        proc = subprocess.run([sys.executable, "-m", "bench.load", "--child",
+                               "--incidents", str(args.incidents), "--threads", str(args.threads)],
+                              cwd=str(ROOT), env=env, capture_output=True, text=True)
+        row = {"data": info, "generate_s": round(gen_s, 2)}
+        if proc.returncode != 0:
+            row["error"] = (proc.stderr or "").strip().splitlines()[-1:]
+        else:
+            row.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+        results[size] = row
+
+    report = {"commit": git_commit(), "incidents": args.incidents, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out is not None:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
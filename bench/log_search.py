@@ -0,0 +1,146 @@
+# bench/log_search.py
+"""
+Query latency of the indexed `search_logs` vs. the old per-line json.dumps scan.
+
+    python -m bench.log_search --size-mb 2048
+
+Writes a synthetic gateway/sensor JSONL log of roughly --size-mb, then times:
+  * legacy scan (json.loads + json.dumps per line, every query)
+  * one-off index build + save
+  * cold index load and warm queries (p50 over --repeat runs)
+  * time-window queries: hits within ±--window-s of a few "peaks" (the
+    log's timestamps are unsorted), from the sorted timestamp index vs.
+    a streaming scan that parses every line's ts
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from app.logstream import iter_matches
+
+QUERIES = [
+    "error|warn|vibration|packet|overheat|gateway|backhaul|loss|cpu",
+    "bearing|gateway|temp|cpu",
+    "backhaul",
+    "packet loss",
+]
+
+MSGS = [
+    "vibration threshold exceeded", "bearing temp stable", "transient spike detected",
+    "gateway packet loss {n}%", "cpu {n}%", "backhaul retries exceeded", "heartbeat ok",
+    "sample batch flushed", "config reloaded", "link up",
+]
+LEVELS = ["INFO"] * 17 + ["WARN"] * 2 + ["ERROR"]
+
+
+def write_synthetic_log(path: pathlib.Path, size_mb: int, seed: int = 7) -> int:
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    lines = 0
+    with open(path, "w", encoding="utf-8") as f:
+        buf = []
+        while written < target:
+            rec = {
+                "ts": f"2025-05-09T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z",
+                "level": rng.choice(LEVELS),
+                "msg": rng.choice(MSGS).format(n=rng.randrange(100)),
+            }
+            if rng.random() < 0.5:
+                rec["gateway"] = f"gw-{rng.randrange(64)}"
+            else:
+                rec["sensor"] = f"sensor_{rng.randrange(512)}"
+            line = json.dumps(rec) + "\n"
+            buf.append(line)
+            written += len(line)
+            lines += 1
+            if len(buf) >= 10000:
+                f.writelines(buf)
+                buf.clear()
+        f.writelines(buf)
+    return lines
+
+
+def legacy_scan(path: pathlib.Path, query: str, limit: int = 20) -> list:
+    """The pre-index implementation of search_logs, kept for comparison."""
+    hits = []
+    with open(path) as f:
+        for line in f:
+            j = json.loads(line)
+            if any(tok in json.dumps(j).lower() for tok in query.lower().split("|")):
+                hits.append(j)
+    return hits[:limit]
+
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--size-mb", type=int, default=2048)
+    p.add_argument("--path", type=pathlib.Path, default=None,
+                   help="Reuse/write the synthetic log here (default: temp dir).")
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--skip-scan", action="store_true", help="Skip the (slow) legacy scan.")
+    p.add_argument("--window-s", type=float, default=300.0, help="± seconds around each peak")
+    args = p.parse_args()
+
+    path = args.path or pathlib.Path(tempfile.gettempdir()) / f"synthetic_{args.size_mb}mb.jsonl"
+    if not path.exists():
+        n, ms = timed(write_synthetic_log, path, args.size_mb)
+        print(f"wrote {path} ({n} lines) in {ms / 1000:.1f}s")
+
+    result = {"log": str(path), "bytes": path.stat().st_size, "queries": {}}
+
+    # keep the synthetic log's index out of the repo's .cache/
+    os.environ["INCIDENT_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_log_search_cache_")
+    from app.logindex import LogIndex
+
+    idx, build_ms = timed(LogIndex.build, path)
+    _, save_ms = timed(idx.save)
+    loaded, load_ms = timed(LogIndex.load, path)
+    result.update(lines=len(idx), build_ms=build_ms, save_ms=save_ms, cold_load_ms=load_ms)
+
+    for q in QUERIES:
+        hits, first_ms = timed(loaded.query, q)
+        warm = [timed(loaded.query, q)[1] for _ in range(args.repeat)]
+        row = {"index_first_ms": first_ms, "index_p50_ms": statistics.median(warm), "hits": len(hits)}
+        if not args.skip_scan:
+            legacy, scan_ms = timed(legacy_scan, path, q)
+            assert legacy == hits, f"index and scan disagree for {q!r}"
+            row["scan_ms"] = scan_ms
+            row["speedup"] = scan_ms / max(row["index_p50_ms"], 1e-6)
+        result["queries"][q] = row
+
+    day = datetime(2025, 5, 9, tzinfo=timezone.utc).timestamp()
+    result["window_s"], result["windows"] = args.window_s, {}
+    for peak in (day + 3 * 3600, day + 12 * 3600 + 1234, day + 23 * 3600):
+        t0, t1 = peak - args.window_s, peak + args.window_s
+        q = QUERIES[0]
+        hits, first_ms = timed(loaded.query, q, t0=t0, t1=t1)
+        warm = [timed(loaded.query, q, t0=t0, t1=t1)[1] for _ in range(args.repeat)]
+        row = {"in_window": len(loaded.lines_between(t0, t1)), "hits": len(hits),
+               "index_first_ms": first_ms, "index_p50_ms": statistics.median(warm)}
+        if not args.skip_scan:
+            scanned, scan_ms = timed(lambda: list(islice(iter_matches(path, q, t0=t0, t1=t1), 20)))
+            assert scanned == hits, f"index and scan disagree for window at {peak}"
+            row["scan_ms"] = scan_ms
+            row["speedup"] = scan_ms / max(row["index_p50_ms"], 1e-6)
+        result["windows"][datetime.fromtimestamp(peak, timezone.utc).strftime("%H:%M:%S")] = row
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench/memory.py
+"""
+Long-term incident memory: recall latency and quality at scale.
+
+    python -m bench.memory --incidents 1000000 --queries 200
+
+Fills a fresh `LongTerm` store (temporary directory) with synthetic past
+incidents in batches of --batch: descriptions from the bench.synth fault
+templates with random sensors / lines / gateways and a few filler words.
+Reported:
+
+  * insert_per_s       - incidents appended per second (embedding included)
+  * disk_mb            - store size on disk
+  * recall             - p50/p95/p99 of recall(k=3) through the IVF lists
+  * exact              - p50 of a brute-force cosine scan over every row
+  * recall_at_k        - share of the exact top-k scores that recall matched
+"""
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+
+from app.memory import LongTerm, embed
+from bench.synth import DESCRIPTIONS, FILLER
+
+
+def pct(ms) -> dict:
+    p50, p95, p99 = np.percentile(np.asarray(ms, dtype=float), [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def description(rng: np.random.Generator) -> tuple[str, str]:
+    fault = list(DESCRIPTIONS)[int(rng.integers(0, len(DESCRIPTIONS)))]
+    text = DESCRIPTIONS[fault].format(sensor=f"sensor_{int(rng.integers(0, 512)):03d}",
+                                      line=int(rng.integers(1, 9)), gw=int(rng.integers(1, 64)))
+    return fault, text + " " + " ".join(rng.choice(FILLER, size=int(rng.integers(2, 8))))
+
+
+def exact(store: LongTerm, text: str, k: int) -> np.ndarray:
+    """Top-k cosine scores over every row (brute force), best first."""
+    scores = store._vectors(slice(None)) @ embed(text, store.dim)
+    return np.sort(np.partition(scores, -k)[-k:])[::-1]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--incidents", type=int, default=1_000_000)
+    p.add_argument("--batch", type=int, default=10_000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--exact-queries", type=int, default=20)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    store = LongTerm(root=pathlib.Path(tempfile.mkdtemp(prefix="bench_memory_")))
+    t0 = time.perf_counter()
+    for start in range(0, args.incidents, args.batch):
+        items = []
+        for i in range(start, min(args.incidents, start + args.batch)):
+            fault, text = description(rng)
+            items.append((f"inc-{i:07d}", text, {"scenario": f"synth_{fault}", "summary": text,
+                                                 "ticket": f"ticket_{i}.md" if fault != "normal" else None}))
+        store.extend(items)
+    insert_s = time.perf_counter() - t0
+    store.reindex()
+
+    queries = [description(rng)[1] for _ in range(args.queries)]
+    store.recall(queries[0])  # map the files
+    ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        store.recall(q, k=3)
+        ms.append((time.perf_counter() - t0) * 1000.0)
+
+    exact_ms, found = [], []
+    for q in queries[:args.exact_queries]:
+        t0 = time.perf_counter()
+        truth = exact(store, q, 3)
+        exact_ms.append((time.perf_counter() - t0) * 1000.0)
+        # templated descriptions tie a lot, so compare scores rather than ids
+        got = [r["score"] for r in store.recall(q, k=3)] + [-1.0] * 3
+        found.extend(g >= t - 1e-3 for g, t in zip(got, truth))
+
+    disk = sum(f.stat().st_size for f in store.path.iterdir() if f.is_file())
+    print(json.dumps({
+        "incidents": len(store),
+        "insert_per_s": round(args.incidents / insert_s, 1),
+        "disk_mb": round(disk / 2**20, 1),
+        "recall": pct(ms),
+        "exact": pct(exact_ms),
+        "recall_at_k": round(float(np.mean(found)), 3) if found else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bench/rag.py
+"""
+Retrieval latency: BM25 passage index vs. the TF-IDF note index.
+
+    python -m bench.rag --passages 10000 100000 1000000 --queries 200
+
+Postings for each size are drawn directly (Zipf term frequencies, Poisson
+passage lengths, --per-note passages per note) so 1M passages build in
+seconds; both engines get the same postings, TF-IDF with one unit per
+passage. Reported per size: p50/p95/p99 of `search(top_k=3)` for both, on
+two query mixes of --query-terms terms:
+
+  * content  - terms drawn uniformly from the vocabulary (typical words)
+  * zipf     - terms drawn by frequency, so mostly near-stopwords whose
+               postings cover most passages (BM25's pruning rarely applies)
+
+`--notes` also builds both engines from real text (bench.synth KB notes)
+and reports build and cold load time plus the cited snippet length.
+"""
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+
+from app.rag import BM25Index, KBIndex
+
+VOCAB = 50_000
+
+
+def pct(ms) -> dict:
+    p50, p95, p99 = np.percentile(np.asarray(ms, dtype=float), [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def synthetic(cls, n_units: int, per_note: int, mean_len: int, rng: np.random.Generator):
+    lens = np.maximum(rng.poisson(mean_len, n_units), 1)
+    doc = np.repeat(np.arange(n_units, dtype=np.int64), lens)
+    term = (rng.zipf(1.3, int(lens.sum())) - 1) % VOCAB
+    key, count = np.unique(doc * VOCAB + term, return_counts=True)
+    n_notes = -(-n_units // per_note)
+    idx = cls([f"note_{i}" for i in range(n_notes)], [""] * n_notes, [f"w{i}" for i in range(VOCAB)],
+              (np.arange(n_units) // per_note).astype(np.int32), lens.astype(np.int32),
+              [f"passage {i}" for i in range(n_units)], None, None, None)
+    idx._set_postings(key % VOCAB, key // VOCAB, count)
+    return idx
+
+
+def time_queries(idx, queries) -> dict:
+    ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        idx.search(q, top_k=3)
+        ms.append((time.perf_counter() - t0) * 1000.0)
+    return pct(ms)
+
+
+def text_build(notes: int) -> dict:
+    from bench.synth import write_kb
+
+    kb = pathlib.Path(tempfile.mkdtemp(prefix="bench_rag_kb_"))
+    write_kb(kb, np.random.default_rng(0), notes)
+    query = "High vibration spike reported on sensor_007 near line 3. vibration threshold exceeded bearing temp rising"
+    out = {"notes": notes}
+    for cls in (KBIndex, BM25Index):
+        root = pathlib.Path(tempfile.mkdtemp(prefix="bench_rag_cache_"))
+        t0 = time.perf_counter()
+        idx = cls.open(kb, root)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        cls.open(kb, root)
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        top = idx.search(query, top_k=3)
+        out[cls.KIND] = {"units": idx.n_units, "build_ms": round(build_ms, 1), "load_ms": round(load_ms, 2),
+                         "top": [d["id"] for d in top], "snippet_chars": [len(d["snippet"]) for d in top]}
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--passages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--per-note", type=int, default=4)
+    p.add_argument("--mean-len", type=int, default=40, help="Mean tokens per passage")
+    p.add_argument("--query-terms", type=int, default=12)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--notes", type=int, default=2000, help="Text build check size (0 to skip)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    mixes = {
+        "content": [" ".join(f"w{t}" for t in rng.integers(0, VOCAB, args.query_terms))
+                    for _ in range(args.queries)],
+        "zipf": [" ".join(f"w{t}" for t in (rng.zipf(1.3, args.query_terms) - 1) % VOCAB)
+                 for _ in range(args.queries)],
+    }
+    results = {}
+    for n in args.passages:
+        row = {}
+        for cls, per_note in ((KBIndex, 1), (BM25Index, args.per_note)):
+            t0 = time.perf_counter()
+            idx = synthetic(cls, n, per_note, args.mean_len, np.random.default_rng(args.seed))
+            row[f"{cls.KIND}_setup_s"] = round(time.perf_counter() - t0, 2)
+            idx.search(mixes["content"][0])  # idf / norms / impacts
+            row[cls.KIND] = {mix: time_queries(idx, qs) for mix, qs in mixes.items()}
+        row["postings"] = int(len(idx.docs))
+        results[str(n)] = row
+
+    report = {"queries": args.queries, "query_terms": args.query_terms, "results": results}
+    if args.notes:
+        report["text"] = text_build(args.notes)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
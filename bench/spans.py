@@ -0,0 +1,58 @@
+# bench/spans.py
+"""
+Cost of span instrumentation per incident: off vs. on vs. on + tracemalloc.
+
+    python -m bench.spans --incidents 300
+
+Runs the shared graph with the static plan in each mode (same process,
+switched with spans.enable()/disable()) and reports p50/mean latency per
+incident and the overhead relative to "off". Tickets go to a temp dir.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import tempfile
+import time
+
+os.environ["NO_PLANNER"] = "1"
+os.environ.pop("TRACE_SPANS", None)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--incidents", type=int, default=300)
+    p.add_argument("--scenario", default="bearing_wear_03")
+    args = p.parse_args()
+
+    from app import memory, spans, tools
+    from app.graph import get_graph, AgentState
+    tools.MODELS_DIR = pathlib.Path(tempfile.mkdtemp(prefix="bench_tickets_"))
+    memory.MEMORY_DIR = tools.MODELS_DIR / "memory"
+    app = get_graph()
+    state = AgentState(scenario=args.scenario, description="High vibration spike reported on sensor_A.")
+    app.invoke(state)  # warm caches
+
+    modes = {"off": spans.disable, "on": spans.enable, "alloc": lambda: spans.enable(alloc=True)}
+    results = {}
+    for mode, switch in modes.items():
+        switch()
+        ms, n_spans = [], 0
+        for _ in range(args.incidents):
+            t0 = time.perf_counter()
+            out = app.invoke(state)
+            ms.append((time.perf_counter() - t0) * 1000.0)
+            n_spans = len(out.get("spans", []))
+        results[mode] = {"p50_ms": round(statistics.median(ms), 3), "mean_ms": round(statistics.mean(ms), 3),
+                         "spans_per_run": n_spans}
+        spans.disable()
+    base = results["off"]["mean_ms"]
+    for r in results.values():
+        r["overhead_pct"] = round((r["mean_ms"] - base) / base * 100.0, 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench/startup.py
+"""
+Import and cold-start latency of each entry point, in fresh interpreters.
+
+    python -m bench.startup --repeat 3
+
+For every entry point it records:
+  * import_ms   - `python -c "import <module>"`
+  * heavy       - whether torch / transformers ended up in sys.modules
+  * cold_ms     - one full run from a fresh process (CLI / eval only)
+both with the planner enabled and with NO_PLANNER=1.
+"""
+from __future__ import annotations
+import argparse
+import importlib.util
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+PROBE = (
+    "import importlib, sys, json; importlib.import_module({mod!r}); "
+    "print(json.dumps({{m: m in sys.modules for m in ('torch', 'transformers')}}))"
+)
+
+
+def run(cmd: list[str], env: dict) -> tuple[float, subprocess.CompletedProcess]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=str(ROOT), env=env, capture_output=True, text=True)
+    return (time.perf_counter() - t0) * 1000.0, proc
+
+
+def measure(cmd: list[str], env: dict, repeat: int) -> dict:
+    times, last = [], None
+    for _ in range(repeat):
+        ms, last = run(cmd, env)
+        if last.returncode != 0:
+            return {"error": (last.stderr or "").strip().splitlines()[-1:]}
+        times.append(ms)
+    return {"p50_ms": statistics.median(times), "min_ms": min(times), "stdout": last.stdout}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--scenario", default="bearing_wear_03")
+    args = p.parse_args()
+
+    outdir = pathlib.Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    entry_points = {
+        "cli": ("app.main", [sys.executable, "-m", "app.main", "--scenario", args.scenario]),
+        "eval": ("eval.harness", [sys.executable, "-m", "eval.harness", "--outdir", str(outdir)]),
+        # the dashboard is a Streamlit script: importing it executes one render pass
+        "dashboard": ("ui.dashboard", None),
+    }
+    has_streamlit = importlib.util.find_spec("streamlit") is not None
+
+    results = {}
+    for mode, extra_env, extra_args in (("planner", {"NO_PLANNER": "0"}, []),
+                                        ("no_planner", {"NO_PLANNER": "1"}, ["--no-planner"])):
+        env = {**os.environ, **extra_env}
+        for name, (module, cold_cmd) in entry_points.items():
+            if module == "ui.dashboard" and not has_streamlit:
+                results[f"{name}/{mode}"] = {"skipped": "streamlit not installed"}
+                continue
+            row = {}
+            imp = measure([sys.executable, "-c", PROBE.format(mod=module)], env, args.repeat)
+            row["import_ms"] = imp.get("p50_ms")
+            if "stdout" in imp:
+                row["heavy"] = json.loads(imp["stdout"].strip().splitlines()[-1])
+            else:
+                row["import_error"] = imp.get("error")
+            if cold_cmd is not None:
+                cold = measure(cold_cmd + extra_args, env, args.repeat)
+                row["cold_ms"] = cold.get("p50_ms")
+                if "error" in cold:
+                    row["cold_error"] = cold["error"]
+            results[f"{name}/{mode}"] = row
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# bench/synth.py
+"""
+Synthetic data tree generator: scenarios, timeseries, logs and KB notes.
+
+    python -m bench.synth --out /tmp/synth --scenarios 50 --sensors 32 \\
+        --samples 20000 --log-lines 5000 --notes 200
+
+Writes the same layout as `data/`:
+
+    <out>/scenarios/<name>.yaml   description, label, time_origin
+    <out>/timeseries/<name>.csv   time + one column per sensor
+    <out>/logs/<name>.jsonl       background INFO/DEBUG lines + fault lines
+    <out>/kb/*.md                 fault notes + filler notes
+
+Labels use the names `eval.harness` predicts: `bearing_wear`,
+`network_packet_loss`, and `unknown` for `normal` scenarios (no fault).
+Point the app at the tree with INCIDENT_DATA_DIR=<out>. Output is
+deterministic per --seed.
+"""
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import yaml
+
+FAULTS = ("bearing_wear", "network_packet_loss", "normal")
+LABELS = {"normal": "unknown"}  # what the harness predicts without fault evidence
+EPOCH = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+# background lines must not contain any log-search or classifier keyword
+NOISE_MSGS = ("heartbeat ok", "batch flushed", "config reloaded", "sample window rotated",
+              "setpoint unchanged", "shift handover logged", "firmware check ok")
+FAULT_LOGS = {
+    "bearing_wear": [("WARN", "vibration threshold exceeded"), ("ERROR", "transient spike detected"),
+                     ("INFO", "bearing temp rising")],
+    "network_packet_loss": [("WARN", "gateway packet loss {pct}%"), ("ERROR", "backhaul retries exceeded"),
+                            ("INFO", "cpu {cpu}%")],
+    "normal": [],
+}
+DESCRIPTIONS = {
+    "bearing_wear": "High vibration spike reported on {sensor} near line {line}.",
+    "network_packet_loss": "Telemetry gaps detected; gateway gw-{gw} reports packet loss intermittently.",
+    "normal": "Operator asked for a routine check of line {line}.",
+}
+KB_NOTES = {
+    "bearing_wear": "High vibration often correlates with **bearing wear**.\n- Check bearing temperature trend.\n"
+                    "- Inspect lubrication schedule.\n- Reduce load by 10% until inspection.\n",
+    "network_packet_loss": "Gateway **packet loss** shows up as telemetry gaps.\n- Check backhaul link and retries.\n"
+                           "- Inspect gateway CPU load.\n- Fail over to the secondary uplink.\n",
+}
+FILLER = ("pump", "valve", "conveyor", "spindle", "coolant", "hydraulic", "pressure", "flow", "torque",
+          "belt", "alignment", "calibration", "firmware", "sensor", "drift", "maintenance", "schedule",
+          "inspection", "motor", "current", "voltage", "encoder", "filter", "seal", "gearbox", "noise")
+
+
+def iso(sec: float) -> str:
+    return (EPOCH + timedelta(seconds=float(sec))).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def write_timeseries(path: pathlib.Path, rng: np.random.Generator, sensors: list[str], samples: int,
+                     fault: str, fault_sensor: int, t0: float) -> None:
+    t = t0 + np.arange(samples, dtype=float)
+    x = rng.normal(0.0, 1.0, size=(samples, len(sensors)))
+    x += np.sin(np.arange(samples) / 60.0)[:, None] * rng.uniform(0.0, 2.0, size=len(sensors))
+    tail = max(5, min(300, samples // 10))  # the graph scores the last 300 samples
+    if fault == "bearing_wear":
+        k = rng.integers(samples - tail, samples)
+        x[k, fault_sensor] += rng.uniform(15.0, 30.0)
+    elif fault == "network_packet_loss":
+        x[samples - tail:, fault_sensor] += rng.uniform(8.0, 12.0) * (rng.random(tail) < 0.05)
+    df = pd.DataFrame(x, columns=sensors)
+    df.insert(0, "time", t)
+    df.to_csv(path, index=False, float_format="%.4f")
+
+
+def write_logs(path: pathlib.Path, rng: np.random.Generator, lines: int, fault: str, sensor: str, gw: int,
+               t0: float, span: float) -> None:
+    fault_lines = FAULT_LOGS[fault]
+    n_fault = min(lines, len(fault_lines) * max(1, lines // 1000))
+    ts = np.sort(rng.uniform(t0, t0 + span, size=lines))
+    is_fault = np.zeros(lines, dtype=bool)
+    if n_fault:
+        is_fault[rng.choice(lines, size=n_fault, replace=False)] = True
+    msgs = rng.integers(0, len(NOISE_MSGS), size=lines)
+    with open(path, "w", encoding="utf-8") as f:
+        j = 0
+        for i in range(lines):
+            if is_fault[i]:
+                level, msg = fault_lines[j % len(fault_lines)]
+                j += 1
+                rec = {"ts": iso(ts[i]), "level": level,
+                       "msg": msg.format(pct=int(rng.integers(5, 30)), cpu=int(rng.integers(70, 99)))}
+                if fault == "network_packet_loss":
+                    rec["gateway"] = f"gw-{gw}"
+                else:
+                    rec["sensor"] = sensor
+            else:
+                rec = {"ts": iso(ts[i]), "level": "INFO" if msgs[i] % 2 else "DEBUG",
+                       "msg": NOISE_MSGS[msgs[i]], "sensor": sensor}
+            f.write(json.dumps(rec) + "\n")
+
+
+def write_kb(kb_dir: pathlib.Path, rng: np.random.Generator, notes: int) -> None:
+    for i, (fault, text) in enumerate(KB_NOTES.items()):
+        (kb_dir / f"{i + 1:02d}_{fault}.md").write_text(text, encoding="utf-8")
+    for i in range(max(0, notes - len(KB_NOTES))):
+        words = rng.choice(FILLER, size=int(rng.integers(40, 120)))
+        (kb_dir / f"filler_{i:05d}.md").write_text(" ".join(words) + "\n", encoding="utf-8")
+
+
+def generate(out: pathlib.Path, scenarios: int = 20, sensors: int = 8, samples: int = 2000,
+             log_lines: int = 500, notes: int = 20, faults: tuple[str, ...] = FAULTS, seed: int = 0) -> dict:
+    """Write a synthetic data tree under `out` (replacing it) and return its size summary."""
+    out = pathlib.Path(out)
+    shutil.rmtree(out, ignore_errors=True)
+    dirs = {d: out / d for d in ("scenarios", "timeseries", "logs", "kb")}
+    for d in dirs.values():
+        d.mkdir(parents=True)
+    rng = np.random.default_rng(seed)
+
+    names = [f"sensor_{i:03d}" for i in range(sensors)]
+    labels: dict[str, int] = {}
+    for i in range(scenarios):
+        fault = faults[i % len(faults)]
+        name = f"synth_{fault}_{i:05d}"
+        k = int(rng.integers(0, sensors))
+        gw = int(rng.integers(1, 64))
+        t0 = float(i * samples)
+        write_timeseries(dirs["timeseries"] / f"{name}.csv", rng, names, samples, fault, k, t0)
+        write_logs(dirs["logs"] / f"{name}.jsonl", rng, log_lines, fault, names[k], gw, t0, float(samples))
+        desc = DESCRIPTIONS[fault].format(sensor=names[k], line=int(rng.integers(1, 9)), gw=gw)
+        meta = {"description": desc, "label": LABELS.get(fault, fault), "time_origin": iso(0)}
+        (dirs["scenarios"] / f"{name}.yaml").write_text(yaml.safe_dump(meta, sort_keys=False), encoding="utf-8")
+        labels[fault] = labels.get(fault, 0) + 1
+    write_kb(dirs["kb"], rng, notes)
+    return {"scenarios": scenarios, "sensors": sensors, "samples": samples, "log_lines": log_lines,
+            "notes": max(notes, len(KB_NOTES)), "labels": labels, "seed": seed}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--out", type=pathlib.Path, required=True)
+    p.add_argument("--scenarios", type=int, default=20)
+    p.add_argument("--sensors", type=int, default=8)
+    p.add_argument("--samples", type=int, default=2000)
+    p.add_argument("--log-lines", type=int, default=500)
+    p.add_argument("--notes", type=int, default=20)
+    p.add_argument("--faults", nargs="+", default=list(FAULTS), choices=FAULTS)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+    info = generate(args.out, args.scenarios, args.sensors, args.samples, args.log_lines, args.notes,
+                    tuple(args.faults), args.seed)
+    print(json.dumps(info, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -65,15 +65,19 @@
 from __future__ import annotations
 import argparse
 import csv
+import multiprocessing as mp
+import os
 import pathlib
+from typing import Callable, Optional
 import yaml
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
-from app.graph import build_graph, AgentState
+from app.graph import get_graph, plan_incidents, AgentState
 
 
-SCEN_DIR = pathlib.Path(__file__).resolve().parents[1] / "data" / "scenarios"
+SCEN_DIR = pathlib.Path(os.getenv("INCIDENT_DATA_DIR") or pathlib.Path(__file__).resolve().parents[1] / "data") / "scenarios"
 RES_DIR_DEFAULT = pathlib.Path(__file__).resolve().parents[1] / "eval" / "results"
+FIELDS = ["scenario", "label", "pred", "correct", "confidence"]
 
 
 def classify_from_evidence(state: dict) -> str:
@@ -116,14 +120,11 @@ def load_labels() -> dict[str, str]:
     return labels
 
 
-def write_metrics(rows: list[dict], outdir: pathlib.Path) -> pathlib.Path:
-    outdir.mkdir(parents=True, exist_ok=True)
-    csv_path = outdir / "metrics.csv"
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["scenario", "label", "pred", "correct", "confidence"])
-        w.writeheader()
-        w.writerows(rows)
-    return csv_path
+def read_metrics(csv_path: pathlib.Path) -> list[dict]:
+    if not csv_path.exists():
+        return []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
 
 
 def save_confusion_matrix(rows: list[dict], outdir: pathlib.Path) -> pathlib.Path:
@@ -137,45 +138,94 @@ def save_confusion_matrix(rows: list[dict], outdir: pathlib.Path) -> pathlib.Pat
     for r in rows:
         mat[index[r["label"]]][index[r["pred"]]] += 1
 
-    # Plot
-    fig = plt.figure(figsize=(4, 4))
-    plt.imshow(mat)
-    plt.xticks(range(len(cats)), cats, rotation=45, ha="right")
-    plt.yticks(range(len(cats)), cats)
-    plt.title("Confusion Matrix")
-    plt.colorbar()
-    plt.tight_layout()
+    # Plot (object API, no pyplot state: run_eval also runs on the dashboard's eval thread)
+    fig = Figure(figsize=(4, 4))
+    ax = fig.add_subplot()
+    im = ax.imshow(mat)
+    ax.set_xticks(range(len(cats)), cats, rotation=45, ha="right")
+    ax.set_yticks(range(len(cats)), cats)
+    ax.set_title("Confusion Matrix")
+    fig.colorbar(im)
+    fig.tight_layout()
 
     path = outdir / "confusion_matrix.png"
     fig.savefig(path)
-    plt.close(fig)
     return path
 
 
-def run_eval(outdir: pathlib.Path) -> None:
+# Each pool process compiles the graph once in the initializer and reuses it
+# for every scenario it is handed.
+_APP = None
+
+
+def _init_worker(no_planner: bool) -> None:
+    global _APP
+    if no_planner:
+        os.environ["NO_PLANNER"] = "1"
+    _APP = get_graph()
+
+
+def eval_one(item: tuple[str, str, AgentState]) -> dict:
+    scen, gold, state = item
+    out = (_APP or get_graph()).invoke(state)  # LangGraph dict-like state
+    pred = classify_from_evidence(out)
+    return {
+        "scenario": scen,
+        "label": gold,
+        "pred": pred,
+        "correct": int(pred == gold),
+        "confidence": float(out.get("confidence", 0.0)),
+    }
+
+
+def _iter_rows(items: list, workers: int):
+    if workers <= 1:
+        yield from map(eval_one, items)
+        return
+    chunksize = max(1, min(64, len(items) // (workers * 8)))
+    no_planner = os.getenv("NO_PLANNER", "0") == "1"
+    # spawn, not fork: plan_incidents may already have started torch threads in
+    # this process (or the dashboard's), and forking those can deadlock. The
+    # states arrive planned, so the children never load the planner.
+    with mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(no_planner,)) as pool:
+        yield from pool.imap_unordered(eval_one, items, chunksize=chunksize)
+
+
+def run_eval(outdir: pathlib.Path, batch_size: int = 8, workers: int = 1, resume: bool = False,
+             progress: Optional[Callable[[int, int, dict], None]] = None) -> list[dict]:
+    """Evaluate every scenario, appending each row to metrics.csv as it finishes.
+
+    With `resume`, scenarios already in metrics.csv are skipped, so an
+    interrupted run continues where it stopped. `progress(done, total, row)`
+    is called after each row (the dashboard runs this in a background
+    thread). Returns every row in metrics.csv.
+    """
     labels = load_labels()
-    app = build_graph()
-
-    rows = []
-    for scen, gold in labels.items():
-        state = AgentState(scenario=scen, description=f"Scenario {scen}")
-        out = app.invoke(state)  # LangGraph dict-like state
-
-        pred = classify_from_evidence(out)
-        conf = float(out.get("confidence", 0.0))
-        rows.append(
-            {
-                "scenario": scen,
-                "label": gold,
-                "pred": pred,
-                "correct": int(pred == gold),
-                "confidence": conf,
-            }
-        )
-
-    csv_path = write_metrics(rows, outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    csv_path = outdir / "metrics.csv"
+    done = {r["scenario"] for r in read_metrics(csv_path)} if resume else set()
+
+    todo = [(scen, gold) for scen, gold in labels.items() if scen not in done]
+    # scored reports must not depend on earlier runs recalled from long-term memory
+    states = [AgentState(scenario=scen, description=f"Scenario {scen}", memory=False) for scen, _ in todo]
+    # plan every scenario in batched planner calls before running the graph
+    plan_incidents(states, batch_size=batch_size)
+    items = [(scen, gold, state) for (scen, gold), state in zip(todo, states)]
+
+    with open(csv_path, "a" if done else "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        if not done:
+            w.writeheader()
+        for i, row in enumerate(_iter_rows(items, workers), 1):
+            w.writerow(row)
+            f.flush()  # a crash loses at most the rows still in flight
+            if progress is not None:
+                progress(i, len(items), row)
+
+    rows = read_metrics(csv_path)
     img_path = save_confusion_matrix(rows, outdir)
-    print(f"Wrote {csv_path} and {img_path}")
+    print(f"Wrote {csv_path} and {img_path} ({len(items)} run, {len(done)} resumed)")
+    return rows
 
 
 def main():
@@ -186,8 +236,32 @@ def main():
         default=RES_DIR_DEFAULT,
         help="Directory to write results (CSV and PNG).",
     )
+    parser.add_argument(
+        "--no-planner",
+        action="store_true",
+        help="Use the static plan; never load torch/transformers.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Incidents per batched planner call.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes (each compiles the graph once).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip scenarios already in metrics.csv and append the rest.",
+    )
     args = parser.parse_args()
-    run_eval(args.outdir)
+    if args.no_planner:
+        os.environ["NO_PLANNER"] = "1"
+    run_eval(args.outdir, args.batch_size, args.workers, args.resume)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import pathlib
+import sys
+import tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ.setdefault("NO_PLANNER", "1")  # never load torch/transformers in tests
+os.environ.setdefault("INCIDENT_MEMORY", "0")
+os.environ.setdefault("INCIDENT_CACHE_DIR", tempfile.mkdtemp(prefix="incident_test_cache_"))  # keep .cache/ clean
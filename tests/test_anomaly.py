@@ -0,0 +1,97 @@
+# tests/test_anomaly.py
+import threading
+
+import numpy as np
+import pytest
+
+from app.anomaly import ModelRegistry
+from app.tools import AnomalyScoreIn, anomaly_score, anomaly_score_batch
+
+
+class FakeStore:
+    def __init__(self, columns, n=2000, source="a.csv", seed=0):
+        rng = np.random.default_rng(seed)
+        self.data = {c: rng.normal(size=n) for c in columns}
+        self.columns = list(columns)
+        self.meta = {"source": {"csv": source}}
+
+    def __len__(self):
+        return len(next(iter(self.data.values())))
+
+    def tail(self, col, n):
+        return self.data[col][-n:]
+
+
+def test_training_one_scenario_does_not_block_another(tmp_path, monkeypatch):
+    reg = ModelRegistry(tmp_path)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    real_train = reg.train
+
+    def train(scenario, store):
+        calls.append(scenario)
+        if scenario == "slow":
+            started.set()
+            assert release.wait(10)
+        return real_train(scenario, store)
+
+    monkeypatch.setattr(reg, "train", train)
+    store = FakeStore(["vib_1", "vib_2"])
+    slow = [threading.Thread(target=reg.manifest, args=("slow", store)) for _ in range(3)]
+    for t in slow:
+        t.start()
+    assert started.wait(10)
+    assert reg.manifest("fast", store)["sensors"] == {"vib_1": "vib", "vib_2": "vib"}  # while "slow" trains
+    assert reg.get("fast", "vib") is not None and reg.stats()["loaded"] == 1
+    release.set()
+    for t in slow:
+        t.join(10)
+    assert calls.count("slow") == 1  # the waiters reuse the one training run
+    assert reg.manifest("slow", store) is not None and calls.count("slow") == 1
+
+
+def test_budget_counts_in_memory_model_size(tmp_path):
+    reg = ModelRegistry(tmp_path, budget_mb=0)
+    stores = {s: FakeStore(["temp_1"], seed=i) for i, s in enumerate("abc")}
+    for s, store in stores.items():
+        reg.manifest(s, store)
+        model = reg.get(s, "temp")
+        tree_bytes = sum(t.tree_.node_count for t in model["iso"].estimators_) * 8  # at least a double per node
+        assert model["nbytes"] >= tree_bytes
+    assert reg.stats()["loaded"] == 1 and reg.evictions == 2  # the newest model is always kept
+
+
+def ragged_rows(seed=0, n_rows=40, width=64):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, width + 1, size=n_rows)
+    lengths[:6] = [0, 1, 4, 5, 6, width]  # around the n < 5 cut-off and a full row
+    x = rng.normal(size=(n_rows, width))
+    spikes = rng.random(n_rows) < 0.5
+    for i in np.flatnonzero(spikes & (lengths > 0)):
+        x[i, rng.integers(lengths[i])] += rng.uniform(3, 30)
+    return x, lengths
+
+
+@pytest.mark.parametrize("padding", ["lengths", "nan"])
+def test_batch_matches_single_sensor_score_row_by_row(padding):
+    x, lengths = ragged_rows()
+    ids = [f"s{i}" for i in range(len(x))]
+    if padding == "lengths":
+        got = anomaly_score_batch(x, ids, lengths=lengths)  # samples past each length are ignored
+    else:
+        padded = np.where(np.arange(x.shape[1])[None, :] < lengths[:, None], x, np.nan)
+        got = anomaly_score_batch(padded, ids)
+    by_id = {r.sensor_id: r for r in got.ranked}
+    assert len(by_id) == len(ids)
+    for i, sid in enumerate(ids):
+        row = x[i, :lengths[i]]
+        one = anomaly_score(AnomalyScoreIn(points=row.tolist()))
+        r = by_id[sid]
+        assert r.n == len(row)
+        assert r.score == pytest.approx(one.score, abs=1e-9)
+        if len(row) >= 5:
+            assert r.peak_to_mad == pytest.approx(one.details["peak_to_mad"], rel=1e-9)
+            assert r.median == pytest.approx(one.details["median"], abs=1e-12)
+            assert row[r.peak_index] == row[np.argmax(np.abs(row - np.median(row)))]
+    scores = [r.score for r in got.ranked]
+    assert scores == sorted(scores, reverse=True)
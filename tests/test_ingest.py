@@ -0,0 +1,130 @@
+# tests/test_ingest.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app import tools
+from app.ingest import Alert, Correlator, asset_of, correlate
+from app.memory import embed
+from app.worker import IncidentJob, IncidentWorker
+
+PHRASES = ["gateway gw-1 packet loss above threshold", "packet loss above threshold on gateway gw-1",
+           "bearing vibration high on pump", "vibration high bearing pump", "firmware reboot loop detected"]
+
+
+def storm(n, seed=0, span=3000.0):
+    rng = np.random.default_rng(seed)
+    return [Alert(id=f"a{i}", scenario=str(rng.choice(["s1", "s2"])), description=str(rng.choice(PHRASES)),
+                  ts=float(rng.uniform(0, span)), asset=str(rng.choice(["", "pump-1", "pump-2"])))
+            for i in range(n)]
+
+
+def naive(alerts, window_s, min_similarity):
+    """Time order; each alert joins the first earlier group of its (scenario, asset)
+    whose last alert is within the window and whose leader is similar enough."""
+    groups = []
+    for a in sorted(alerts, key=lambda a: a.ts):
+        key = (a.scenario, asset_of(a))
+        for g in groups:
+            if (g["key"] == key and a.ts - g["last"] <= window_s
+                    and float(embed(g["members"][0].description) @ embed(a.description)) >= min_similarity):
+                g["members"].append(a)
+                g["last"] = a.ts
+                break
+        else:
+            groups.append({"key": key, "members": [a], "last": a.ts})
+    return sorted([[m.id for m in g["members"]] for g in groups], key=lambda ids: ids[0])
+
+
+@pytest.mark.parametrize("window_s,min_similarity", [(60.0, 0.7), (300.0, 0.3), (120.0, 0.99)])
+def test_correlate_matches_naive_grouping(window_s, min_similarity):
+    alerts = storm(300)
+    got = sorted([[m.id for m in g.members] for g in correlate(alerts, window_s, min_similarity)],
+                 key=lambda ids: ids[0])
+    assert got == naive(alerts, window_s, min_similarity)
+    assert sum(map(len, got)) == len(alerts)
+
+
+def test_correlate_empty_and_single():
+    assert correlate([]) == []
+    (g,) = correlate([Alert(scenario="s", description="pump")])
+    assert g.leader.id == "alert-0" and g.first_ts == g.last_ts
+
+
+def test_out_of_order_alert_joins_its_open_group():
+    c = Correlator(window_s=100, min_similarity=0.5)
+    assert c.add(Alert(id="a", scenario="s", asset="x", description=PHRASES[0], ts=1000)) == []
+    assert c.add(Alert(id="b", scenario="s", asset="x", description=PHRASES[1], ts=1050)) == []
+    assert c.add(Alert(id="late", scenario="s", asset="x", description=PHRASES[0], ts=990)) == []
+    assert c.add(Alert(id="stale", scenario="s", asset="x", description=PHRASES[0], ts=800)) == []  # before the window
+    (g, stale) = sorted(c.flush(), key=lambda g: g.leader.id)
+    assert [m.id for m in g.members] == ["a", "b", "late"] and (g.first_ts, g.last_ts) == (990, 1050)
+    assert [m.id for m in stale.members] == ["stale"]
+
+
+def test_late_alert_after_its_group_closed_opens_a_new_one():
+    c = Correlator(window_s=100, min_similarity=0.5)
+    c.add(Alert(id="a", scenario="s", asset="x", description=PHRASES[0], ts=1000))
+    (closed,) = c.add(Alert(id="b", scenario="s", asset="y", description=PHRASES[0], ts=1200))
+    assert closed.leader.id == "a"
+    c.add(Alert(id="late", scenario="s", asset="x", description=PHRASES[0], ts=1010))
+    assert sorted(g.leader.id for g in c.flush()) == ["b", "late"]
+    assert c.expire(10_000) == [] and c.flush() == []
+
+
+def test_worker_runs_one_job_per_alert_group(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools, "MODELS_DIR", tmp_path)
+    worker = IncidentWorker(workers=2, correlate_window_s=0.2)
+    worker.start(warm=False)
+    done, lock = [], threading.Lock()
+
+    def on_done(res):
+        with lock:
+            done.append(res)
+
+    now = time.time()
+    jobs = [IncidentJob(id="p1", scenario="packet_loss_02", description=PHRASES[0], ts=now),
+            IncidentJob(id="p2", scenario="packet_loss_02", description=PHRASES[1], ts=now + 0.01),
+            IncidentJob(id="b1", scenario="bearing_wear_03", description=PHRASES[2], asset="pump-1")]
+    ids = [worker.submit(j, on_done=on_done) for j in jobs]
+    assert worker.result("p2")["status"] in ("correlating", "queued", "done")
+    deadline = time.time() + 30
+    while len(done) < 3 and time.time() < deadline:
+        time.sleep(0.05)
+    worker.stop()
+    assert sorted(r["id"] for r in done) == sorted(ids)
+    assert {r["id"]: r["group"] for r in done} == {"p1": "p1", "p2": "p1", "b1": "b1"}
+    assert worker.processed == 2 and worker.stats()["correlating"] == 0
+    assert worker.result("p2")["group"] == "p1" and worker.result("p2")["status"] == "done"
+    assert "## Correlated alerts (2)" in worker.result("p1")["report_md"]
+
+
+def test_worker_stop_without_drain_drops_open_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools, "MODELS_DIR", tmp_path)
+    worker = IncidentWorker(workers=1, correlate_window_s=60)
+    worker.start(warm=False)
+    worker.submit(IncidentJob(id="x", scenario="packet_loss_02", description=PHRASES[0]))
+    assert worker.result("x") == {"id": "x", "status": "correlating"}
+    worker.stop(drain=False)
+    assert worker.processed == 0 and worker.result("x") == {"id": "x", "status": "dropped", "group": "x"}
+
+
+def test_worker_stop_without_drain_marks_queued_groups_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools, "MODELS_DIR", tmp_path)
+    worker = IncidentWorker(workers=1, correlate_window_s=60)  # not started: queued jobs stay queued
+    now = time.time()
+    worker.submit(IncidentJob(id="p1", scenario="packet_loss_02", description=PHRASES[0], asset="gw-1", ts=now))
+    worker.submit(IncidentJob(id="p2", scenario="packet_loss_02", description=PHRASES[1], asset="gw-1", ts=now + 1))
+    with worker._corr_lock:  # close the group as the ticker would
+        worker._submit_groups(worker.correlator.expire(now + 1000))
+    worker.submit(IncidentJob(id="b1", scenario="bearing_wear_03", description=PHRASES[2], asset="pump-1", ts=now))
+    assert worker.result("p2") == {"id": "p2", "status": "queued", "group": "p1"}
+    assert worker.result("b1")["status"] == "correlating"
+    worker.stop(drain=False)
+    assert worker.result("p1") == {"id": "p1", "status": "dropped", "group": "p1"}
+    assert worker.result("p2") == {"id": "p2", "status": "dropped", "group": "p1"}
+    assert worker.result("b1") == {"id": "b1", "status": "dropped", "group": "b1"}
+    assert worker._group_of == {} and worker._pending == {} and worker._grouping == {}
+    assert worker.result("unknown") is None and worker.processed == 0
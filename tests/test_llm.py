@@ -0,0 +1,120 @@
+# tests/test_llm.py
+import re
+import types
+
+import pytest
+
+from app import llm
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+STEPS_RE = re.compile(r'^(?:%s)(?:", ?"(?:%s))*(?:"\])?' % (("|".join(llm.STEP_VOCAB),) * 2))
+
+
+def tiny_pipeline(seed):
+    """A random 2-layer GPT-2 over a character vocabulary plus a few multi-character
+    tokens (step names, separators, junk), no download needed."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+
+    chars = list("abcdefghijklmnopqrstuvwxyz{}[]\":, \n0123456789.-_()=<>/#*'%")
+    extra = ["triage", "logs", '", "', '"]', '",', "verify", "time", "series", "xyz", " the", "ge\"]"]
+    vocab = {t: i for i, t in enumerate(["<eos>", "<unk>"] + chars + extra)}
+    t = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    t.pre_tokenizer = pre_tokenizers.Split("", behavior="isolated")
+    t.decoder = decoders.Fuse()
+    tok = transformers.PreTrainedTokenizerFast(tokenizer_object=t, eos_token="<eos>", unk_token="<unk>",
+                                               pad_token="<eos>", padding_side="left")
+    torch.manual_seed(seed)
+    cfg = transformers.GPT2Config(vocab_size=len(vocab), n_positions=2048, n_embd=32, n_layer=2, n_head=2,
+                                  bos_token_id=0, eos_token_id=0)
+    return types.SimpleNamespace(model=transformers.GPT2LMHeadModel(cfg).eval(), tokenizer=tok)
+
+
+def run(text):
+    """Automaton state after `text`, None once it leaves the steps grammar."""
+    state = llm._START
+    for ch in text:
+        state = llm._step_char(state, ch)
+        if state is None:
+            return None
+    return state
+
+
+def test_step_automaton():
+    assert run('triage", "logs"]') == ("end",)
+    assert run('triage","verify') == ("name", "verify")
+    assert run("time") == ("name", "time")
+    for bad in ('tri"', 'logs" ,', "xyz", 'logs"]"', '"'):
+        assert run(bad) is None
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_constrained_steps_are_always_well_formed(seed, monkeypatch):
+    gen = tiny_pipeline(seed)
+    monkeypatch.setattr(llm, "_generator", lambda *a, **k: gen)
+    monkeypatch.setenv("PLANNER_DECODING", "steps")
+    monkeypatch.setenv("PLANNER_MAX_NEW_TOKENS", "40")
+    texts = ["Incident: pump vibration", "Incident: packet loss on gw-1 and a much longer description"]
+    tok = gen.tokenizer
+    enc = tok([t + '\n{"steps": ["' for t in texts], return_tensors="pt", padding=True)
+    n = enc["input_ids"].shape[1]
+    out = gen.model.generate(**enc, max_new_tokens=40, do_sample=False, pad_token_id=tok.pad_token_id,
+                             logits_processor=llm._steps_processor(tok, n))
+    for new in tok.batch_decode(out[:, n:], skip_special_tokens=True):
+        assert new and run(new) is not None, new  # a well-formed (possibly cut-off) steps list
+    for plan, _ in llm._decode(texts, batch_size=2):
+        assert plan["steps"] and set(plan["steps"]) <= set(llm.STEP_VOCAB)
+        assert len(plan["steps"]) == len(set(plan["steps"]))
+        assert {k: plan[k] for k in ("stop_condition", "confidence_hint")} == {
+            k: llm.DEFAULT_PLAN[k] for k in ("stop_condition", "confidence_hint")}
+
+
+def test_unconstrained_random_model_is_not_well_formed():
+    gen = tiny_pipeline(0)
+    tok = gen.tokenizer
+    enc = tok(['Incident: pump vibration\n{"steps": ["'], return_tensors="pt")
+    n = enc["input_ids"].shape[1]
+    out = gen.model.generate(**enc, max_new_tokens=20, do_sample=False, pad_token_id=tok.pad_token_id)
+    assert not STEPS_RE.fullmatch(tok.decode(out[0, n:], skip_special_tokens=True))
+
+
+def test_normalize_steps():
+    assert llm._normalize_steps('logs", "triage", "logs", "verify"]')["steps"] == ["logs", "triage", "verify"]
+    assert llm._normalize_steps('triage", "time')["steps"] == ["triage"]  # cut off mid-name
+    assert llm._normalize_steps("")["steps"] == llm.DEFAULT_PLAN["steps"]
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("{}", {}),
+    ("no json at all", {}),
+    ('{"steps": [1, null]}', {}),
+    ('{"steps": "triage"}', {}),
+    ('{"steps": []}', {}),
+    ('{"steps": ["Logs", "unknown", "triage", "logs"]}', {"steps": ["logs", "triage"]}),
+    ('{"steps": ["verify"], "stop_condition": "confidence>=0.8", "confidence_hint": 0.5, "x": 1}',
+     {"steps": ["verify"], "stop_condition": "confidence>=0.8", "confidence_hint": 0.5}),
+    ('{"steps": ["verify"], "stop_condition": "", "confidence_hint": 1.5}', {"steps": ["verify"]}),
+    ('{"steps": ["verify"], "stop_condition": 3, "confidence_hint": true}', {"steps": ["verify"]}),
+    ('["steps"]', {}),
+    ('prefix {"steps": ["triage"], "confidence_hint": 1} suffix', {"steps": ["triage"], "confidence_hint": 1.0}),
+])
+def test_parse_plan_validates_each_field(text, expected):
+    assert llm._parse_plan(text) == {**llm.DEFAULT_PLAN, **expected}
+
+
+def test_conv1d_blocks_are_converted_before_int8_quantization():
+    from transformers.pytorch_utils import Conv1D
+
+    model = tiny_pipeline(0).model
+    ids = torch.tensor([[3, 4, 5, 6, 7]])
+    with torch.no_grad():
+        ref = model(ids).logits
+    n_conv = sum(isinstance(m, Conv1D) for m in model.modules())
+    assert llm._conv1d_to_linear(model) == n_conv > 0
+    assert not any(isinstance(m, Conv1D) for m in model.modules())
+    with torch.no_grad():
+        assert torch.allclose(model(ids).logits, ref, atol=1e-5)
+    q = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized = [m for m in q.modules() if isinstance(m, torch.ao.nn.quantized.dynamic.Linear)]
+    assert len(quantized) == n_conv + 1  # every block projection plus the LM head
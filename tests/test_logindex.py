@@ -0,0 +1,151 @@
+# tests/test_logindex.py
+import itertools
+import json
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app import logindex
+from app.logindex import LogIndex
+from app.logstream import iter_matches, parse_ts
+
+MSGS = ["vibration high", "packet loss 12%", "gateway reboot", "bearing temp rising", "CRC error, retrying",
+        "Überlast erkannt", "ok"]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(logindex, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(logindex, "_OPEN", {})
+
+
+def write_log(path, n, seed=0):
+    """Lines out of time order, with ISO, numeric and missing `ts`, plus blank lines."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            t = 1.7e9 + float(rng.uniform(0, 3600))
+            rec = {"level": str(rng.choice(["INFO", "WARN", "ERROR"])), "msg": str(rng.choice(MSGS)),
+                   "sensor": f"vib_{int(rng.integers(3))}", "gateway": f"gw-{int(rng.integers(2))}"}
+            kind = i % 4
+            if kind == 1:
+                rec["ts"] = datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            elif kind == 2:
+                rec["ts"] = t
+            elif kind == 3:
+                rec["ts"] = datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None).isoformat()
+            f.write(json.dumps(rec, ensure_ascii=bool(i % 2)) + "\n")
+            if i % 97 == 0:
+                f.write("\n")
+    return path
+
+
+def scan(path, query, limit, **kw):
+    return list(itertools.islice(iter_matches(path, query, **kw), limit))
+
+
+QUERIES = ["vibration", "packet loss", "vib_1|reboot", "crc error, retrying", "12%", "error", "erkannt",
+           "nothing-here", "|", "gw-1"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_query_matches_naive_scan(tmp_path, query):
+    path = write_log(tmp_path / "a.jsonl", 3000)
+    idx = LogIndex.open(path)
+    for limit in (1, 5, 10_000):
+        assert idx.query(query, limit) == scan(path, query, limit)
+    assert idx.query(query, 50, level="warn", sensor="VIB_2") == scan(path, query, 50, level="warn", sensor="VIB_2")
+    assert idx.query(query, 50, gateway="gw-0") == scan(path, query, 50, gateway="gw-0")
+
+
+def test_time_range_matches_naive_scan(tmp_path):
+    path = write_log(tmp_path / "a.jsonl", 3000, seed=1)
+    idx = LogIndex.open(path)
+    assert not idx.ts_monotonic
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        t0, t1 = sorted(1.7e9 + rng.uniform(-60, 3660, size=2))
+        for q in ("vibration|reboot", "packet loss"):
+            assert idx.query(q, 10_000, t0=t0, t1=t1) == scan(path, q, 10_000, t0=t0, t1=t1)
+        assert idx.query("error", 7, t0=t0) == scan(path, "error", 7, t0=t0)
+        assert idx.query("error", 7, t1=t1) == scan(path, "error", 7, t1=t1)
+    assert idx.query("vibration", 10, t0=0, t1=1) == []
+
+
+def test_lines_between_matches_brute_force(tmp_path):
+    path = write_log(tmp_path / "a.jsonl", 2000, seed=3)
+    idx = LogIndex.build(path)
+    with open(path, encoding="utf-8") as f:
+        ts = np.array([parse_ts(json.loads(line).get("ts")) for line in f if line.strip()])
+    assert math.isnan(ts[0])  # every 4th line has no ts
+    rng = np.random.default_rng(4)
+    bounds = [(None, None), (1.7e9 + 100, None), (None, 1.7e9 + 100), (1.7e9 + 3600, 1.7e9)]
+    bounds += [tuple(sorted(1.7e9 + rng.uniform(0, 3600, size=2))) for _ in range(30)]
+    bounds += [(ts[2], ts[2])]  # inclusive at both ends
+    for t0, t1 in bounds:
+        keep = ~np.isnan(ts)
+        if t0 is not None:
+            keep &= ts >= t0
+        if t1 is not None:
+            keep &= ts <= t1
+        assert idx.lines_between(t0, t1).tolist() == np.flatnonzero(keep).tolist()
+
+
+def test_in_order_file_uses_line_ranges(tmp_path):
+    path = tmp_path / "sorted.jsonl"
+    path.write_text("".join(json.dumps({"ts": 100.0 + i, "msg": f"m{i}"}) + "\n" for i in range(50)), encoding="utf-8")
+    idx = LogIndex.build(path)
+    assert idx.ts_monotonic
+    assert idx.lines_between(110, 112).tolist() == [10, 11, 12]
+    assert [r["msg"] for r in idx.query("m", 100, t0=110, t1=112)] == ["m10", "m11", "m12"]
+
+
+def test_empty_file_and_no_matches(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("\n\n", encoding="utf-8")
+    idx = LogIndex.open(path)
+    assert len(idx) == 0 and idx.query("anything") == [] and idx.lines_between().tolist() == []
+    assert idx.query("x", t0=0, t1=1e12) == []
+    assert LogIndex.load(path) is not None  # an empty index is saved and loads too
+
+
+def test_saved_index_loads_and_goes_stale(tmp_path):
+    path = write_log(tmp_path / "a.jsonl", 500)
+    built = LogIndex.open(path)
+    loaded = LogIndex.load(path)
+    assert loaded is not None and loaded.query("packet", 1000) == built.query("packet", 1000)
+    assert loaded.lines_between(1.7e9, 1.7e9 + 1800).tolist() == built.lines_between(1.7e9, 1.7e9 + 1800).tolist()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": 1.8e9, "msg": "packet appended"}) + "\n")
+    assert LogIndex.load(path) is None
+    assert LogIndex.open(path).query("appended") == [{"ts": 1.8e9, "msg": "packet appended"}]
+
+
+def baseline(path, query):
+    """The original search_logs predicate: substring of the record's lowercased json.dumps."""
+    with open(path, encoding="utf-8") as f:
+        recs = [json.loads(line) for line in f if line.strip()]
+    return [j for j in recs if any(tok in json.dumps(j).lower() for tok in query.lower().split("|"))]
+
+
+RAW_LINES = ['{"v":1e3,"msg":"a"}', '{"v": 1.50, "msg": "b"}', '{"msg":"\\u0041larm raised"}',
+             '{"msg":"caf\\u00e9"}', '{"n":12345678901234567890.0}', '{"a" :1,"b":[1,2]}', '{"msg":"ok"}']
+
+
+@pytest.mark.parametrize("query", ["1000.0", "1000", "1.5", "1.50", "alarm", "u00e9", "café", "e+19",
+                                   '"a": 1', "[1, 2]", "ok|1000", "xyz"])
+def test_query_matches_original_json_dumps_predicate(tmp_path, query):
+    path = tmp_path / "raw.jsonl"
+    path.write_text("\n".join(RAW_LINES) + "\n", encoding="utf-8")
+    want = baseline(path, query)
+    assert LogIndex.open(path).query(query, 100) == want
+    assert scan(path, query, 100) == want
+
+
+def test_generated_log_matches_original_predicate(tmp_path):
+    path = write_log(tmp_path / "a.jsonl", 1000)
+    idx = LogIndex.open(path)
+    for q in QUERIES:
+        assert idx.query(q, 10_000) == baseline(path, q)
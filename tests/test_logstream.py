@@ -0,0 +1,86 @@
+# tests/test_logstream.py
+import gzip
+import json
+
+import pytest
+
+from app import logindex, logstream, tools
+from app.logstream import iter_matches, iter_records, log_paths
+
+try:
+    import zstandard
+except ImportError:  # .zst rotations are optional; the rest still runs
+    zstandard = None
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstream, "CHUNK_BYTES", 64)  # lines straddle decompressed reads
+    monkeypatch.setattr(logindex, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(logindex, "_OPEN", {})
+
+
+def records(part, n):
+    return [{"ts": 1.7e9 + part * 1000 + i, "level": "WARN" if i % 3 else "ERROR", "part": part,
+             "msg": f"packet loss {i}" if i % 2 else f"reboot {i}"} for i in range(n)]
+
+
+def write(path, recs):
+    data = "".join(json.dumps(r) + "\n" for r in recs).encode("utf-8")
+    if path.suffix == ".gz":
+        path.write_bytes(gzip.compress(data))
+    elif path.suffix == ".zst":
+        path.write_bytes(zstandard.ZstdCompressor().compress(data))
+    else:
+        path.write_bytes(data)
+    return recs
+
+
+@pytest.fixture
+def rotated(tmp_path, monkeypatch):
+    """s.jsonl (live), then s.jsonl.1, .2.gz, .3.zst, .10.gz; plus files that are not its rotations."""
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    names = ["s.jsonl", "s.jsonl.1", "s.jsonl.2.gz", "s.jsonl.3.zst", "s.jsonl.10.gz"]
+    if zstandard is None:
+        names.remove("s.jsonl.3.zst")
+    parts = [write(logs / name, records(part, 40 + part)) for part, name in enumerate(names)]
+    write(logs / "s2.jsonl", records(99, 5))
+    write(logs / "s.jsonl.bak", records(98, 5))
+    monkeypatch.setattr(tools, "DATA_DIR", tmp_path)
+    return logs, names, parts
+
+
+def test_log_paths_orders_live_then_rotations(rotated):
+    logs, names, _ = rotated
+    assert [p.name for p in log_paths(logs, "s")] == names
+    assert log_paths(logs, "missing") == []
+
+
+def test_compressed_rotations_read_like_plain_files(rotated):
+    logs, names, parts = rotated
+    for name, recs in zip(names, parts):
+        assert list(iter_records(logs / name)) == recs
+        assert list(iter_matches(logs / name, "reboot", level="error")) == [
+            r for r in recs if "reboot" in json.dumps(r).lower() and r["level"] == "ERROR"]
+
+
+def test_search_logs_order_and_limit_across_rotations(rotated):
+    _, _, parts = rotated
+    every = [r for recs in parts for r in recs]  # live log first, then .1, .2, .3, .10
+    for query, kw in [("packet loss", {}), ("reboot|loss", {"level": "warn"}), ("nothing", {}),
+                      ("loss", {"t0": 1.7e9 + 1020, "t1": 1.7e9 + 3010})]:
+        want = [r for r in every if any(t in json.dumps(r).lower() for t in query.split("|"))
+                and ("level" not in kw or r["level"].lower() == kw["level"])
+                and kw.get("t0", 0) <= r["ts"] <= kw.get("t1", 2e9)]
+        for limit in (1, 19, 20, 21, 60, 75, 1000):  # cut inside the live log, at its end, and in each rotation
+            hits = tools.search_logs(tools.SearchLogsIn(query=query, scenario="s", limit=limit, **kw)).hits
+            assert hits == want[:limit]
+
+
+def test_zst_rotation_without_zstandard_says_what_to_install(tmp_path, monkeypatch):
+    path = tmp_path / "s.jsonl.1.zst"
+    path.write_bytes(b"not read")
+    monkeypatch.setattr(logstream, "zstandard", None)
+    with pytest.raises(RuntimeError, match="zstandard"):
+        list(iter_records(path))
@@ -0,0 +1,93 @@
+# tests/test_memory.py
+import numpy as np
+import pytest
+
+from app.memory import LongTerm, embed
+
+WORDS = "bearing vibration pump motor packet loss gateway latency overheating valve pressure drift".split()
+
+
+def texts(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=int(rng.integers(3, 9)))) for _ in range(n)]
+
+
+def naive(items, text, k, min_score=0.0):
+    """Newest version of each id, scored by cosine of the int8-quantised embeddings."""
+    latest = {}
+    for i, t in items:
+        latest[i] = t
+    vec = embed(text)
+    scored = []
+    for i, t in latest.items():
+        q = np.clip(np.rint(embed(t) * 127.0), -127, 127) / 127.0
+        scored.append((float(q @ vec), i))
+    return [(i, s) for s, i in sorted(scored, key=lambda p: -p[0]) if s >= min_score][:k]
+
+
+def test_empty_store(tmp_path):
+    store = LongTerm(root=tmp_path)
+    assert len(store) == 0 and store.recall("bearing vibration") == []
+    assert store.extend([]) == []
+
+
+def test_upsert_same_id_returns_the_new_text(tmp_path):
+    store = LongTerm(root=tmp_path)
+    store.upsert("inc-1", "bearing vibration on pump", {"summary": "old"})
+    store.upsert("inc-2", "packet loss at gateway", {"summary": "other"})
+    store.upsert("inc-1", "packet loss at gateway latency", {"summary": "new"})
+    hits = store.recall("packet loss at gateway latency", k=3)
+    assert [h["summary"] for h in hits] == ["new", "other"]
+    # the old text no longer matches anything: its row is superseded
+    assert [h["summary"] for h in store.recall("bearing vibration on pump", k=3, min_score=0.9)] == []
+
+
+def test_upsert_is_seen_by_another_handle(tmp_path):
+    LongTerm(root=tmp_path).extend([("a", "bearing vibration", {"v": 1}), ("a", "bearing vibration", {"v": 2})])
+    other = LongTerm(root=tmp_path)
+    other.upsert("a", "bearing vibration", {"v": 3})
+    assert [(h["id"], h["v"]) for h in LongTerm(root=tmp_path).recall("bearing vibration", k=5)] == [("a", 3)]
+
+
+def test_exact_scan_matches_naive_with_updates(tmp_path):
+    store = LongTerm(root=tmp_path)
+    ts = texts(300)
+    items = [(f"inc-{i % 200}", t) for i, t in enumerate(ts)]  # the last 100 rewrite ids 0..99
+    store.extend((i, t, {"text": t}) for i, t in items)
+    for q in texts(20, seed=1):
+        got = store.recall(q, k=5, min_score=0.1)
+        ref = naive(items, q, 5, min_score=0.1)
+        assert [h["score"] for h in got] == pytest.approx([s for _, s in ref], abs=1e-4)
+        latest = dict(items)
+        assert all(h["text"] == latest[h["id"]] for h in got)
+
+
+def test_ivf_recall_matches_exact_when_probing_every_list(tmp_path, monkeypatch):
+    monkeypatch.setattr(LongTerm, "TRAIN_MIN", 256)
+    monkeypatch.setattr(LongTerm, "MERGE_TAIL", 64)
+    store = LongTerm(root=tmp_path, nprobe=10_000)
+    items = [(f"inc-{i % 900}", t) for i, t in enumerate(texts(1000))]
+    for lo in range(0, len(items), 100):
+        store.extend((i, t, {"text": t}) for i, t in items[lo:lo + 100])
+    assert store._centroids() is not None and store._sorted() > 0
+    for q in texts(10, seed=2):
+        got = store.recall(q, k=5)
+        assert [h["score"] for h in got] == pytest.approx([s for _, s in naive(items, q, 5)], abs=1e-4)
+
+
+def test_upsert_in_a_new_process_reads_no_records(tmp_path, monkeypatch):
+    LongTerm(root=tmp_path).extend((f"inc-{i}", t, {"v": 1}) for i, t in enumerate(texts(500)))
+    fresh = LongTerm(root=tmp_path)
+    with monkeypatch.context() as m:
+        m.setattr("app.memory.json.loads", lambda *a, **k: pytest.fail("re-read records.jsonl"))
+        fresh.upsert("inc-7", "bearing vibration pump", {"v": 2})
+    hits = fresh.recall("bearing vibration pump", k=500)
+    assert [h["v"] for h in hits if h["id"] == "inc-7"] == [2]
+
+
+def test_ids_written_before_the_hash_file_are_backfilled(tmp_path):
+    store = LongTerm(root=tmp_path)
+    store.extend([("a", "bearing vibration", {"v": 1}), ("b", "packet loss", {"v": 1})])
+    (tmp_path / "incidents" / "ids.u64").unlink()  # a store from before ids.u64
+    LongTerm(root=tmp_path).upsert("a", "bearing vibration", {"v": 2})
+    assert [(h["id"], h["v"]) for h in LongTerm(root=tmp_path).recall("bearing vibration", k=5)] == [("a", 2), ("b", 1)]
@@ -0,0 +1,75 @@
+# tests/test_online.py
+import math
+
+import numpy as np
+import pytest
+
+from app.online import RollingMADDetector, _SortedWindow
+from app.tools import AnomalyScoreIn, anomaly_score
+
+
+def naive(window):
+    x = np.asarray(window, dtype=float)
+    med = float(np.median(x))
+    dev = np.abs(x - med)
+    return med, float(np.median(dev)), float(dev.max())
+
+
+@pytest.mark.parametrize("window,load", [(1, 256), (7, 2), (50, 4), (300, 256)])
+def test_stats_match_naive_sliding_window(window, load):
+    rng = np.random.default_rng(window)
+    xs = rng.normal(size=600)
+    xs[::37] += 25.0  # spikes
+    det = RollingMADDetector(window, load=load)
+    for i, x in enumerate(xs):
+        det.update(x)
+        med, mad, peak = det.stats()
+        ref = naive(xs[max(0, i + 1 - window):i + 1])
+        assert (med, mad, peak) == pytest.approx(ref, abs=1e-12)
+
+
+def test_score_matches_anomaly_score():
+    rng = np.random.default_rng(1)
+    xs = rng.normal(size=400)
+    xs[350] = 12.0
+    det = RollingMADDetector(300)
+    det.extend(xs)
+    assert det.score() == pytest.approx(anomaly_score(AnomalyScoreIn(points=xs[-300:])).score)
+
+
+def test_ties_and_constant_window():
+    det = RollingMADDetector(9, load=2)
+    det.extend([5.0] * 20)
+    assert det.stats() == (5.0, 0.0, 0.0)
+    det.extend([5.0, 5.0, 6.0])  # MAD 0 with a peak: as strong as it gets
+    assert det.score() == 1.0
+    ref = anomaly_score(AnomalyScoreIn(points=[5.0] * 6 + [5.0, 5.0, 6.0])).score
+    assert det.score() == ref
+
+
+def test_short_empty_and_nan():
+    det = RollingMADDetector(10)
+    r = det.result()
+    assert r.score == 0.0 and r.details == {"reason": "too_short", "n": 0}
+    det.extend([1.0, math.nan, 2.0, math.nan, 3.0, 4.0])
+    assert len(det) == 4 and det.result().details["reason"] == "too_short"
+    det.update(100.0)
+    assert det.stats()[0] == 3.0  # NaN never entered the window
+
+
+def test_window_must_be_positive():
+    with pytest.raises(ValueError):
+        RollingMADDetector(0)
+
+
+def test_sorted_window_rank_and_kth():
+    rng = np.random.default_rng(3)
+    w, ref = _SortedWindow(load=3), []
+    for x in rng.integers(0, 20, size=200).astype(float):  # many duplicates
+        w.add(x)
+        ref.append(x)
+        if len(ref) > 40:
+            w.remove(ref.pop(0))
+        s = sorted(ref)
+        assert [w[k] for k in range(len(s))] == s
+        assert all(w.rank(v) == sum(y < v for y in s) for v in (-1.0, 5.0, 10.5, 25.0))
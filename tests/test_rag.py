@@ -0,0 +1,169 @@
+# tests/test_rag.py
+import math
+
+import numpy as np
+import pytest
+
+from app import rag
+from app.rag import BM25Index, KBIndex, SimpleRAG, analyze, passages
+
+WORDS = ("bearing vibration pump motor packet loss gateway latency overheating valve pressure drift "
+         "seal lubrication firmware reboot").split()
+
+
+def make_notes(n, seed=0, words=40):
+    rng = np.random.default_rng(seed)
+    notes = {}
+    for i in range(n):
+        paras = [" ".join(rng.choice(WORDS[:4 + i % len(WORDS)], size=int(rng.integers(3, words))))
+                 for _ in range(int(rng.integers(1, 4)))]
+        notes[f"note_{i:03d}"] = "\n\n".join(paras)
+    return notes
+
+
+def naive_bm25(notes, query, k1=BM25Index.K1, b=BM25Index.B):
+    """note id -> (best passage score, that passage), by the textbook formula."""
+    units = [(i, p, analyze(p)) for i, text in notes.items() for p in passages(text)]
+    avg = max(sum(len(t) for _, _, t in units) / len(units), 1.0)
+    df = {}
+    for _, _, toks in units:
+        for tok in set(toks):
+            df[tok] = df.get(tok, 0) + 1
+    best = {}
+    for i, p, toks in units:
+        s = 0.0
+        for q in analyze(query):
+            if q in df:
+                tf = toks.count(q)
+                idf = math.log1p((len(units) - df[q] + 0.5) / (df[q] + 0.5))
+                s += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(toks) / avg))
+        if i not in best or s > best[i][0]:
+            best[i] = (s, p)
+    return best
+
+
+def check(idx, notes, query, top_k):
+    got = idx.search(query, top_k)
+    ref = naive_bm25(notes, query)
+    want = sorted((s for s, _ in ref.values()), reverse=True)[:top_k]
+    assert [h["score"] for h in got] == pytest.approx(want, rel=1e-5, abs=1e-6)
+    assert len({h["id"] for h in got}) == len(got)
+    for h in got:
+        assert h["score"] == pytest.approx(ref[h["id"]][0], rel=1e-5, abs=1e-6)
+        if h["score"] > 0:
+            assert h["snippet"] in notes[h["id"]]
+
+
+@pytest.mark.parametrize("prune", [4096, 3])  # 3: the long lists go through the MaxScore path
+def test_search_matches_naive_bm25(prune, monkeypatch):
+    monkeypatch.setattr(BM25Index, "PRUNE_POSTINGS", prune)
+    notes = make_notes(60)
+    idx = BM25Index.from_texts(notes)
+    for query in ["bearing vibration", "packet loss gateway", "firmware", "pump pump motor seal", "drift valve x"]:
+        for top_k in (1, 3, 10):
+            check(idx, notes, query, top_k)
+
+
+def test_ties_keep_one_entry_per_note():
+    notes = {"a": "pump seal", "b": "pump seal", "c": "pump seal\n\npump seal"}
+    got = BM25Index.from_texts(notes).search("pump", top_k=3)
+    assert sorted(h["id"] for h in got) == ["a", "b", "c"]
+    assert len({round(h["score"], 6) for h in got}) == 1
+
+
+def test_unmatched_notes_fill_top_k_with_zero_scores():
+    notes = {"a": "bearing vibration", "b": "packet loss", "c": "valve pressure"}
+    idx = BM25Index.from_texts(notes)
+    got = idx.search("bearing", top_k=3)
+    assert [h["id"] for h in got] == ["a", "b", "c"] and [h["score"] for h in got[1:]] == [0.0, 0.0]
+    assert [h["id"] for h in idx.search("nothing matches", top_k=2)] == ["a", "b"]
+    assert len(idx.search("bearing", top_k=10)) == 3
+    assert idx.search("bearing", top_k=0) == []
+
+
+def test_empty_index_and_empty_notes():
+    assert BM25Index.empty().search("bearing") == []
+    idx = BM25Index.from_texts({"blank": "", "a": "bearing"})
+    assert [h["id"] for h in idx.search("bearing", top_k=3)] == ["a"]  # a note with no passages can't be cited
+
+
+# ---------- persistence / incremental updates ----------
+def naive_tfidf(notes, query):
+    """TfidfVectorizer(smooth_idf, l2) + linear_kernel, written out."""
+    docs = {i: analyze(t) for i, t in notes.items()}
+    df = {}
+    for toks in docs.values():
+        for tok in set(toks):
+            df[tok] = df.get(tok, 0) + 1
+    idf = {t: math.log((1 + len(docs)) / (1 + d)) + 1 for t, d in df.items()}
+
+    def vec(toks):
+        v = {t: toks.count(t) * idf[t] for t in set(toks) if t in idf}
+        n = math.sqrt(sum(x * x for x in v.values()))
+        return {t: x / n for t, x in v.items()} if n else {}
+
+    q = vec(analyze(query))
+    return {i: sum(w * vec(toks).get(t, 0.0) for t, w in q.items()) for i, toks in docs.items()}
+
+
+@pytest.mark.parametrize("engine", [KBIndex, BM25Index])
+def test_save_load_round_trip(engine, tmp_path):
+    notes = make_notes(30)
+    notes["accents"] = "Überhitzung der Lager — café pump"
+    idx = engine.from_texts(notes)
+    loaded = engine.load(idx.save(tmp_path))
+    assert loaded is not None and loaded.content_hash == idx.content_hash
+    assert list(loaded.texts) == list(idx.texts)
+    for q in ["bearing vibration", "ueberhitzung cafe", "nothing"]:
+        assert loaded.search(q, 5) == idx.search(q, 5)
+    assert engine.load(tmp_path / "missing") is None
+
+
+def test_tfidf_matches_naive():
+    notes = make_notes(25)
+    idx = KBIndex.from_texts(notes)
+    for q in ["bearing vibration", "packet packet loss", "firmware reboot drift"]:
+        ref = naive_tfidf(notes, q)
+        got = idx.scores(q)
+        assert got == pytest.approx([ref[i] for i in idx.ids], abs=1e-6)  # float32 counts
+    assert not KBIndex.from_texts(notes).scores("zzz").any()
+
+
+@pytest.mark.parametrize("engine", [KBIndex, BM25Index])
+def test_incremental_update_equals_rebuild(engine, tmp_path):
+    kb, cache = tmp_path / "kb", tmp_path / "cache"
+    kb.mkdir()
+    notes = make_notes(20)
+    for i, t in notes.items():
+        (kb / f"{i}.md").write_text(t, encoding="utf-8")
+    first = engine.open(kb, cache)
+    assert engine.open(kb, cache).content_hash == first.content_hash  # straight load
+
+    (kb / "note_003.md").unlink()
+    (kb / "note_005.md").write_text("packet loss after firmware reboot", encoding="utf-8")
+    (kb / "new_note.md").write_text("seal lubrication drift", encoding="utf-8")
+    updated = engine.open(kb, cache)
+    rebuilt = engine.build(kb)
+    assert updated.content_hash == rebuilt.content_hash != first.content_hash
+    assert sorted(updated.ids) == sorted(rebuilt.ids) and "note_003" not in updated.ids
+    for q in ["packet loss firmware", "seal drift", "bearing vibration pump"]:
+        got, ref = updated.search(q, 5), rebuilt.search(q, 5)
+        assert [h["score"] for h in got] == pytest.approx([h["score"] for h in ref])
+        assert {h["id"]: h["snippet"] for h in got} == {h["id"]: h["snippet"] for h in ref}
+    assert not (cache / first.content_hash).exists()  # the superseded index is dropped
+
+
+def test_simple_rag_add_and_remove(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "CACHE_DIR", tmp_path / "cache")
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    r = SimpleRAG(kb, engine="bm25")
+    assert r("anything") == []
+    r.add({"a": "bearing vibration", "b": "packet loss"})
+    assert [h["id"] for h in r("packet loss", top_k=1)] == ["b"]
+    r.add({"b": "valve pressure"})  # replaced
+    assert r("packet loss", top_k=2)[0]["score"] == 0.0
+    r.remove(["a"])
+    assert [h["id"] for h in r("bearing valve", top_k=3)] == ["b"]
+    with pytest.raises(ValueError):
+        SimpleRAG(kb, engine="nope")
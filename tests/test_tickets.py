@@ -0,0 +1,95 @@
+# tests/test_tickets.py
+import pytest
+
+from app import graph, tools
+from app.memory import LongTerm
+from app.tickets import TicketStore, canonical, content_hash
+
+REPORT = """
+# Incident Report: bearing_wear_03
+
+**Confidence**: 0.75
+
+## Evidence
+- **Anomaly Score**: 1.00
+- **Similar past incidents**:
+{similar}
+{alerts}
+## Recommendation
+Proceed.
+
+## Trace
+
+- **plan**: {{ ms:{ms} }}
+"""
+
+
+def report(similar="None", alerts="", ms=1.0):
+    return REPORT.format(similar=similar, alerts=alerts, ms=ms)
+
+
+def test_run_dependent_sections_do_not_change_the_hash():
+    alerts = "\n## Correlated alerts (2)\n- a1 at 2024-01-01 00:00:00Z [pump]: vibration\n- a2 at ...\n"
+    variants = [report(), report(ms=9.5),
+                report(similar="- bearing_wear_03-abc (similarity=0.98, confidence=0.75): /t.md"),
+                report(alerts=alerts), report(similar="- x (similarity=0.70, confidence=0.60): y", alerts=alerts)]
+    assert len({content_hash(v) for v in variants}) == 1
+    assert "Recommendation" in canonical(report(alerts=alerts))
+    assert content_hash(report().replace("0.75", "0.50")) != content_hash(report())
+
+
+def test_store_keeps_one_file_per_canonical_report(tmp_path):
+    store = TicketStore(tmp_path)
+    first, again = store.put_many([(report(), "s"), (report(similar="- s-1 (similarity=0.99, confidence=0.75): p", ms=3), "s")])
+    assert first["new"] and not again["new"] and first["path"] == again["path"]
+    assert store.read(again) == report()  # the first run's text is kept
+    assert store.put("", "")["new"] and not store.put("\n\n", "")["new"]  # empty reports hash alike
+
+
+def test_fresh_handle_starts_from_the_latest_pointer(tmp_path):
+    writer = TicketStore(tmp_path)
+    for i in range(50):
+        writer.put(report(ms=i).replace("0.75", f"0.{i:02d}"), f"s{i % 3}")
+    last = writer.put(report(), "s1")
+    size = writer.index_path.stat().st_size
+    # scribble over the index (same size): a cold lookup must not read it
+    writer.index_path.write_bytes(b"x" * (size - 1) + b"\n")
+    cold = TicketStore(tmp_path)
+    assert cold.latest() == last and cold.latest("s1") == last
+    assert cold.latest("s2")["scenario"] == "s2" and cold.count == 51
+    # lines appended after the pointer (e.g. a writer killed before updating it) are still folded in
+    with open(writer.index_path, "a", encoding="utf-8") as f:
+        f.write('{"ticket": "t", "scenario": "s9", "ts": 1, "hash": "h", "path": "p", "new": true}\n')
+    again = TicketStore(tmp_path)
+    assert again.latest("s9")["ticket"] == "t" and again.count == 52
+
+
+def test_missing_or_stale_pointer_falls_back_to_the_index(tmp_path):
+    writer = TicketStore(tmp_path)
+    entries = writer.put_many([(report(ms=i).replace("0.75", f"0.{i:02d}"), "s") for i in range(5)])
+    writer.pointer_path.unlink()
+    assert TicketStore(tmp_path).latest() == entries[-1]
+    writer.put(report(), "t")  # rewrites the pointer
+    writer.index_path.write_text("", encoding="utf-8")  # index truncated under it
+    assert TicketStore(tmp_path).latest() is None
+
+
+@pytest.fixture
+def isolated_runs(tmp_path, monkeypatch):
+    memory = LongTerm(root=tmp_path / "memory")
+    monkeypatch.setenv("INCIDENT_MEMORY", "1")
+    monkeypatch.setattr(tools, "MODELS_DIR", tmp_path)
+    monkeypatch.setattr(graph, "get_memory", lambda: memory)
+    return graph.build_graph()
+
+
+def test_same_incident_twice_is_one_ticket(isolated_runs):
+    alerts = [{"id": "a1", "ts": 1.7e9, "asset": "pump", "description": "vibration"}]
+    runs = [isolated_runs.invoke(graph.AgentState(scenario="bearing_wear_03", description="Scenario bearing_wear_03",
+                                                  alerts=alerts[:i]))
+            for i in (0, 1)]
+    assert all(r["ticket_path"] for r in runs)
+    assert runs[1]["evidence"]["similar"]  # the second run recalls the first ...
+    assert runs[0]["report_md"] != runs[1]["report_md"]
+    assert runs[0]["ticket_path"] == runs[1]["ticket_path"]  # ... and still files the same ticket
+    assert len(list((tools.MODELS_DIR / "tickets").glob("*/*.md"))) == 1
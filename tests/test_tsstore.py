@@ -0,0 +1,92 @@
+# tests/test_tsstore.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import tsstore
+from app.tsstore import TimeSeriesStore
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsstore, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(tsstore, "_OPEN", {})
+
+
+def write_csv(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.sort(rng.integers(0, n // 2, size=n)).astype(float)  # repeated timestamps
+    pd.DataFrame({"time": t, "vib": rng.normal(size=n), "temp": rng.normal(size=n)}).to_csv(path, index=False)
+    return t
+
+
+def test_append_rejects_time_going_backwards(tmp_path):
+    store = TimeSeriesStore.create(tmp_path / "s", ["a", "b"])
+    assert store.append([1, 2, 2], {"a": [1, 2, 3], "b": [4, 5, 6]}) == 3
+    with pytest.raises(ValueError, match="non-decreasing"):
+        store.append([5, 4], {"a": [0, 0]})
+    with pytest.raises(ValueError, match="before last stored time"):
+        store.append([1.5], {"a": [0]})
+    with pytest.raises(KeyError, match="unknown columns"):
+        store.append([3], {"c": [0]})
+    with pytest.raises(ValueError, match="has 1 rows"):
+        store.append([3, 4], {"a": [0]})
+    assert len(store) == 3  # failed appends write nothing
+    assert store.append([2, 3], {"a": [7, 8]}) == 5  # equal to the last time is fine
+    assert store.times().tolist() == [1, 2, 2, 2, 3]
+    assert store.tail("a", 2).tolist() == [7, 8] and np.isnan(store.tail("b", 2)).all()
+    assert store.append([], {}) == 5
+
+
+def test_append_drops_rows_an_interrupted_append_left_behind(tmp_path):
+    store = TimeSeriesStore.create(tmp_path / "s", ["a"])
+    store.append([1, 2], {"a": [1, 2]})
+    with open(tmp_path / "s" / "a.f64", "ab") as f:  # `a` written, `time` never was
+        f.write(np.array([99.0]).tobytes())
+    assert len(store) == 2
+    store.append([3], {"a": [3]})
+    assert store.tail("a", 10).tolist() == [1, 2, 3]
+
+
+def test_range_matches_a_mask_over_all_rows(tmp_path):
+    t = write_csv(tmp_path / "s.csv", 5000)
+    store = TimeSeriesStore.open("s", tmp_path / "s.csv")
+    vib = pd.read_csv(tmp_path / "s.csv")["vib"].to_numpy()
+    rng = np.random.default_rng(1)
+    bounds = [(None, None), (t[10], None), (None, t[10]), (t[100], t[100]), (t[-1] + 1, None), (3.5, 2.0)]
+    bounds += [tuple(sorted(rng.uniform(-10, t[-1] + 10, size=2))) for _ in range(50)]
+    for t0, t1 in bounds:
+        keep = np.ones(len(t), dtype=bool)
+        if t0 is not None:
+            keep &= t >= t0
+        if t1 is not None:
+            keep &= t <= t1
+        times, values = store.range("vib", t0, t1)
+        assert times.tolist() == t[keep].tolist()
+        assert np.allclose(values, vib[keep])
+
+
+def test_store_is_rebuilt_only_when_the_csv_changes(tmp_path):
+    csv = tmp_path / "s.csv"
+    write_csv(csv, 300)
+    store = TimeSeriesStore.open("s", csv)
+    store.append([1e6], {"vib": [42.0]})  # appended rows live in the store
+    tsstore._OPEN.clear()
+    again = TimeSeriesStore.open("s", csv)
+    assert len(again) == 301 and again.tail("vib", 1).tolist() == [42.0]
+
+    write_csv(csv, 200, seed=1)  # new content and size
+    rebuilt = TimeSeriesStore.open("s", csv)
+    assert len(rebuilt) == 200
+    assert np.allclose(rebuilt.tail("vib", 200), pd.read_csv(csv)["vib"].to_numpy())
+
+    st = csv.stat()
+    os.utime(csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched: mtime alone counts
+    assert TimeSeriesStore.open("s", csv).meta["source"]["mtime_ns"] == st.st_mtime_ns + 10**9
+
+    other = tmp_path / "other.csv"
+    write_csv(other, 50, seed=2)
+    assert len(TimeSeriesStore.open("s", other)) == 50  # same scenario name, another CSV
+    assert not list((tmp_path / "cache").glob("*.tmp*"))
@@ -26,14 +26,74 @@ ROOT = pathlib.Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 import streamlit as st
-import pathlib, yaml, os
-from app.graph import build_graph, AgentState
+import pathlib, threading, yaml, os
+import pandas as pd
+from app.graph import get_graph, AgentState
+from app import graph, llm, spans
+from app.tools import ticket_store
+from eval.harness import run_eval
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-SCEN_DIR = ROOT / "data" / "scenarios"
-MODELS_DIR = ROOT / "models"
+SCEN_DIR = pathlib.Path(os.getenv("INCIDENT_DATA_DIR") or ROOT / "data") / "scenarios"
 RESULTS_DIR = ROOT / "eval" / "results"
 
+spans.enable()  # per-node/tool spans feed the Trace tab waterfall
+
+# ---------- Cached resources ----------
+# Streamlit reruns this script on every interaction. Long-lived objects are
+# built once per server process; file-backed data is keyed by mtime so an
+# edit on disk is picked up on the next rerun without re-reading unchanged files.
+@st.cache_resource(show_spinner="Compiling the agent graph…")
+def load_graph():
+    return get_graph()
+
+@st.cache_resource(show_spinner="Opening the knowledge-base index…")
+def load_retriever():
+    graph.rag.index  # build or load the on-disk index now, not on the first run
+    return graph.rag
+
+@st.cache_resource(show_spinner="Loading the planner model…")
+def load_planner(model: str) -> bool:
+    os.environ["HUGGINGFACE_MODEL"] = model
+    return llm.warmup()
+
+@st.cache_data(show_spinner=False)
+def scenario_meta(path: str, mtime_ns: int) -> dict:
+    return yaml.safe_load(pathlib.Path(path).read_text(encoding="utf-8")) or {}
+
+@st.cache_data(show_spinner=False)
+def load_metrics(path: str, mtime_ns: int) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+def _mtime_ns(path: pathlib.Path) -> int:
+    return path.stat().st_mtime_ns if path.exists() else 0
+
+class EvalJob:
+    """One in-process evaluation run on a background thread; the UI polls it."""
+
+    def __init__(self, outdir: pathlib.Path):
+        self.outdir = outdir
+        self.done, self.total, self.last = 0, 0, None
+        self.error: str | None = None
+        self.thread = threading.Thread(target=self._run, name="dashboard-eval", daemon=True)
+
+    def _progress(self, done: int, total: int, row: dict):
+        self.done, self.total, self.last = done, total, row
+
+    def _run(self):
+        try:
+            run_eval(self.outdir, progress=self._progress)
+        except Exception as e:  # shown in the UI instead of killing the thread silently
+            self.error = f"{type(e).__name__}: {e}"
+
+    @property
+    def running(self) -> bool:
+        return self.thread.is_alive()
+
+@st.cache_resource
+def eval_jobs() -> dict:
+    return {"job": None}  # shared by every session: one evaluation at a time
+
 st.set_page_config(page_title="Agentic Incident Responder", layout="wide")
 st.title("🛠️ Agentic Incident Responder (Industrial IoT)")
 
@@ -41,13 +101,17 @@ st.title("🛠️ Agentic Incident Responder (Industrial IoT)")
 with st.sidebar:
     st.header("Run Settings")
     # Scenario selector from available YAMLs
-    scen_files = sorted(p.stem for p in SCEN_DIR.glob("*.yaml"))
+    scen_paths = {p.stem: p for p in sorted(SCEN_DIR.glob("*.yaml"))}
+    scen_files = list(scen_paths)
     scenario = st.selectbox("Scenario", options=scen_files, index=0 if scen_files else None)
     # Load description from YAML by default
     default_desc = ""
+    sensors = []
     if scenario:
-        meta = yaml.safe_load((SCEN_DIR / f"{scenario}.yaml").read_text(encoding="utf-8"))
+        path = scen_paths[scenario]
+        meta = scenario_meta(str(path), _mtime_ns(path))
         default_desc = meta.get("description", "")
+        sensors = meta.get("sensors", [])
     description = st.text_area("Description", value=default_desc, height=80)
 
     force_ticket = st.checkbox("Force ticket (demo mode)", value=False,
@@ -55,6 +119,8 @@ with st.sidebar:
     # Let user pick a HF model (optional)
     hf_model = st.text_input("HuggingFace model (optional)", value=os.getenv("HUGGINGFACE_MODEL", "distilgpt2"),
                              help="Set HUGGINGFACE_MODEL env var for persistent change.")
+    use_planner = st.checkbox("Use HF planner", value=os.getenv("NO_PLANNER", "0") != "1",
+                              help="Off = static plan; torch/transformers are never loaded.")
     run_btn = st.button("▶ Run Agent")
 
     st.divider()
@@ -64,12 +130,22 @@ with st.sidebar:
 if run_btn and scenario:
     # Optional: set HUGGINGFACE_MODEL for this session/run
     os.environ["HUGGINGFACE_MODEL"] = hf_model or os.environ.get("HUGGINGFACE_MODEL", "distilgpt2")
+    os.environ["NO_PLANNER"] = "0" if use_planner else "1"
     # Optional: force ticket
     os.environ["FORCE_TICKET"] = "1" if force_ticket else "0"
 
-    st.write(f"**Running**: `{scenario}`")
-    app = build_graph()
-    out = app.invoke(AgentState(scenario=scenario, description=description))
+    app = load_graph()
+    load_retriever()
+    if use_planner:
+        load_planner(os.environ["HUGGINGFACE_MODEL"])
+    with st.spinner(f"Running `{scenario}`…"):
+        out = app.invoke(AgentState(scenario=scenario, description=description, sensors=sensors))
+    # kept across reruns, so other widgets (e.g. the eval button) don't clear the result
+    st.session_state["last_run"] = (scenario, out)
+
+if "last_run" in st.session_state:
+    scenario, out = st.session_state["last_run"]
+    st.write(f"**Last run**: `{scenario}`")
 
     # Top-level stats
     c1, c2, c3 = st.columns(3)
@@ -81,12 +157,13 @@ if run_btn and scenario:
         1 if len(ev.get("kb", []) or []) > 0 else 0,
     ])
     c2.metric("Evidence sources", str(sources))
-    # Try to find a fresh ticket in MODELS_DIR (by mtime)
-    ticket_path = None
-    if MODELS_DIR.exists():
-        tickets = sorted(MODELS_DIR.glob("ticket_*.md"), key=lambda p: p.stat().st_mtime, reverse=True)
-        ticket_path = tickets[0] if tickets else None
+    # This run's ticket comes back in the state; the store's index knows earlier ones
+    ticket_path = pathlib.Path(out["ticket_path"]) if out.get("ticket_path") else None
     c3.metric("Ticket", "created" if ticket_path else "skipped")
+    if ticket_path is None:
+        last = ticket_store().latest(scenario)
+        if last:
+            c3.caption(f"Last ticket for this scenario: {last['ticket']}")
 
     # Tabs: Evidence / RAG / Report / Trace
     t_ev, t_rag, t_rep, t_trace = st.tabs(["Evidence", "RAG", "Final Report", "Trace"])
@@ -94,6 +171,8 @@ if run_btn and scenario:
     with t_ev:
         st.subheader("Timeseries anomaly")
         st.write(f"**Anomaly Score:** {float(ev.get('anomaly_score', 0.0)):.2f}")
+        if ev.get("top_sensors"):
+            st.dataframe(ev["top_sensors"])
         st.subheader("Log hits (trimmed)")
         st.json(ev.get("logs", [])[:5])
 
@@ -115,31 +194,76 @@ if run_btn and scenario:
                 st.download_button(
                     "⬇ Download ticket (.md)",
                     data=f.read(),
-                    file_name=ticket_path.name,
+                    file_name=f"ticket_{scenario}_{ticket_path.stem[:16]}.md",
                     mime="text/markdown",
                 )
 
     with t_trace:
         st.subheader("Trace")
-        # The trace is embedded in the report markdown by write_node; we also try to surface tool logs:
-        st.markdown("*(Trace appended at the bottom of the report.)*")
+        run_spans = sorted(out.get("spans", []) or [], key=lambda s: s["start_us"])
+        if run_spans:
+            import io, json
+            from matplotlib.figure import Figure  # no pyplot state shared with the eval thread
+            start = run_spans[0]["start_us"]
+            fig = Figure(figsize=(8, 0.35 * len(run_spans) + 1))
+            ax = fig.add_subplot()
+            for i, s in enumerate(run_spans):
+                ax.barh(i, s["wall_ms"], left=(s["start_us"] - start) / 1000.0,
+                        color="tab:blue" if s["cat"] == "node" else "tab:orange")
+            ax.set_yticks(range(len(run_spans)))
+            ax.set_yticklabels([s["name"] for s in run_spans])
+            ax.invert_yaxis()
+            ax.set_xlabel("ms since run start (blue = node, orange = tool)")
+            fig.tight_layout()
+            png = io.BytesIO()
+            fig.savefig(png, format="png")
+            st.image(png.getvalue())
+            st.dataframe([{"name": s["name"], "start_ms": round((s["start_us"] - start) / 1000.0, 3),
+                           "wall_ms": round(s["wall_ms"], 3), "cpu_ms": round(s["cpu_ms"], 3)} for s in run_spans])
+            st.download_button("⬇ Chrome trace (.json)", data=json.dumps(spans.to_chrome_trace(run_spans)),
+                               file_name=f"trace_{scenario}.json", mime="application/json")
+        # events of this run only (the graph is shared, the trace lives in the state)
+        trace = out.get("trace", []) or []
+        if trace:
+            st.dataframe([{"kind": e["kind"], "data": {k: v for k, v in e.items() if k != "kind"}} for e in trace])
+        else:
+            st.info("No trace events.")
+        if out.get("timings"):
+            st.caption("Node wall time (ms)")
+            st.json(out["timings"])
 
-# Optional: run evaluation
+# Evaluation: in-process on a background thread (the graph, retriever and
+# planner are already loaded); the fragment below polls its progress.
 if eval_btn:
-    st.write("Running evaluation across all scenarios…")
-    import subprocess, sys
-    # Run module so imports resolve from project root
-    cmd = [sys.executable, "-m", "eval.harness"]
-    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(ROOT))
-    st.code(proc.stdout or "(no stdout)")
-    if proc.returncode != 0:
-        st.error(proc.stderr)
+    os.environ["NO_PLANNER"] = "0" if use_planner else "1"
+    jobs = eval_jobs()
+    if jobs["job"] is not None and jobs["job"].running:
+        st.warning("An evaluation is already running.")
+    else:
+        load_graph()
+        load_retriever()
+        jobs["job"] = EvalJob(RESULTS_DIR)
+        jobs["job"].thread.start()
+
+@st.fragment(run_every=1.0)
+def eval_panel():
+    job = eval_jobs()["job"]
+    if job is not None and job.running:
+        st.progress(job.done / job.total if job.total else 0.0,
+                    text=f"Evaluating… {job.done}/{job.total or '?'} scenarios")
+        if job.last:
+            st.caption(f"Last: {job.last['scenario']} → {job.last['pred']} "
+                       f"({'correct' if job.last['correct'] else 'wrong'})")
+        return
+    if job is not None and job.error:
+        st.error(job.error)
     # Show latest artifacts if present
     csv_path = RESULTS_DIR / "metrics.csv"
     png_path = RESULTS_DIR / "confusion_matrix.png"
     if csv_path.exists():
-        import pandas as pd
-        st.success(f"Wrote {csv_path}")
-        st.dataframe(pd.read_csv(csv_path))
+        st.subheader("Evaluation")
+        st.dataframe(load_metrics(str(csv_path), _mtime_ns(csv_path)))
     if png_path.exists():
         st.image(str(png_path), caption="Confusion Matrix")
+
+eval_panel()